@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""Recall/latency benchmark: local VectorStore exact matrix search vs IVF probes and quantised storage.
+
+Builds a synthetic topical corpus with the same hash embedding the VectorStore
+uses, then compares exact float32 top-k (one matrix-vector product) against
+IVF probes and against float16/int8 copies of the same matrix.
+
+    python benchmark_vector_index.py --records 100000 --queries 200 --nprobe 8
+    python benchmark_vector_index.py --records 100000 --quantization float16 int8
+"""
+
+import argparse
+import json
+import random
+import time
+
+import numpy as np
+
+from flowernet_agent_stack import _embedding, _IVFIndex, _MatrixIndex
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def _synthetic_text(rng, topics, noise_vocab):
+    words = rng.sample(rng.choice(topics), 10) + rng.sample(noise_vocab, 2)
+    rng.shuffle(words)
+    return " ".join(words)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=0, help="0 = sqrt(records)")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--quantization", nargs="*", default=["float16", "int8"], choices=["float16", "int8"])
+    parser.add_argument("--topics", type=int, default=400)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    topics = [[f"t{t}w{i}" for i in range(30)] for t in range(args.topics)]
+    noise_vocab = [f"noise{i}" for i in range(20000)]
+
+    index = _MatrixIndex(256)
+    started = time.perf_counter()
+    for i in range(args.records):
+        index.add(f"rec-{i}", "global", _embedding(_synthetic_text(rng, topics, noise_vocab)))
+    build_seconds = time.perf_counter() - started
+
+    ann = _IVFIndex(index, nlist=args.nlist, min_train=16)
+    started = time.perf_counter()
+    ann.train()
+    train_seconds = time.perf_counter() - started
+
+    queries = [_embedding(" ".join(rng.sample(rng.choice(topics), 5))) for _ in range(args.queries)]
+    kth_scores, exact_latency = [], []
+    for query in queries:
+        started = time.perf_counter()
+        hits = index.search(query, args.top_k, exact=True)
+        # Synthetic texts tie often, so recall counts any hit scoring at least the exact k-th score.
+        kth_scores.append(hits[-1][1] if hits else 0.0)
+        exact_latency.append((time.perf_counter() - started) * 1000)
+
+    index.ann = ann
+    report = {
+        "records": args.records,
+        "queries": args.queries,
+        "top_k": args.top_k,
+        "embed_insert_seconds": round(build_seconds, 2),
+        "ivf_train_seconds": round(train_seconds, 2),
+        "ivf": ann.stats(),
+        "exact": {
+            "index_mb": round(index.nbytes / 1e6, 2),
+            "p50_ms": round(_percentile(exact_latency, 50), 3),
+            "p95_ms": round(_percentile(exact_latency, 95), 3),
+        },
+        "ann": [],
+        "quantized": [],
+    }
+    for nprobe in args.nprobe:
+        ann.nprobe = nprobe
+        recalls, latency = [], []
+        for query, kth_score in zip(queries, kth_scores):
+            started = time.perf_counter()
+            found = index.search(query, args.top_k)
+            latency.append((time.perf_counter() - started) * 1000)
+            recalls.append(sum(1 for _, score in found if score >= kth_score - 1e-6) / args.top_k)
+        report["ann"].append(
+            {
+                "nprobe": nprobe,
+                f"recall@{args.top_k}": round(float(np.mean(recalls)), 4),
+                "p50_ms": round(_percentile(latency, 50), 3),
+                "p95_ms": round(_percentile(latency, 95), 3),
+            }
+        )
+
+    index.ann = None
+    ids, namespaces = list(index._ids), ["global"] * len(index)
+    for quantization in args.quantization:
+        packed = _MatrixIndex(256, quantization=quantization)
+        packed.extend(ids, namespaces, *index.export())
+        recalls, latency = [], []
+        for query, kth_score in zip(queries, kth_scores):
+            started = time.perf_counter()
+            found = packed.search(query, args.top_k)
+            latency.append((time.perf_counter() - started) * 1000)
+            # Judge hits by their float32 score so quantisation error cannot grade itself.
+            rows = np.asarray([index._rows[rec_id] for rec_id, _ in found], dtype=np.int64)
+            exact_scores = index.vectors(rows) @ np.asarray(query, dtype=np.float32) if rows.size else np.zeros(0)
+            recalls.append(float(np.sum(exact_scores >= kth_score - 1e-6)) / args.top_k)
+        report["quantized"].append(
+            {
+                "quantization": quantization,
+                "index_mb": round(packed.nbytes / 1e6, 2),
+                f"recall@{args.top_k}": round(float(np.mean(recalls)), 4),
+                "p50_ms": round(_percentile(latency, 50), 3),
+                "p95_ms": round(_percentile(latency, 95), 3),
+            }
+        )
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,200 @@
+"""
+Domain Authority - 共享的域名权威度索引
+================================================
+
+Purpose:
+- RAG 检索排序、Reranker、Verifier 与 Web 引证质检共用同一份域名分级数据
+- 数据集中在 domain_authority.json，避免各服务维护各自的域名集合
+- 反向标签后缀树（org -> ieee -> ieeexplore）查找，复杂度与标签数成正比
+- 按 host 记忆化，单篇文档装配时对数千个 URL 打分依然很便宜
+
+Usage:
+    from domain_authority import get_domain_authority
+
+    authority = get_domain_authority()
+    authority.score("https://link.springer.com/article/...")      # 1.0
+    authority.score("en.wikipedia.org", profile="citation_qa")    # 0.55
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+import json
+import os
+import threading
+
+
+DOMAIN_AUTHORITY_PATH = Path(
+    os.getenv("FLOWERNET_DOMAIN_AUTHORITY_PATH", str(Path(__file__).resolve().with_name("domain_authority.json")))
+)
+DOMAIN_AUTHORITY_CACHE_SIZE = int(os.getenv("FLOWERNET_DOMAIN_AUTHORITY_CACHE_SIZE", "65536"))
+
+_TERMINAL = ""
+
+
+def normalize_host(value: str) -> str:
+    """Reduce a URL or host string to a bare lowercase host without ``www.``/port."""
+    text = str(value or "").strip().lower()
+    if not text:
+        return ""
+    if "://" in text or text.startswith("//"):
+        try:
+            text = urlparse(text if "://" in text else f"https:{text}").netloc or ""
+        except Exception:
+            return ""
+    else:
+        text = text.split("/", 1)[0]
+    text = text.rsplit("@", 1)[-1].split(":", 1)[0].strip(".")
+    if text.startswith("www."):
+        text = text[4:]
+    return text
+
+
+class DomainSuffixTrie:
+    """Reversed-label suffix trie; ``scholar.ieee.org`` is stored as org -> ieee -> scholar.
+
+    A suffix only matches on label boundaries, so ``ieee.org`` matches
+    ``ieeexplore.ieee.org`` but never ``notieee.org``.
+    """
+
+    def __init__(self, entries: Optional[Iterable[Tuple[str, Any]]] = None) -> None:
+        self._root: Dict[str, Any] = {}
+        self.size = 0
+        for suffix, value in entries or []:
+            self.insert(suffix, value)
+
+    def insert(self, suffix: str, value: Any) -> None:
+        labels = [label for label in normalize_host(suffix).split(".") if label]
+        if not labels:
+            return
+        node = self._root
+        for label in reversed(labels):
+            node = node.setdefault(label, {})
+        if _TERMINAL not in node:
+            self.size += 1
+        node[_TERMINAL] = value
+
+    def matches(self, host: str) -> List[Tuple[str, Any]]:
+        """All stored suffixes of ``host``, shortest first."""
+        labels = [label for label in normalize_host(host).split(".") if label]
+        found: List[Tuple[str, Any]] = []
+        node = self._root
+        depth = 0
+        for label in reversed(labels):
+            node = node.get(label)
+            if node is None:
+                break
+            depth += 1
+            if _TERMINAL in node:
+                found.append((".".join(labels[-depth:]), node[_TERMINAL]))
+        return found
+
+    def longest_match(self, host: str) -> Optional[Tuple[str, Any]]:
+        found = self.matches(host)
+        return found[-1] if found else None
+
+    def __contains__(self, host: str) -> bool:
+        return bool(self.matches(host))
+
+    def __len__(self) -> int:
+        return self.size
+
+
+@dataclass(frozen=True)
+class DomainAuthority:
+    host: str
+    matched_suffix: str
+    category: str
+    tags: FrozenSet[str]
+
+
+class DomainAuthorityIndex:
+    """Compiled view over domain_authority.json with memoised per-host lookups."""
+
+    def __init__(self, data: Dict[str, Any], cache_size: int = DOMAIN_AUTHORITY_CACHE_SIZE) -> None:
+        self.version = data.get("version", 1)
+        self.default_score = float(data.get("default_score", 0.5))
+        self.category_scores: Dict[str, float] = {
+            str(name): float(score) for name, score in (data.get("category_scores") or {}).items()
+        }
+        self.profiles: Dict[str, Dict[str, float]] = {
+            str(name): {str(cat): float(score) for cat, score in (overrides or {}).items()}
+            for name, overrides in (data.get("profiles") or {}).items()
+        }
+        self.authority_categories = frozenset(str(x) for x in data.get("authority_categories") or [])
+        self._categories = DomainSuffixTrie()
+        for category, suffixes in (data.get("categories") or {}).items():
+            for suffix in suffixes or []:
+                self._categories.insert(suffix, str(category))
+        self._tags = DomainSuffixTrie()
+        tag_map: Dict[str, set] = {}
+        for tag, suffixes in (data.get("tags") or {}).items():
+            for suffix in suffixes or []:
+                tag_map.setdefault(normalize_host(suffix), set()).add(str(tag))
+        for suffix, tags in tag_map.items():
+            self._tags.insert(suffix, frozenset(tags))
+        self._lookup_host = lru_cache(maxsize=max(16, int(cache_size)))(self._lookup_uncached)
+
+    @classmethod
+    def from_file(cls, path: Path = DOMAIN_AUTHORITY_PATH) -> "DomainAuthorityIndex":
+        return cls(json.loads(Path(path).read_text(encoding="utf-8")))
+
+    def _lookup_uncached(self, host: str) -> DomainAuthority:
+        match = self._categories.longest_match(host)
+        tags: FrozenSet[str] = frozenset()
+        for _, value in self._tags.matches(host):
+            tags = tags | value
+        if match is None:
+            return DomainAuthority(host=host, matched_suffix="", category="", tags=tags)
+        return DomainAuthority(host=host, matched_suffix=match[0], category=match[1], tags=tags)
+
+    def lookup(self, host_or_url: str) -> DomainAuthority:
+        return self._lookup_host(normalize_host(host_or_url))
+
+    def score(self, host_or_url: str, profile: Optional[str] = None) -> float:
+        host = normalize_host(host_or_url)
+        if not host:
+            return 0.0
+        category = self._lookup_host(host).category
+        if not category:
+            return self.default_score
+        overrides = self.profiles.get(profile or "", {})
+        if category in overrides:
+            return overrides[category]
+        return self.category_scores.get(category, self.default_score)
+
+    def category(self, host_or_url: str) -> str:
+        return self.lookup(host_or_url).category
+
+    def is_authority(self, host_or_url: str) -> bool:
+        return self.lookup(host_or_url).category in self.authority_categories
+
+    def has_tag(self, host_or_url: str, tag: str) -> bool:
+        return tag in self.lookup(host_or_url).tags
+
+    def cache_info(self) -> Dict[str, Any]:
+        info = self._lookup_host.cache_info()
+        return {
+            "hits": info.hits,
+            "misses": info.misses,
+            "size": info.currsize,
+            "maxsize": info.maxsize,
+            "suffixes": len(self._categories),
+        }
+
+
+_DOMAIN_AUTHORITY: Optional[DomainAuthorityIndex] = None
+_DOMAIN_AUTHORITY_LOCK = threading.Lock()
+
+
+def get_domain_authority() -> DomainAuthorityIndex:
+    global _DOMAIN_AUTHORITY
+    if _DOMAIN_AUTHORITY is None:
+        with _DOMAIN_AUTHORITY_LOCK:
+            if _DOMAIN_AUTHORITY is None:
+                _DOMAIN_AUTHORITY = DomainAuthorityIndex.from_file()
+    return _DOMAIN_AUTHORITY
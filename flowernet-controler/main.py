@@ -619,10 +619,17 @@ def _bandit_update(
     arm_state["ineffective_streak"] = 0 if effective and not weak_reward else int(arm_state.get("ineffective_streak", 0) or 0) + 1
 
 
+_OUTLINER_SESSION: Optional[requests.Session] = None
+
+
 def _get_outliner_session():
-    s = requests.Session()
-    s.trust_env = False
-    return s
+    # 复用一个 Session，保持到 outliner 的 keep-alive 连接
+    global _OUTLINER_SESSION
+    if _OUTLINER_SESSION is None:
+        s = requests.Session()
+        s.trust_env = False
+        _OUTLINER_SESSION = s
+    return _OUTLINER_SESSION
 
 
 def _outliner_post(path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
@@ -751,7 +758,7 @@ def _fetch_subsection_outline_from_db(
     try:
         body = _outliner_post(
             "/subsection-tracking/get",
-            {"document_id": document_id, "section_id": section_id, "subsection_id": subsection_id},
+            {"document_id": document_id, "section_id": section_id, "subsection_id": subsection_id, "fields": ["outline"]},
         )
         tracking = body.get("tracking") or {}
         outline = (tracking.get("outline") or "").strip()
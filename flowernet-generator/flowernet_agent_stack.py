@@ -9,19 +9,38 @@ storage when optional services are unavailable.
 
 from __future__ import annotations
 
-from dataclasses import dataclass, field
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field, replace
 from pathlib import Path
 from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import atexit
+import base64
 import hashlib
+import heapq
 import json
 import math
 import os
 import queue
 import re
+import shutil
+import sqlite3
 import threading
 import time
 import uuid
 
+from domain_authority import get_domain_authority
+
+try:
+    import fcntl
+except ImportError:  # Windows: evaluation-log locking is per process only.
+    fcntl = None  # type: ignore
+
+try:
+    import numpy as np
+except Exception:  # numpy is optional; the local backend falls back to a Python scan.
+    np = None  # type: ignore
+
 
 PROJECT_ROOT = Path(__file__).resolve().parent
 DEFAULT_STATE_DIR = Path(os.getenv("FLOWERNET_STATE_DIR", str(PROJECT_ROOT / ".flowernet_state")))
@@ -56,6 +75,33 @@ def _cosine(left: List[float], right: List[float]) -> float:
     return max(0.0, min(1.0, sum(a * b for a, b in zip(left, right))))
 
 
+def _pack_embedding(vector: List[float], quantization: str) -> Dict[str, Any]:
+    """JSONL fields for one embedding: a float list, or base64 of the packed float16/int8 row."""
+    if np is None or quantization not in {"float16", "int8"}:
+        return {"embedding": vector}
+    values = np.asarray(vector, dtype=np.float32)
+    if quantization == "float16":
+        return {"embedding_b64": base64.b64encode(values.astype(np.float16).tobytes()).decode("ascii"), "embedding_dtype": "float16"}
+    scale = float(np.abs(values).max()) / 127.0 or 1.0
+    packed = np.rint(values / scale).astype(np.int8)
+    return {
+        "embedding_b64": base64.b64encode(packed.tobytes()).decode("ascii"),
+        "embedding_dtype": "int8",
+        "embedding_scale": scale,
+    }
+
+
+def _unpack_embedding(raw: Dict[str, Any]) -> Optional[List[float]]:
+    if raw.get("embedding") is not None or not raw.get("embedding_b64") or np is None:
+        return raw.get("embedding")
+    try:
+        dtype = np.int8 if raw.get("embedding_dtype") == "int8" else np.float16
+        values = np.frombuffer(base64.b64decode(raw["embedding_b64"]), dtype=dtype).astype(np.float32)
+        return (values * float(raw.get("embedding_scale") or 1.0)).tolist()
+    except Exception:
+        return None  # re-embedded from the text on load
+
+
 def _safe_jsonl_append(path: Path, obj: Dict[str, Any]) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
     with path.open("a", encoding="utf-8") as f:
@@ -90,45 +136,183 @@ class VectorRecord:
         return cls(id=stable, text=text, metadata=meta)
 
 
-class RAGReranker:
-    """Lightweight reranker used before/after Vector DB retrieval."""
+class HashEmbedder:
+    """Zero-dependency default: signed feature hashing of tokens (see ``_embedding``)."""
 
-    def __init__(self) -> None:
-        self.authority_domains = {
-            "doi.org", "arxiv.org", "ieee.org", "acm.org", "springer.com",
-            "sciencedirect.com", "nature.com", "science.org", "nih.gov",
-            "ncbi.nlm.nih.gov", "edu.cn", "tsinghua.edu.cn", "pku.edu.cn",
-            "cambridge.org", "oxfordacademic.com", "jstor.org", "sagepub.com",
-        }
+    def __init__(self, dim: int = 256) -> None:
+        self.dim = dim
+        self.model_id = f"hash-{dim}"
+
+    def encode(self, texts: List[str]) -> List[List[float]]:
+        return [_embedding(text, self.dim) for text in texts]
+
+
+class SentenceTransformerEmbedder:
+    """Local CPU sentence-transformers model; ``backend="onnx"`` runs it through ONNX Runtime.
+
+    Raises on construction when the package or model is unavailable so
+    ``get_embedder`` can fall back to :class:`HashEmbedder`.
+    """
+
+    def __init__(self, model_name: str, backend: str = "torch", batch_size: int = 32) -> None:
+        from sentence_transformers import SentenceTransformer
+
+        if backend == "onnx":
+            # sentence-transformers>=3.2 exports/loads an ONNX graph of the same model.
+            self._model = SentenceTransformer(model_name, device="cpu", backend="onnx")
+        else:
+            self._model = SentenceTransformer(model_name, device="cpu")
+        self.dim = int(self._model.get_sentence_embedding_dimension())
+        self.batch_size = max(1, batch_size)
+        self.model_id = f"st:{model_name}:{backend}"
+
+    def encode(self, texts: List[str]) -> List[List[float]]:
+        vectors = self._model.encode(
+            list(texts),
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        return [[float(x) for x in row] for row in vectors]
 
-    def score(self, query: str, text: str, metadata: Optional[Dict[str, Any]] = None) -> float:
-        metadata = metadata or {}
-        q_tokens = set(_tokenize(query))
-        d_tokens = set(_tokenize(text))
-        lexical = len(q_tokens & d_tokens) / max(1, len(q_tokens))
-        semantic = _cosine(_embedding(query), _embedding(text))
-        url = str(metadata.get("url") or "")
-        authority = 0.0
-        for domain in self.authority_domains:
-            if domain in url:
-                authority = 1.0
-                break
+
+class CachedEmbedder:
+    """Bounded LRU of embeddings keyed by content hash in front of any embedder.
+
+    ``encode`` looks every text up first and sends only the distinct misses to
+    the wrapped model, as one batch, so re-indexed results and repeated
+    queries/candidates never hit the model twice.
+    """
+
+    def __init__(self, embedder: Any, cache_size: int = 8192) -> None:
+        self.embedder = embedder
+        self.dim = embedder.dim
+        self.model_id = embedder.model_id
+        self.cache_size = max(1, cache_size)
+        self._cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "batches": 0}
+
+    def encode(self, texts: List[str]) -> List[List[float]]:
+        keys = [hashlib.blake2b(str(text or "").encode("utf-8"), digest_size=16).hexdigest() for text in texts]
+        found: Dict[str, List[float]] = {}
+        missing: Dict[str, str] = {}
+        with self._lock:
+            for key, text in zip(keys, texts):
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    found[key] = cached
+                    self.stats["hits"] += 1
+                elif key not in missing:
+                    missing[key] = str(text or "")
+                    self.stats["misses"] += 1
+        if missing:
+            vectors = self.embedder.encode(list(missing.values()))
+            with self._lock:
+                self.stats["batches"] += 1
+                for key, vector in zip(missing, vectors):
+                    found[key] = vector
+                    self._cache[key] = vector
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return [found[key] for key in keys]
+
+    def describe(self) -> Dict[str, Any]:
+        return {"model": self.model_id, "dim": self.dim, "cached": len(self._cache), **self.stats}
+
+
+class RAGReranker:
+    """Lightweight reranker used before/after Vector DB retrieval.
+
+    Token sets and embeddings are memoised per text in a bounded LRU keyed by
+    content hash, so the query is embedded once per call and texts seen in
+    earlier subsections or vector lookups are not re-hashed. ``score_many``
+    scores a whole candidate list with one matrix-vector product.
+    """
+
+    def __init__(self, cache_size: Optional[int] = None, embedder: Optional[Any] = None) -> None:
+        self.embedder = embedder or get_embedder()
+        self.domain_authority = get_domain_authority()
+        self.cache_size = max(1, int(cache_size or os.getenv("FLOWERNET_RERANK_CACHE_SIZE", "4096")))
+        self._features: "OrderedDict[str, Tuple[frozenset, Any]]" = OrderedDict()
+        self._features_lock = threading.Lock()
+        self.cache_stats = {"hits": 0, "misses": 0}
+
+    def _text_features(self, text: str) -> Tuple[frozenset, Any]:
+        return self._features_many([text])[0]
+
+    def _features_many(self, texts: List[str]) -> List[Tuple[frozenset, Any]]:
+        """Features for every text; all cache misses are embedded in one batch."""
+        keys = [hashlib.blake2b(str(text or "").encode("utf-8"), digest_size=16).hexdigest() for text in texts]
+        found: Dict[str, Tuple[frozenset, Any]] = {}
+        missing: Dict[str, str] = {}
+        with self._features_lock:
+            for key, text in zip(keys, texts):
+                cached = self._features.get(key)
+                if cached is not None:
+                    self._features.move_to_end(key)
+                    found[key] = cached
+                    self.cache_stats["hits"] += 1
+                elif key not in missing:
+                    missing[key] = str(text or "")
+                    self.cache_stats["misses"] += 1
+        if missing:
+            vectors = self.embedder.encode(list(missing.values()))
+            with self._features_lock:
+                for (key, text), vector in zip(missing.items(), vectors):
+                    features = (frozenset(_tokenize(text)), np.asarray(vector, dtype=np.float64) if np is not None else vector)
+                    found[key] = features
+                    self._features[key] = features
+                while len(self._features) > self.cache_size:
+                    self._features.popitem(last=False)
+        return [found[key] for key in keys]
+
+    def _static_score(self, metadata: Dict[str, Any]) -> float:
+        url = str(metadata.get("url") or metadata.get("href") or "")
+        authority = 1.0 if url and self.domain_authority.is_authority(url) else 0.0
         prior = max(
             float(metadata.get("quality_score", 0.0) or 0.0),
             float(metadata.get("domain_score", 0.0) or 0.0),
             float(metadata.get("semantic_score", 0.0) or 0.0),
         )
-        return round(0.42 * lexical + 0.34 * semantic + 0.16 * authority + 0.08 * prior, 4)
+        return 0.16 * authority + 0.08 * prior
+
+    def score(self, query: str, text: str, metadata: Optional[Dict[str, Any]] = None) -> float:
+        return self.score_many(query, [text], [metadata or {}])[0]
+
+    def score_many(
+        self,
+        query: str,
+        texts: List[str],
+        metadatas: Optional[List[Optional[Dict[str, Any]]]] = None,
+    ) -> List[float]:
+        if not texts:
+            return []
+        metadatas = metadatas or [None] * len(texts)
+        (q_tokens, q_vector), *features = self._features_many([query, *texts])
+        if np is not None:
+            semantic = np.clip(np.stack([vector for _, vector in features]) @ q_vector, 0.0, 1.0).tolist()
+        else:
+            semantic = [_cosine(q_vector, vector) for _, vector in features]
+        scores: List[float] = []
+        for (d_tokens, _), sem, metadata in zip(features, semantic, metadatas):
+            lexical = len(q_tokens & d_tokens) / max(1, len(q_tokens))
+            scores.append(round(0.42 * lexical + 0.34 * sem + self._static_score(metadata or {}), 4))
+        return scores
 
     def rerank(self, query: str, items: List[Dict[str, Any]], top_k: int = 8) -> List[Dict[str, Any]]:
-        ranked: List[Dict[str, Any]] = []
-        for item in items or []:
-            text = "\n".join(
+        items = list(items or [])
+        texts = [
+            "\n".join(
                 str(item.get(key) or "")
                 for key in ("title", "body", "snippet", "abstract", "url", "href", "link")
             )
-            meta = dict(item)
-            score = self.score(query, text, meta)
+            for item in items
+        ]
+        ranked: List[Dict[str, Any]] = []
+        for item, score in zip(items, self.score_many(query, texts, items)):
             enriched = dict(item)
             enriched["rerank_score"] = score
             ranked.append(enriched)
@@ -136,42 +320,763 @@ class RAGReranker:
         return ranked[:top_k]
 
 
-class VectorStore:
-    """Vector DB adapter with Qdrant/Chroma optional backends and file fallback."""
+class _MatrixIndex:
+    """Local vector index: one contiguous embedding matrix plus id/namespace side arrays.
+
+    Rows are appended in insertion order and overwritten in place on re-upsert,
+    so a query is a single matrix-vector product followed by ``argpartition``.
+    Each namespace keeps its own row partition, so a namespace-scoped query
+    only touches that namespace's rows however large the global store grows.
 
-    def __init__(self, backend: Optional[str] = None, collection: str = "flowernet_rag", dim: int = 256):
+    ``quantization`` selects the row storage: ``float32``, ``float16`` (half
+    the memory) or ``int8`` with one float32 scale per row (a quarter). Packed
+    rows are widened to float32 block by block while scoring, so a query never
+    materialises a full-precision copy of the matrix.
+    """
+
+    SCORE_BLOCK_ROWS = 4096
+
+    def __init__(self, dim: int, capacity: int = 1024, quantization: str = "float32") -> None:
+        self.dim = dim
+        self.quantization = quantization if quantization in {"float16", "int8"} else "float32"
+        self._dtype = {"float32": np.float32, "float16": np.float16, "int8": np.int8}[self.quantization]
+        self._matrix = np.zeros((max(1, capacity), dim), dtype=self._dtype)
+        # int8 rows hold round(v / scale); scores are rescaled after the dot product.
+        self._scales = np.ones(max(1, capacity), dtype=np.float32) if self.quantization == "int8" else None
+        self._namespaces = np.zeros(max(1, capacity), dtype=np.int32)
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._namespace_codes: Dict[str, int] = {}
+        self._partitions: Dict[int, List[int]] = {}
+        self._partition_arrays: Dict[int, Any] = {}
+        self.ann: Optional["_IVFIndex"] = None
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _reserve(self, needed: int) -> None:
+        capacity = self._matrix.shape[0]
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2)
+        size = len(self._ids)
+        matrix = np.zeros((capacity, self.dim), dtype=self._dtype)
+        matrix[:size] = self._matrix[:size]
+        namespaces = np.zeros(capacity, dtype=np.int32)
+        namespaces[:size] = self._namespaces[:size]
+        self._matrix, self._namespaces = matrix, namespaces
+        if self._scales is not None:
+            scales = np.ones(capacity, dtype=np.float32)
+            scales[:size] = self._scales[:size]
+            self._scales = scales
+
+    def _encode(self, vectors: Any) -> Tuple[Any, Optional[Any]]:
+        """Pack float32 rows into the storage dtype (plus per-row scales for int8)."""
+        if self.quantization != "int8":
+            return vectors.astype(self._dtype), None
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        return np.rint(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    def vectors(self, rows: Any) -> Any:
+        """Dequantised float32 copy of ``rows`` (a slice or an index array)."""
+        block = self._matrix[rows].astype(np.float32)
+        if self._scales is not None:
+            block *= self._scales[rows][:, None]
+        return block
+
+    def export(self) -> Tuple[Any, Optional[Any]]:
+        size = len(self._ids)
+        return self._matrix[:size].copy(), self._scales[:size].copy() if self._scales is not None else None
+
+    @property
+    def nbytes(self) -> int:
+        size = len(self._ids)
+        return int(self._matrix[:size].nbytes + (self._scales[:size].nbytes if self._scales is not None else 0))
+
+    def add(self, rec_id: str, namespace: str, embedding: List[float]) -> None:
+        code = self._namespace_codes.setdefault(str(namespace or ""), len(self._namespace_codes))
+        row = self._rows.get(rec_id)
+        if row is None:
+            row = len(self._ids)
+            self._reserve(row + 1)
+            self._ids.append(rec_id)
+            self._rows[rec_id] = row
+            self._partition_append(code, row)
+        elif int(self._namespaces[row]) != code:
+            previous = int(self._namespaces[row])
+            self._partitions[previous].remove(row)
+            self._partition_arrays.pop(previous, None)
+            self._partition_append(code, row)
+        packed, scales = self._encode(np.asarray(embedding, dtype=np.float32)[None, :])
+        self._matrix[row] = packed[0]
+        if scales is not None:
+            self._scales[row] = scales[0]
+        self._namespaces[row] = code
+        if self.ann is not None:
+            self.ann.add(row)
+
+    def search(
+        self,
+        query_embedding: List[float],
+        k: int,
+        namespace: Optional[str] = None,
+        exact: bool = False,
+    ) -> List[Tuple[str, float]]:
+        size = len(self._ids)
+        if not size or k <= 0:
+            return []
+        if namespace:
+            code = self._namespace_codes.get(namespace)
+            if code is None:
+                return []
+            return self._top_k(self._partition_rows(code), query_embedding, k)
+        if not exact and self.ann is not None and self.ann.trained:
+            return self._top_k(self.ann.candidate_rows(query_embedding), query_embedding, k)
+        return self._top_k(None, query_embedding, k)
+
+    def extend(self, ids: List[str], namespaces: List[str], matrix: Any, scales: Optional[Any] = None) -> None:
+        """Bulk-append rows for ids not indexed yet (snapshot load reads the matrix in one copy).
+
+        ``matrix``/``scales`` already in this index's storage format are copied
+        as-is; anything else (e.g. a float32 snapshot loaded into an int8
+        store) is dequantised and re-packed block by block.
+        """
+        start = len(self._ids)
+        self._reserve(start + len(ids))
+        if matrix.dtype == self._dtype and (scales is None) == (self._scales is None):
+            self._matrix[start:start + len(ids)] = matrix
+            if scales is not None:
+                self._scales[start:start + len(ids)] = scales
+        else:
+            for offset in range(0, len(ids), self.SCORE_BLOCK_ROWS):
+                block = np.asarray(matrix[offset:offset + self.SCORE_BLOCK_ROWS], dtype=np.float32)
+                if scales is not None:
+                    block = block * np.asarray(scales[offset:offset + self.SCORE_BLOCK_ROWS], dtype=np.float32)[:, None]
+                packed, packed_scales = self._encode(block)
+                self._matrix[start + offset:start + offset + block.shape[0]] = packed
+                if packed_scales is not None:
+                    self._scales[start + offset:start + offset + block.shape[0]] = packed_scales
+        for row, (rec_id, namespace) in enumerate(zip(ids, namespaces), start=start):
+            code = self._namespace_codes.setdefault(str(namespace or ""), len(self._namespace_codes))
+            self._ids.append(rec_id)
+            self._rows[rec_id] = row
+            self._namespaces[row] = code
+            self._partitions.setdefault(code, []).append(row)
+        self._partition_arrays.clear()
+
+    def _partition_append(self, code: int, row: int) -> None:
+        self._partitions.setdefault(code, []).append(row)
+        self._partition_arrays.pop(code, None)
+
+    def _partition_rows(self, code: int) -> Any:
+        rows = self._partition_arrays.get(code)
+        if rows is None:
+            rows = np.asarray(self._partitions.get(code, []), dtype=np.int64)
+            self._partition_arrays[code] = rows
+        return rows
+
+    def partition_sizes(self) -> Dict[str, int]:
+        return {namespace: len(self._partitions.get(code, [])) for namespace, code in self._namespace_codes.items()}
+
+    def _scores(self, rows: Optional[Any], query: Any) -> Any:
+        if self.quantization == "float32":
+            return (self._matrix[rows] if rows is not None else self._matrix[: len(self._ids)]) @ query
+        total = rows.shape[0] if rows is not None else len(self._ids)
+        scores = np.empty(total, dtype=np.float32)
+        for start in range(0, total, self.SCORE_BLOCK_ROWS):
+            end = min(total, start + self.SCORE_BLOCK_ROWS)
+            block = rows[start:end] if rows is not None else slice(start, end)
+            scores[start:end] = self._matrix[block].astype(np.float32) @ query
+            if self._scales is not None:
+                scores[start:end] *= self._scales[block]
+        return scores
+
+    def _top_k(self, rows: Optional[Any], query_embedding: List[float], k: int) -> List[Tuple[str, float]]:
+        if rows is not None and not rows.size:
+            return []
+        scores = self._scores(rows, np.asarray(query_embedding, dtype=np.float32))
+        k = min(k, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k] if k < scores.shape[0] else np.arange(scores.shape[0])
+        top = top[np.argsort(-scores[top], kind="stable")]
+        picked = rows[top] if rows is not None else top
+        return [
+            (self._ids[row], max(0.0, min(1.0, score)))
+            for row, score in zip(picked.tolist(), scores[top].tolist())
+        ]
+
+
+class _IVFIndex:
+    """Inverted-file ANN index (spherical k-means) over the rows of a :class:`_MatrixIndex`.
+
+    Below ``min_train`` rows the owner keeps answering exactly. Once trained,
+    new rows are assigned to their nearest centroid on insert, a query scans
+    only the ``nprobe`` closest lists, and the centroids are retrained when the
+    index has grown ``retrain_factor`` times since the last training. State
+    (centroids plus the id -> list assignment) is saved as ``.npz`` next to the
+    collection JSONL so restarts skip both training and re-assignment.
+    """
+
+    def __init__(
+        self,
+        owner: _MatrixIndex,
+        path: Optional[Path] = None,
+        nlist: int = 0,
+        nprobe: int = 8,
+        min_train: int = 2048,
+        retrain_factor: float = 4.0,
+        save_every: int = 1000,
+        iterations: int = 12,
+        seed: int = 13,
+    ) -> None:
+        self.owner = owner
+        self.path = Path(path) if path else None
+        self.nlist_setting = max(0, int(nlist))
+        self.nprobe = max(1, int(nprobe))
+        self.min_train = max(16, int(min_train))
+        self.retrain_factor = max(1.5, float(retrain_factor))
+        self.save_every = max(1, int(save_every))
+        self.iterations = max(1, int(iterations))
+        self.seed = seed
+        self.centroids: Optional[Any] = None
+        self.lists: List[List[int]] = []
+        self._row_list: List[int] = []
+        self.trained_size = 0
+        self._unsaved = 0
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def _nearest_lists(self, rows: Any) -> Any:
+        labels = np.empty(rows.shape[0], dtype=np.int32)
+        for start in range(0, rows.shape[0], 8192):
+            block = self.owner.vectors(rows[start:start + 8192])
+            labels[start:start + 8192] = np.argmax(block @ self.centroids.T, axis=1)
+        return labels
+
+    def _assign_all(self, labels: Any) -> None:
+        self.lists = [[] for _ in range(self.centroids.shape[0])]
+        for row, label in enumerate(labels.tolist()):
+            self.lists[label].append(row)
+        self._row_list = labels.tolist()
+
+    def train(self) -> None:
+        size = len(self.owner)
+        nlist = min(size, self.nlist_setting or max(16, int(round(math.sqrt(size)))))
+        rng = np.random.default_rng(self.seed)
+        sample = self.owner.vectors(np.sort(rng.choice(size, min(size, max(nlist * 64, 8192)), replace=False)))
+        centroids = sample[rng.choice(sample.shape[0], nlist, replace=False)].copy()
+        for _ in range(self.iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            norms = np.linalg.norm(sums, axis=1)
+            filled = norms > 0
+            # Empty clusters keep their previous centroid.
+            centroids[filled] = sums[filled] / norms[filled, None]
+        self.centroids = centroids.astype(np.float32)
+        self._assign_all(self._nearest_lists(np.arange(size)))
+        self.trained_size = size
+        self.save()
+
+    def add(self, row: int) -> None:
+        size = len(self.owner)
+        if not self.trained:
+            if size >= self.min_train:
+                self.train()
+            return
+        if size >= self.trained_size * self.retrain_factor:
+            self.train()
+            return
+        label = int(np.argmax(self.centroids @ self.owner.vectors(np.asarray([row]))[0]))
+        if row < len(self._row_list):
+            previous = self._row_list[row]
+            if previous == label:
+                return
+            self.lists[previous].remove(row)
+            self._row_list[row] = label
+        else:
+            self._row_list.append(label)
+        self.lists[label].append(row)
+        self._unsaved += 1
+        if self._unsaved >= self.save_every:
+            self.save()
+
+    def candidate_rows(self, query_embedding: List[float]) -> Any:
+        scores = self.centroids @ np.asarray(query_embedding, dtype=np.float32)
+        nprobe = min(self.nprobe, scores.shape[0])
+        probe = np.argpartition(-scores, nprobe - 1)[:nprobe]
+        rows = [row for label in probe.tolist() for row in self.lists[label]]
+        return np.fromiter(rows, dtype=np.int64, count=len(rows))
+
+    def save(self) -> None:
+        self._unsaved = 0
+        if self.path is None or not self.trained:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(self.path.name + ".tmp.npz")
+            np.savez(
+                tmp_path,
+                centroids=self.centroids,
+                ids=np.asarray(self.owner._ids[: len(self._row_list)], dtype=str),
+                labels=np.asarray(self._row_list, dtype=np.int32),
+                trained_size=np.asarray([self.trained_size]),
+            )
+            os.replace(tmp_path, self.path)
+        except Exception:
+            pass
+
+    def load(self) -> bool:
+        """Restore saved centroids/assignments; rows unknown to the snapshot are assigned now."""
+        if self.path is None or not self.path.exists():
+            return False
+        try:
+            with np.load(self.path, allow_pickle=False) as state:
+                centroids = state["centroids"].astype(np.float32)
+                saved = dict(zip(state["ids"].tolist(), state["labels"].tolist()))
+                trained_size = int(state["trained_size"][0])
+        except Exception:
+            return False
+        if centroids.ndim != 2 or centroids.shape[1] != self.owner.dim:
+            return False
+        self.centroids = centroids
+        labels = np.asarray([saved.get(rec_id, -1) for rec_id in self.owner._ids], dtype=np.int32)
+        missing = np.flatnonzero((labels < 0) | (labels >= centroids.shape[0]))
+        if missing.size:
+            labels[missing] = self._nearest_lists(missing)
+        self._assign_all(labels)
+        self.trained_size = max(1, trained_size or len(self.owner))
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        sizes = [len(rows) for rows in self.lists]
+        return {
+            "type": "ivf",
+            "trained": self.trained,
+            "nlist": len(self.lists),
+            "nprobe": self.nprobe,
+            "trained_size": self.trained_size,
+            "max_list_size": max(sizes) if sizes else 0,
+        }
+
+
+class _WriteBehindIndexer:
+    """Background writer that takes ``VectorStore.upsert`` off the caller's path.
+
+    Pending records are coalesced by id (a re-submitted id replaces the queued
+    copy), drained in batches of ``batch_size`` by one daemon thread, and the
+    queue is bounded: when ``max_pending`` is reached ``submit`` waits up to
+    ``block_seconds`` and then reports the overflow so the caller can upsert
+    inline. ``flush`` waits for the queue and the in-flight batch to drain.
+    """
+
+    def __init__(
+        self,
+        store: "VectorStore",
+        max_pending: int = 2048,
+        batch_size: int = 64,
+        linger_seconds: float = 0.05,
+        block_seconds: float = 0.5,
+    ) -> None:
+        self.store = store
+        self.max_pending = max(1, int(max_pending))
+        self.batch_size = max(1, int(batch_size))
+        self.linger_seconds = max(0.0, float(linger_seconds))
+        self.block_seconds = max(0.0, float(block_seconds))
+        self._pending: "OrderedDict[str, VectorRecord]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"submitted": 0, "coalesced": 0, "written": 0, "batches": 0, "overflow": 0, "errors": 0}
+
+    @property
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._pending) + self._in_flight
+
+    def submit(self, records: List[VectorRecord]) -> List[VectorRecord]:
+        """Queue records; returns those that did not fit and must be written inline."""
+        overflow: List[VectorRecord] = []
+        with self._cond:
+            self._ensure_worker()
+            deadline = time.time() + self.block_seconds
+            for rec in records:
+                self.stats["submitted"] += 1
+                if rec.id in self._pending:
+                    self._pending[rec.id] = rec
+                    self.stats["coalesced"] += 1
+                    continue
+                while len(self._pending) >= self.max_pending and not self._stopped:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if len(self._pending) >= self.max_pending or self._stopped:
+                    overflow.append(rec)
+                    self.stats["overflow"] += 1
+                    continue
+                self._pending[rec.id] = rec
+            self._cond.notify_all()
+        return overflow
+
+    def _ensure_worker(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run,
+                daemon=True,
+                name=f"vector-index-{self.store.collection_name}",
+            )
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopped:
+                    self._cond.wait()
+                if not self._pending and self._stopped:
+                    return
+                if len(self._pending) < self.batch_size and not self._stopped and self.linger_seconds:
+                    # Let a burst of subsections coalesce into one batch.
+                    self._cond.wait(self.linger_seconds)
+                batch = []
+                while self._pending and len(batch) < self.batch_size:
+                    batch.append(self._pending.popitem(last=False)[1])
+                self._in_flight = len(batch)
+                self._cond.notify_all()
+            ok = False
+            try:
+                if batch:
+                    self.store.upsert(batch)
+                ok = True
+            except Exception:
+                pass
+            finally:
+                with self._cond:
+                    if batch and ok:
+                        self.stats["written"] += len(batch)
+                        self.stats["batches"] += 1
+                    elif batch:
+                        self.stats["errors"] += 1
+                    self._in_flight = 0
+                    self._cond.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            if self._pending:
+                self._ensure_worker()
+                self._cond.notify_all()
+            while self._pending or self._in_flight:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def stop(self, timeout: Optional[float] = None) -> bool:
+        flushed = self.flush(timeout)
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        return flushed
+
+
+class VectorStore:
+    """Vector DB adapter with Qdrant/Chroma optional backends and file fallback.
+
+    Local persistence is a binary snapshot plus an append log. The snapshot is
+    ``<collection>.snapshot-<gen>.npy`` (float32 embeddings, memory-mapped on
+    load) with a ``.meta.jsonl`` sidecar (id/text/metadata in row order), made
+    current by the ``<collection>.snapshot.json`` manifest. Upserts append to
+    ``<collection>.jsonl``; once it holds ``FLOWERNET_VECTOR_COMPACT_LOG_RECORDS``
+    lines a background compaction rotates it aside and folds everything into
+    the next snapshot generation, so re-upserted ids stop costing disk.
+
+    With the NumPy index, embeddings live only in the index matrix (stored as
+    ``FLOWERNET_VECTOR_QUANTIZATION`` = float32/float16/int8); resident records
+    keep id/text/metadata, and quantised stores also pack log embeddings.
+
+    Embeddings come from a pluggable embedder (``get_embedder``: the hash
+    embedder by default, or a local sentence-transformers/ONNX model). Whole
+    batches are encoded at once, and state written by a different embedder is
+    re-encoded from the stored text on load.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[str] = None,
+        collection: str = "flowernet_rag",
+        dim: int = 256,
+        embedder: Optional[Any] = None,
+    ):
         self.backend = (backend or os.getenv("FLOWERNET_VECTOR_BACKEND", "auto")).lower()
         self.collection_name = collection
-        self.dim = dim
-        self.reranker = RAGReranker()
+        self.embedder = embedder or get_embedder(dim)
+        self.dim = self.embedder.dim
+        self.reranker = RAGReranker(embedder=self.embedder)
+        self.candidate_pool = max(1, int(os.getenv("FLOWERNET_VECTOR_CANDIDATE_POOL", "32")))
+        self.ann_mode = os.getenv("FLOWERNET_VECTOR_ANN", "off").strip().lower()
         self._records: Dict[str, VectorRecord] = {}
+        # Record ids per namespace; the Python-scan fallback uses it as its partition.
+        self._namespace_ids: Dict[str, Dict[str, None]] = {}
+        self.quantization = os.getenv("FLOWERNET_VECTOR_QUANTIZATION", "float32").strip().lower()
+        self._index = _MatrixIndex(self.dim, quantization=self.quantization) if np is not None else None
         self._lock = threading.Lock()
         self._client = None
         self._collection = None
         self._path = _ensure_state_dir() / f"{collection}.jsonl"
+        self._manifest_path = self._path.with_name(f"{collection}.snapshot.json")
+        self.compact_threshold = max(0, int(os.getenv("FLOWERNET_VECTOR_COMPACT_LOG_RECORDS", "5000")))
+        self._snapshot_generation = 0
+        self._log_records = 0
+        self._compacting = False
+        self._compact_lock = threading.Lock()
+        self.read_flush_seconds = max(0.0, float(os.getenv("FLOWERNET_VECTOR_INDEX_READ_FLUSH_SECONDS", "2")))
+        self._indexer: Optional[_WriteBehindIndexer] = None
+        if os.getenv("FLOWERNET_VECTOR_ASYNC_INDEX", "true").lower() == "true":
+            self._indexer = _WriteBehindIndexer(
+                self,
+                max_pending=int(os.getenv("FLOWERNET_VECTOR_INDEX_QUEUE_SIZE", "2048")),
+                batch_size=int(os.getenv("FLOWERNET_VECTOR_INDEX_BATCH_SIZE", "64")),
+            )
+            atexit.register(self.flush, 10.0)
         self.active_backend = "memory"
+        self._reencoded = False
         self._load_file_records()
+        self._attach_ann()
         self._init_optional_backend()
 
+    def _snapshot_paths(self, generation: int) -> Tuple[Path, Path]:
+        stem = f"{self.collection_name}.snapshot-{generation}"
+        return self._path.with_name(f"{stem}.npy"), self._path.with_name(f"{stem}.meta.jsonl")
+
+    def _snapshot_scales_path(self, generation: int) -> Path:
+        return self._path.with_name(f"{self.collection_name}.snapshot-{generation}.scales.npy")
+
+    def _resident(self, rec: VectorRecord) -> VectorRecord:
+        # Once the matrix holds the embedding, the in-memory record drops its float list.
+        return replace(rec, embedding=None) if self._index is not None else rec
+
+    def _rotated_log_path(self, generation: int) -> Path:
+        return self._path.with_name(f"{self._path.name}.{generation}.compacting")
+
+    def _rotated_logs(self) -> List[Tuple[int, Path]]:
+        logs: List[Tuple[int, Path]] = []
+        for path in self._path.parent.glob(f"{self._path.name}.*.compacting"):
+            try:
+                logs.append((int(path.name[len(self._path.name) + 1:].split(".")[0]), path))
+            except ValueError:
+                continue
+        return sorted(logs)
+
     def _load_file_records(self) -> None:
-        if not self._path.exists():
-            return
+        generation = self._load_snapshot()
+        for log_generation, log_path in self._rotated_logs():
+            # Logs at or below the snapshot generation were already folded into it.
+            if log_generation > generation:
+                self._log_records += self._replay_log(log_path)
+        self._log_records += self._replay_log(self._path)
+
+    def _load_snapshot(self) -> int:
+        try:
+            manifest = json.loads(self._manifest_path.read_text(encoding="utf-8"))
+            generation = int(manifest.get("generation", 0) or 0)
+        except Exception:
+            return 0
+        matrix_path, meta_path = self._snapshot_paths(generation)
+        records: List[VectorRecord] = []
         try:
-            with self._path.open("r", encoding="utf-8") as f:
+            with meta_path.open("r", encoding="utf-8") as f:
                 for line in f:
-                    if not line.strip():
-                        continue
+                    if line.strip():
+                        raw = json.loads(line)
+                        records.append(VectorRecord(id=str(raw["id"]), text=str(raw["text"]), metadata=dict(raw.get("metadata") or {})))
+            # Vectors written by another embedder are not loaded; they are re-encoded from text below.
+            same_model = manifest.get("embedder", "hash-256") == self.embedder.model_id
+            self._reencoded = self._reencoded or not same_model
+            matrix = np.load(matrix_path, mmap_mode="r") if self._index is not None and same_model else None
+            if matrix is not None and tuple(matrix.shape) != (len(records), self.dim):
+                raise ValueError("snapshot shape mismatch")
+            scales = None
+            if matrix is not None and manifest.get("quantization") == "int8":
+                scales = np.load(self._snapshot_scales_path(generation))
+                if scales.shape != (len(records),):
+                    raise ValueError("snapshot scales mismatch")
+        except Exception:
+            return 0
+        for rec in records:
+            self._records[rec.id] = rec
+            self._namespace_ids.setdefault(str(rec.metadata.get("namespace") or ""), {})[rec.id] = None
+        if matrix is None:
+            self._embed_missing(records)
+        if self._index is not None:
+            # Snapshot embeddings live only in the index matrix, not as per-record float lists.
+            self._index.extend(
+                [rec.id for rec in records],
+                [str(rec.metadata.get("namespace") or "") for rec in records],
+                matrix if matrix is not None else np.asarray([rec.embedding for rec in records], dtype=np.float32).reshape(-1, self.dim),
+                scales,
+            )
+            for rec in records:
+                rec.embedding = None
+        self._snapshot_generation = generation
+        return generation
+
+    def _replay_log(self, path: Path) -> int:
+        if not path.exists():
+            return 0
+        replayed = 0
+        batch: List[VectorRecord] = []
+        with path.open("r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
                     raw = json.loads(line)
-                    rec = VectorRecord(
-                        id=str(raw.get("id") or ""),
-                        text=str(raw.get("text") or ""),
-                        metadata=dict(raw.get("metadata") or {}),
-                        embedding=raw.get("embedding"),
-                    )
-                    if rec.id and rec.text:
-                        self._records[rec.id] = rec
+                except ValueError:
+                    continue  # torn trailing write
+                same_model = raw.get("embedder", "hash-256") == self.embedder.model_id
+                self._reencoded = self._reencoded or not same_model
+                rec = VectorRecord(
+                    id=str(raw.get("id") or ""),
+                    text=str(raw.get("text") or ""),
+                    metadata=dict(raw.get("metadata") or {}),
+                    embedding=_unpack_embedding(raw) if same_model else None,
+                )
+                if rec.id and rec.text:
+                    batch.append(rec)
+                    if len(batch) >= 256:
+                        replayed += self._replay_batch(batch)
+                        batch = []
+        return replayed + self._replay_batch(batch)
+
+    def _replay_batch(self, records: List[VectorRecord]) -> int:
+        self._embed_missing(records)
+        for rec in records:
+            previous = self._records.get(rec.id)
+            self._index_record(rec, previous)
+            self._records[rec.id] = self._resident(rec)
+        return len(records)
+
+    def _embed_missing(self, records: List[VectorRecord]) -> None:
+        """Encode every record lacking a usable embedding in one embedder batch."""
+        pending = [rec for rec in records if not rec.embedding or len(rec.embedding) != self.dim]
+        if pending:
+            for rec, vector in zip(pending, self.embedder.encode([rec.text for rec in pending])):
+                rec.embedding = vector
+
+    def compact(self) -> Dict[str, Any]:
+        """Fold the append log into a new snapshot generation and drop superseded files."""
+        if self._index is None:
+            return {"compacted": False, "reason": "numpy_unavailable"}
+        with self._compact_lock:
+            with self._lock:
+                generation = self._snapshot_generation + 1
+                rotated = self._rotated_log_path(generation)
+                if self._path.exists():
+                    if rotated.exists():
+                        # Left over from an interrupted compaction of this same generation.
+                        with self._path.open("rb") as src, rotated.open("ab") as dst:
+                            shutil.copyfileobj(src, dst)
+                        self._path.unlink()
+                    else:
+                        os.replace(self._path, rotated)
+                self._log_records = 0
+                ids = list(self._index._ids)
+                records = [self._records[rec_id] for rec_id in ids]
+                matrix, scales = self._index.export()
+
+            matrix_path, meta_path = self._snapshot_paths(generation)
+            tmp_matrix = matrix_path.with_name(matrix_path.name + ".tmp")
+            tmp_meta = meta_path.with_name(meta_path.name + ".tmp")
+            with tmp_matrix.open("wb") as f:
+                np.save(f, matrix)
+            scales_path = self._snapshot_scales_path(generation)
+            if scales is not None:
+                tmp_scales = scales_path.with_name(scales_path.name + ".tmp")
+                with tmp_scales.open("wb") as f:
+                    np.save(f, scales)
+                os.replace(tmp_scales, scales_path)
+            with tmp_meta.open("w", encoding="utf-8") as f:
+                for rec in records:
+                    f.write(json.dumps({"id": rec.id, "text": rec.text, "metadata": rec.metadata}, ensure_ascii=False) + "\n")
+            os.replace(tmp_matrix, matrix_path)
+            os.replace(tmp_meta, meta_path)
+            tmp_manifest = self._manifest_path.with_name(self._manifest_path.name + ".tmp")
+            tmp_manifest.write_text(
+                json.dumps(
+                    {
+                        "generation": generation,
+                        "records": len(ids),
+                        "dim": self.dim,
+                        "embedder": self.embedder.model_id,
+                        "quantization": self._index.quantization,
+                        "created_at": time.time(),
+                    }
+                ),
+                encoding="utf-8",
+            )
+            os.replace(tmp_manifest, self._manifest_path)
+            self._snapshot_generation = generation
+
+            for log_generation, log_path in self._rotated_logs():
+                if log_generation <= generation:
+                    log_path.unlink(missing_ok=True)
+            for old in self._path.parent.glob(f"{self.collection_name}.snapshot-*"):
+                if old.name not in {matrix_path.name, meta_path.name, scales_path.name}:
+                    old.unlink(missing_ok=True)
+        return {"compacted": True, "generation": generation, "records": len(ids)}
+
+    def _compact_in_background(self) -> None:
+        try:
+            self.compact()
         except Exception:
-            self._records = {}
+            pass
+        finally:
+            self._compacting = False
+
+    def _attach_ann(self) -> None:
+        # Attached after the initial load so replaying the log does not retrain repeatedly.
+        if self._index is None or self.ann_mode != "ivf":
+            return
+        ann = _IVFIndex(
+            self._index,
+            path=self._path.with_suffix(".ivf.npz"),
+            nlist=int(os.getenv("FLOWERNET_VECTOR_IVF_LISTS", "0")),
+            nprobe=int(os.getenv("FLOWERNET_VECTOR_IVF_NPROBE", "8")),
+            min_train=int(os.getenv("FLOWERNET_VECTOR_ANN_MIN_RECORDS", "2048")),
+        )
+        # Saved centroids describe the previous embedder's space when state was re-encoded.
+        if (self._reencoded or not ann.load()) and len(self._index) >= ann.min_train:
+            ann.train()
+        self._index.ann = ann
+
+    def _index_record(self, rec: VectorRecord, previous: Optional[VectorRecord] = None) -> None:
+        if not rec.embedding or len(rec.embedding) != self.dim:
+            rec.embedding = self.embedder.encode([rec.text])[0]
+        namespace = str(rec.metadata.get("namespace") or "")
+        if previous is not None:
+            self._namespace_ids.get(str(previous.metadata.get("namespace") or ""), {}).pop(rec.id, None)
+        self._namespace_ids.setdefault(namespace, {})[rec.id] = None
+        if self._index is not None:
+            self._index.add(rec.id, namespace, rec.embedding)
+
+    def _local_candidates(self, query_embedding: List[float], limit: int, namespace: Optional[str]) -> List[Dict[str, Any]]:
+        with self._lock:
+            if self._index is not None:
+                hits = self._index.search(query_embedding, limit, namespace)
+            else:
+                rec_ids = self._namespace_ids.get(namespace, {}) if namespace else self._records
+                scored = ((rec_id, _cosine(query_embedding, self._records[rec_id].embedding or [])) for rec_id in rec_ids)
+                hits = heapq.nlargest(limit, scored, key=lambda pair: pair[1])
+            records = [(self._records[rec_id], score) for rec_id, score in hits if rec_id in self._records]
+        return [
+            {"id": rec.id, "text": rec.text, "metadata": rec.metadata, "vector_score": score}
+            for rec, score in records
+        ]
 
     def _init_optional_backend(self) -> None:
         if self.backend in {"qdrant", "auto"} and os.getenv("QDRANT_URL"):
@@ -191,6 +1096,15 @@ class VectorStore:
                         collection_name=self.collection_name,
                         vectors_config=models.VectorParams(size=self.dim, distance=models.Distance.COSINE),
                     )
+                try:
+                    # Keyword index so namespace-filtered searches stay selective.
+                    self._client.create_payload_index(
+                        collection_name=self.collection_name,
+                        field_name="namespace",
+                        field_schema=models.PayloadSchemaType.KEYWORD,
+                    )
+                except Exception:
+                    pass
                 self.active_backend = "qdrant"
                 return
             except Exception:
@@ -213,32 +1127,64 @@ class VectorStore:
             "configured_backend": self.backend,
             "collection": self.collection_name,
             "records": len(self._records),
+            "namespaces": len(self._namespace_ids),
+            "snapshot_generation": self._snapshot_generation,
+            "log_records": self._log_records,
+            "index_queue": (
+                {"pending": self._indexer.pending, **self._indexer.stats} if self._indexer is not None else None
+            ),
+            "embedder": self.embedder.describe() if hasattr(self.embedder, "describe") else {"model": self.embedder.model_id},
+            "local_index": "numpy_matrix" if self._index is not None else "python_scan",
+            "quantization": self._index.quantization if self._index is not None else None,
+            "index_bytes": self._index.nbytes if self._index is not None else None,
+            "ann_index": self._index.ann.stats() if self._index is not None and self._index.ann is not None else None,
             "qdrant_configured": bool(os.getenv("QDRANT_URL")),
             "chroma_persist_dir": os.getenv("CHROMA_PERSIST_DIR", str(_ensure_state_dir() / "chroma")),
         }
 
     def upsert(self, records: Iterable[VectorRecord]) -> int:
-        prepared: List[VectorRecord] = []
-        for rec in records:
-            if not rec.id or not rec.text:
-                continue
-            if rec.embedding is None:
-                rec.embedding = _embedding(rec.text, self.dim)
-            prepared.append(rec)
+        prepared = [rec for rec in records if rec.id and rec.text]
         if not prepared:
             return 0
+        self._embed_missing(prepared)
+        model_tag = {} if self.embedder.model_id == "hash-256" else {"embedder": self.embedder.model_id}
         with self._lock:
+            lines: List[str] = []
             for rec in prepared:
-                self._records[rec.id] = rec
-                _safe_jsonl_append(
-                    self._path,
-                    {
-                        "id": rec.id,
-                        "text": rec.text,
-                        "metadata": rec.metadata,
-                        "embedding": rec.embedding,
-                    },
+                previous = self._records.get(rec.id)
+                self._index_record(rec, previous)
+                self._records[rec.id] = self._resident(rec)
+                lines.append(
+                    json.dumps(
+                        {
+                            "id": rec.id,
+                            "text": rec.text,
+                            "metadata": rec.metadata,
+                            **_pack_embedding(rec.embedding, self._index.quantization if self._index is not None else "float32"),
+                            **model_tag,
+                        },
+                        ensure_ascii=False,
+                    )
+                    + "\n"
                 )
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            with self._path.open("a", encoding="utf-8") as f:
+                f.write("".join(lines))
+            self._log_records += len(lines)
+            start_compaction = (
+                self._index is not None
+                and self.compact_threshold > 0
+                and self._log_records >= self.compact_threshold
+                and not self._compacting
+            )
+            if start_compaction:
+                self._compacting = True
+        if start_compaction:
+            threading.Thread(
+                target=self._compact_in_background,
+                daemon=True,
+                name=f"vector-compact-{self.collection_name}",
+            ).start()
         if self.active_backend == "chroma" and self._collection is not None:
             try:
                 self._collection.upsert(
@@ -269,60 +1215,70 @@ class VectorStore:
         return len(prepared)
 
     def index_rag_results(self, query: str, results: List[Dict[str, Any]], namespace: str = "global") -> int:
+        """Index RAG hits; with the write-behind queue enabled this only enqueues them."""
         records = [VectorRecord.from_rag_result(query, item, namespace) for item in results or []]
-        return self.upsert(records)
+        records = [rec for rec in records if rec.id and rec.text]
+        if self._indexer is None:
+            return self.upsert(records)
+        overflow = self._indexer.submit(records)
+        if overflow:
+            self.upsert(overflow)
+        return len(records)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait for queued index writes to land; registered as an exit hook."""
+        return self._indexer.flush(timeout) if self._indexer is not None else True
 
     def query(self, query: str, top_k: int = 8, namespace: Optional[str] = None) -> List[Dict[str, Any]]:
         top_k = max(1, min(int(top_k or 8), 50))
-        query_embedding = _embedding(query, self.dim)
+        if self._indexer is not None and self._indexer.pending:
+            # Read-your-writes for recently indexed results, bounded so a slow backend cannot stall lookups.
+            self._indexer.flush(self.read_flush_seconds)
+        query_embedding = self.embedder.encode([query])[0]
         candidates: List[Dict[str, Any]] = []
         if self.active_backend == "chroma" and self._collection is not None:
             try:
-                raw = self._collection.query(query_embeddings=[query_embedding], n_results=top_k * 2)
+                query_kwargs: Dict[str, Any] = {"query_embeddings": [query_embedding], "n_results": top_k * 2}
+                if namespace:
+                    query_kwargs["where"] = {"namespace": namespace}
+                raw = self._collection.query(**query_kwargs)
                 for idx, doc in enumerate((raw.get("documents") or [[]])[0]):
                     meta = ((raw.get("metadatas") or [[]])[0] or [{}])[idx] or {}
-                    if namespace and meta.get("namespace") != namespace:
-                        continue
                     candidates.append({"text": doc, "metadata": meta, "vector_score": 1.0 - float(((raw.get("distances") or [[]])[0] or [1])[idx] or 1)})
             except Exception:
                 candidates = []
         elif self.active_backend == "qdrant" and self._client is not None:
             try:
+                from qdrant_client.http import models
+
                 hits = self._client.search(
                     collection_name=self.collection_name,
                     query_vector=query_embedding,
+                    query_filter=(
+                        models.Filter(must=[models.FieldCondition(key="namespace", match=models.MatchValue(value=namespace))])
+                        if namespace
+                        else None
+                    ),
                     limit=top_k * 2,
                     with_payload=True,
                 )
                 for hit in hits:
                     payload = dict(hit.payload or {})
-                    if namespace and payload.get("namespace") != namespace:
-                        continue
                     text = str(payload.pop("text", "") or "")
                     candidates.append({"text": text, "metadata": payload, "vector_score": float(hit.score or 0.0)})
             except Exception:
                 candidates = []
 
         if not candidates:
-            with self._lock:
-                records = list(self._records.values())
-            for rec in records:
-                if namespace and rec.metadata.get("namespace") != namespace:
-                    continue
-                candidates.append(
-                    {
-                        "id": rec.id,
-                        "text": rec.text,
-                        "metadata": rec.metadata,
-                        "vector_score": _cosine(query_embedding, rec.embedding or _embedding(rec.text, self.dim)),
-                    }
-                )
+            # Only the nearest pool is reranked.
+            candidates = self._local_candidates(query_embedding, max(top_k * 4, self.candidate_pool), namespace)
 
+        texts = [str(item.get("text") or "") for item in candidates]
+        rerank_scores = self.reranker.score_many(query, texts, [item.get("metadata", {}) or {} for item in candidates])
         ranked: List[Dict[str, Any]] = []
-        for item in candidates:
+        for item, text, rerank_score in zip(candidates, texts, rerank_scores):
             meta = item.get("metadata", {}) or {}
-            text = str(item.get("text") or "")
-            combined = 0.58 * float(item.get("vector_score", 0.0) or 0.0) + 0.42 * self.reranker.score(query, text, meta)
+            combined = 0.58 * float(item.get("vector_score", 0.0) or 0.0) + 0.42 * rerank_score
             ranked.append(
                 {
                     "id": item.get("id") or hashlib.sha1(text.encode("utf-8")).hexdigest(),
@@ -337,13 +1293,25 @@ class VectorStore:
 
 
 class CheckpointStore:
-    """Redis checkpoint store with local JSON fallback."""
+    """Redis checkpoint store with a local SQLite (WAL) fallback.
 
-    def __init__(self) -> None:
+    The local table is keyed by checkpoint key with an indexed ``expires_at``,
+    so get/set touch one row however many tasks were ever checkpointed. WAL
+    mode plus a busy timeout lets several worker processes share the file.
+    Expired rows are invisible to ``get`` immediately and are deleted by a
+    background sweep every ``FLOWERNET_CHECKPOINT_SWEEP_SECONDS``. A legacy
+    ``checkpoints.json`` is imported once on first start.
+    """
+
+    def __init__(self, db_path: Optional[str] = None) -> None:
         self._redis = None
         self._file = _ensure_state_dir() / "checkpoints.json"
+        self._db_path = Path(db_path or os.getenv("FLOWERNET_CHECKPOINT_DB", str(_ensure_state_dir() / "checkpoints.sqlite3")))
+        self._local = threading.local()
         self._lock = threading.Lock()
-        self.active_backend = "file"
+        self._memory: Dict[str, Tuple[str, Optional[float]]] = {}
+        self.sweep_interval = max(0.0, float(os.getenv("FLOWERNET_CHECKPOINT_SWEEP_SECONDS", "300")))
+        self.active_backend = "sqlite"
         redis_url = os.getenv("REDIS_URL", "").strip()
         if redis_url:
             try:
@@ -354,14 +1322,68 @@ class CheckpointStore:
                 self.active_backend = "redis"
             except Exception:
                 self._redis = None
+        try:
+            self._init_database()
+        except Exception as e:
+            print(f"⚠️ Checkpoint SQLite unavailable, keeping checkpoints in memory: {e}")
+            if self.active_backend == "sqlite":
+                self.active_backend = "memory"
+            self._db_path = None
+        if self._db_path is not None and self.sweep_interval > 0:
+            threading.Thread(target=self._sweep_loop, daemon=True, name="checkpoint-sweeper").start()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self._db_path), timeout=10.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_database(self) -> None:
+        self._db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                expires_at REAL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_checkpoints_expires ON checkpoints(expires_at) WHERE expires_at IS NOT NULL")
+        self._import_legacy_file(conn)
 
-    def _read_file(self) -> Dict[str, Any]:
+    def _import_legacy_file(self, conn: sqlite3.Connection) -> None:
         if not self._file.exists():
-            return {}
+            return
         try:
-            return json.loads(self._file.read_text(encoding="utf-8"))
+            data = json.loads(self._file.read_text(encoding="utf-8"))
         except Exception:
-            return {}
+            return
+        rows = []
+        for key, item in (data.items() if isinstance(data, dict) else []):
+            if not isinstance(item, dict):
+                continue
+            updated_at = float(item.get("updated_at", 0.0) or 0.0) or time.time()
+            ttl = item.get("ttl_seconds")
+            payload = json.dumps(item.get("value"), ensure_ascii=False, default=str)
+            rows.append((str(key), payload, updated_at, updated_at + float(ttl) if ttl else None))
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # OR IGNORE: rows written since (or by another process's import) win.
+            conn.executemany("INSERT OR IGNORE INTO checkpoints(key, value, updated_at, expires_at) VALUES (?, ?, ?, ?)", rows)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        try:
+            os.replace(self._file, self._file.with_name(self._file.name + ".migrated"))
+        except OSError:
+            pass
 
     def set(self, key: str, value: Dict[str, Any], ttl_seconds: Optional[int] = None) -> None:
         payload = json.dumps(value, ensure_ascii=False, default=str)
@@ -371,10 +1393,16 @@ class CheckpointStore:
                 return
             except Exception:
                 pass
-        with self._lock:
-            data = self._read_file()
-            data[key] = {"value": value, "updated_at": time.time(), "ttl_seconds": ttl_seconds}
-            self._file.write_text(json.dumps(data, ensure_ascii=False, indent=2, default=str), encoding="utf-8")
+        now = time.time()
+        expires_at = now + float(ttl_seconds) if ttl_seconds else None
+        if self._db_path is None:
+            with self._lock:
+                self._memory[key] = (payload, expires_at)
+            return
+        self._conn().execute(
+            "INSERT OR REPLACE INTO checkpoints(key, value, updated_at, expires_at) VALUES (?, ?, ?, ?)",
+            (key, payload, now, expires_at),
+        )
 
     def get(self, key: str) -> Optional[Dict[str, Any]]:
         if self._redis is not None:
@@ -383,27 +1411,72 @@ class CheckpointStore:
                 return json.loads(raw) if raw else None
             except Exception:
                 pass
-        data = self._read_file()
-        item = data.get(key)
-        if not item:
+        if self._db_path is None:
+            with self._lock:
+                row = self._memory.get(key)
+        else:
+            row = self._conn().execute("SELECT value, expires_at FROM checkpoints WHERE key = ?", (key,)).fetchone()
+        if not row:
             return None
-        ttl = item.get("ttl_seconds")
-        if ttl and time.time() - float(item.get("updated_at", 0.0) or 0.0) > float(ttl):
+        payload, expires_at = row
+        if expires_at is not None and time.time() > float(expires_at):
             return None
-        return item.get("value") if isinstance(item, dict) else item
+        return json.loads(payload)
+
+    def sweep(self) -> int:
+        """Delete expired local checkpoints; returns the number of rows removed."""
+        now = time.time()
+        if self._db_path is None:
+            with self._lock:
+                expired = [key for key, (_, expires_at) in self._memory.items() if expires_at is not None and expires_at < now]
+                for key in expired:
+                    del self._memory[key]
+            return len(expired)
+        return self._conn().execute("DELETE FROM checkpoints WHERE expires_at IS NOT NULL AND expires_at < ?", (now,)).rowcount
+
+    def _sweep_loop(self) -> None:
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception:
+                pass
 
     def capabilities(self) -> Dict[str, Any]:
-        return {"active_backend": self.active_backend, "redis_configured": bool(os.getenv("REDIS_URL"))}
+        return {
+            "active_backend": self.active_backend,
+            "redis_configured": bool(os.getenv("REDIS_URL")),
+            "sqlite_path": str(self._db_path) if self._db_path is not None else None,
+            "sweep_interval_seconds": self.sweep_interval,
+        }
 
 
 class TaskQueue:
-    """Redis queue facade with in-process fallback."""
-
-    def __init__(self, name: str = "flowernet:tasks") -> None:
+    """Redis queue facade with a durable SQLite fallback (in-process queue as last resort).
+
+    The local backend keeps one row per task in ``FLOWERNET_TASK_QUEUE_DB`` (WAL,
+    shared by every process on the host). ``lease`` claims the oldest ready
+    task for ``lease_seconds``; the consumer must ``ack`` it, ``nack`` it to
+    retry later, or ``extend`` the lease while it is still working. A lease
+    that runs out (the worker died) makes the task visible again until it has
+    been delivered ``max_attempts`` times, after which it is parked as
+    ``dead``. ``put``/``get`` keep their original fire-and-forget semantics.
+    """
+
+    def __init__(self, name: str = "flowernet:tasks", db_path: Optional[str] = None) -> None:
         self.name = name
         self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue()
         self._redis = None
-        self.active_backend = "memory"
+        if db_path is None:
+            db_path = os.getenv("FLOWERNET_TASK_QUEUE_DB") or str(_ensure_state_dir() / "task_queue.sqlite3")
+        self._db_path: Optional[Path] = Path(db_path)
+        self._local = threading.local()
+        self._wakeup = threading.Condition()
+        self.lease_seconds = max(1.0, float(os.getenv("FLOWERNET_TASK_LEASE_SECONDS", "300")))
+        self.max_attempts = max(1, int(os.getenv("FLOWERNET_TASK_MAX_ATTEMPTS", "3")))
+        self.poll_interval = max(0.01, float(os.getenv("FLOWERNET_TASK_POLL_SECONDS", "0.5")))
+        self.consumer_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.active_backend = "sqlite"
         redis_url = os.getenv("REDIS_URL", "").strip()
         if redis_url:
             try:
@@ -414,28 +1487,174 @@ class TaskQueue:
                 self.active_backend = "redis"
             except Exception:
                 self._redis = None
+        try:
+            self._init_database()
+        except Exception as e:
+            print(f"⚠️ Task queue SQLite unavailable, using in-process queue: {e}")
+            if self.active_backend == "sqlite":
+                self.active_backend = "memory"
+            self._db_path = None
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self._db_path), timeout=10.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_database(self) -> None:
+        self._db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                queue TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,  -- ready | leased | done | dead
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                available_at REAL NOT NULL,
+                lease_owner TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                last_error TEXT
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_claim ON tasks(queue, status, available_at)")
 
-    def put(self, item: Dict[str, Any]) -> None:
+    def put(self, item: Dict[str, Any], delay_seconds: float = 0.0, max_attempts: Optional[int] = None) -> Optional[int]:
+        """Enqueue ``item``; returns the durable task id on the SQLite backend."""
+        payload = json.dumps(item, ensure_ascii=False, default=str)
         if self._redis is not None:
             try:
-                self._redis.rpush(self.name, json.dumps(item, ensure_ascii=False, default=str))
-                return
+                self._redis.rpush(self.name, payload)
+                return None
             except Exception:
                 pass
-        self._queue.put(item)
+        if self._db_path is None:
+            self._queue.put(item)
+            return None
+        now = time.time()
+        cursor = self._conn().execute(
+            "INSERT INTO tasks(queue, payload, status, attempts, max_attempts, available_at, created_at, updated_at) "
+            "VALUES (?, ?, 'ready', 0, ?, ?, ?, ?)",
+            (self.name, payload, int(max_attempts or self.max_attempts), now + max(0.0, delay_seconds), now, now),
+        )
+        with self._wakeup:
+            self._wakeup.notify()
+        return int(cursor.lastrowid)
+
+    def _claim(self, lease_seconds: float) -> Optional[Dict[str, Any]]:
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Leases that ran out on their last allowed attempt are parked instead of redelivered.
+            conn.execute(
+                "UPDATE tasks SET status = 'dead', last_error = COALESCE(last_error, 'lease_expired'), updated_at = ? "
+                "WHERE queue = ? AND status = 'leased' AND available_at <= ? AND attempts >= max_attempts",
+                (now, self.name, now),
+            )
+            row = conn.execute(
+                "SELECT id, payload, attempts FROM tasks WHERE queue = ? AND status IN ('ready', 'leased') "
+                "AND available_at <= ? ORDER BY available_at, id LIMIT 1",
+                (self.name, now),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE tasks SET status = 'leased', attempts = attempts + 1, available_at = ?, lease_owner = ?, updated_at = ? "
+                "WHERE id = ?",
+                (now + lease_seconds, self.consumer_id, now, row[0]),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return {"receipt": int(row[0]), "item": json.loads(row[1]), "attempts": int(row[2]) + 1}
 
-    def get(self, timeout: float = 1.0) -> Optional[Dict[str, Any]]:
+    def lease(self, timeout: float = 1.0, lease_seconds: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Claim the next task as ``{"receipt", "item", "attempts"}``, waiting up to ``timeout`` seconds."""
         if self._redis is not None:
             try:
-                item = self._redis.blpop(self.name, timeout=max(1, int(timeout or 1)))
-                if item:
-                    return json.loads(item[1])
+                # Redis lists have no leases: the task is handed over once.
+                raw = self._redis.blpop(self.name, timeout=max(1, int(timeout or 1)))
+                return {"receipt": None, "item": json.loads(raw[1]), "attempts": 1} if raw else None
             except Exception:
                 pass
-        try:
-            return self._queue.get(timeout=timeout)
-        except queue.Empty:
+        if self._db_path is None:
+            try:
+                return {"receipt": None, "item": self._queue.get(timeout=timeout), "attempts": 1}
+            except queue.Empty:
+                return None
+        deadline = time.monotonic() + max(0.0, timeout)
+        while True:
+            leased = self._claim(lease_seconds or self.lease_seconds)
+            remaining = deadline - time.monotonic()
+            if leased is not None or remaining <= 0:
+                return leased
+            # Local puts wake the waiter at once; other processes' puts are seen on the next poll.
+            with self._wakeup:
+                self._wakeup.wait(min(self.poll_interval, remaining))
+
+    def _owned_update(self, receipt: Optional[int], sql: str, params: Tuple[Any, ...]) -> bool:
+        if receipt is None or self._db_path is None:
+            return True
+        cursor = self._conn().execute(sql + " WHERE id = ? AND status = 'leased' AND lease_owner = ?", (*params, receipt, self.consumer_id))
+        return cursor.rowcount == 1
+
+    def ack(self, receipt: Optional[int]) -> bool:
+        """Mark a leased task done; False if the lease was lost to another consumer."""
+        return self._owned_update(receipt, "UPDATE tasks SET status = 'done', lease_owner = NULL, updated_at = ?", (time.time(),))
+
+    def nack(self, receipt: Optional[int], error: str = "", retry_delay: float = 0.0) -> bool:
+        """Release a leased task for another attempt, or park it as dead once attempts are used up."""
+        now = time.time()
+        released = self._owned_update(
+            receipt,
+            "UPDATE tasks SET status = CASE WHEN attempts >= max_attempts THEN 'dead' ELSE 'ready' END, "
+            "available_at = ?, lease_owner = NULL, last_error = ?, updated_at = ?",
+            (now + max(0.0, retry_delay), str(error or "")[:500], now),
+        )
+        with self._wakeup:
+            self._wakeup.notify()
+        return released
+
+    def extend(self, receipt: Optional[int], lease_seconds: Optional[float] = None) -> bool:
+        """Heartbeat: push the lease deadline out again while the task is still running."""
+        now = time.time()
+        return self._owned_update(
+            receipt,
+            "UPDATE tasks SET available_at = ?, updated_at = ?",
+            (now + (lease_seconds or self.lease_seconds), now),
+        )
+
+    def get(self, timeout: float = 1.0) -> Optional[Dict[str, Any]]:
+        leased = self.lease(timeout=timeout)
+        if leased is None:
             return None
+        self.ack(leased["receipt"])
+        return leased["item"]
+
+    def purge(self, older_than_seconds: float = 7 * 24 * 3600) -> int:
+        """Drop finished (done/dead) tasks older than ``older_than_seconds``."""
+        if self._db_path is None:
+            return 0
+        return self._conn().execute(
+            "DELETE FROM tasks WHERE queue = ? AND status IN ('done', 'dead') AND updated_at < ?",
+            (self.name, time.time() - older_than_seconds),
+        ).rowcount
+
+    def counts(self) -> Dict[str, int]:
+        if self._db_path is None:
+            return {"ready": self._queue.qsize()}
+        rows = self._conn().execute("SELECT status, COUNT(*) FROM tasks WHERE queue = ? GROUP BY status", (self.name,)).fetchall()
+        return {str(status): int(count) for status, count in rows}
 
     def size(self) -> int:
         if self._redis is not None:
@@ -443,53 +1662,253 @@ class TaskQueue:
                 return int(self._redis.llen(self.name))
             except Exception:
                 pass
-        return self._queue.qsize()
+        counts = self.counts()
+        return counts.get("ready", 0) + counts.get("leased", 0)
 
     def capabilities(self) -> Dict[str, Any]:
-        return {"active_backend": self.active_backend, "name": self.name, "size": self.size()}
+        return {
+            "active_backend": self.active_backend,
+            "name": self.name,
+            "size": self.size(),
+            "counts": self.counts() if self._redis is None else None,
+            "lease_seconds": self.lease_seconds,
+            "max_attempts": self.max_attempts,
+        }
 
 
 class EvaluationStore:
-    """Append-only LLM evaluation store for automatic regression tracking."""
+    """Append-only LLM evaluation store for automatic regression tracking.
+
+    ``summary()`` is served from rolling aggregates instead of re-reading the
+    log: a window of the last ``FLOWERNET_EVAL_WINDOW`` rows with running
+    sums, plus lifetime totals. Each call folds only the bytes appended since
+    the last fold (by any process), so dashboard polling cost does not grow
+    with history. ``llm_evaluations.aggregate.json`` checkpoints the lifetime
+    totals, the consumed offset and the rotation generation; a restart seeds
+    the window by reading the log backwards from EOF. With
+    ``FLOWERNET_EVAL_ROTATE_BYTES`` set, generation ``g`` of the log is renamed
+    to ``llm_evaluations.jsonl.<g>`` once it grows past that size.
+    """
 
     def __init__(self) -> None:
         self._path = _ensure_state_dir() / "llm_evaluations.jsonl"
+        self._aggregate_path = self._path.with_name("llm_evaluations.aggregate.json")
+        self._lock_path = self._path.with_name("llm_evaluations.lock")
         self._lock = threading.Lock()
+        self.window = max(1, int(os.getenv("FLOWERNET_EVAL_WINDOW", "500")))
+        self.rotate_bytes = max(0, int(os.getenv("FLOWERNET_EVAL_ROTATE_BYTES", "0")))
+        self.rotate_keep = max(1, int(os.getenv("FLOWERNET_EVAL_ROTATE_KEEP", "5")))
+        self._rows: "deque[Dict[str, Any]]" = deque(maxlen=self.window)
+        # (quality, passed, controller) per windowed row, mirrored by the running sums.
+        self._metrics: "deque[Tuple[float, bool, float]]" = deque()
+        self._reset()
+        with self._lock, self._file_lock():
+            self._load()
+
+    def _reset(self) -> None:
+        self._totals = {"count": 0, "passed": 0, "quality_sum": 0.0, "controller_sum": 0.0}
+        self._rows.clear()
+        self._metrics.clear()
+        self._window_sums = [0.0, 0, 0.0]
+        self._generation = 0
+        self._offset = 0
+        self._summary: Optional[Dict[str, Any]] = None
+
+    @contextmanager
+    def _file_lock(self):
+        """Serialise append/rotate/fold across processes sharing the state dir (POSIX only)."""
+        if fcntl is None:
+            yield
+            return
+        with self._lock_path.open("a") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _row_metrics(row: Dict[str, Any]) -> Tuple[float, bool, float]:
+        return (
+            float(row.get("quality_score_avg", row.get("quality_score", 0.0)) or 0.0),
+            bool(row.get("success", row.get("passed", False))),
+            float(row.get("controller_trigger_rate", row.get("controller_triggered_subsections", 0.0)) or 0.0),
+        )
+
+    def _push_window(self, row: Dict[str, Any]) -> None:
+        metrics = self._row_metrics(row)
+        if len(self._metrics) >= self.window:
+            old = self._metrics.popleft()
+            self._window_sums[0] -= old[0]
+            self._window_sums[1] -= int(old[1])
+            self._window_sums[2] -= old[2]
+        self._metrics.append(metrics)
+        self._window_sums[0] += metrics[0]
+        self._window_sums[1] += int(metrics[1])
+        self._window_sums[2] += metrics[2]
+        self._rows.append(row)
+
+    def _fold(self, row: Dict[str, Any]) -> None:
+        quality, passed, controller = self._row_metrics(row)
+        self._totals["count"] += 1
+        self._totals["passed"] += int(passed)
+        self._totals["quality_sum"] += quality
+        self._totals["controller_sum"] += controller
+        self._push_window(row)
+        self._summary = None
+
+    @staticmethod
+    def _tail_rows(path: Path, limit: int, end: Optional[int] = None, block_size: int = 65536) -> List[Dict[str, Any]]:
+        """Last ``limit`` JSON rows before byte ``end``, read in blocks backwards from EOF."""
+        rows: List[Dict[str, Any]] = []
+        try:
+            with path.open("rb") as f:
+                position = f.seek(0, os.SEEK_END) if end is None else end
+                carry = b""
+                while position > 0 and len(rows) < limit:
+                    step = min(block_size, position)
+                    position -= step
+                    f.seek(position)
+                    lines = (f.read(step) + carry).split(b"\n")
+                    # The first piece may be a partial line unless we reached the file start.
+                    carry = lines.pop(0) if position > 0 else b""
+                    for line in reversed(lines):
+                        if line.strip() and len(rows) < limit:
+                            try:
+                                rows.append(json.loads(line))
+                            except ValueError:
+                                continue
+        except OSError:
+            return []
+        rows.reverse()
+        return rows
+
+    def _fold_from(self, path: Path, offset: int) -> int:
+        """Fold complete rows after ``offset``; returns the offset just past the last one."""
+        try:
+            with path.open("rb") as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # torn write; re-read on the next fold
+                    offset += len(line)
+                    if line.strip():
+                        try:
+                            self._fold(json.loads(line))
+                        except ValueError:
+                            continue
+        except OSError:
+            pass
+        return offset
+
+    def _read_checkpoint(self) -> Dict[str, Any]:
+        try:
+            return json.loads(self._aggregate_path.read_text(encoding="utf-8"))
+        except Exception:
+            return {}
+
+    def _load(self) -> None:
+        self._reset()
+        saved = self._read_checkpoint()
+        try:
+            size = self._path.stat().st_size if self._path.exists() else 0
+            if saved and int(saved.get("offset", 0)) <= size:
+                self._totals.update({key: saved["totals"][key] for key in self._totals})
+                self._offset = int(saved["offset"])
+                for row in self._tail_rows(self._path, self.window, end=self._offset):
+                    self._push_window(row)
+        except Exception:
+            # No usable checkpoint: one full pass over the active log rebuilds the aggregates.
+            self._reset()
+        self._generation = int(saved.get("generation", 0) or 0)
+        self._refresh(saved)
+        self._save_checkpoint()
+
+    def _refresh(self, saved: Optional[Dict[str, Any]] = None) -> None:
+        """Fold rows appended since the last call, following rotations made by any process."""
+        generation = int((saved if saved is not None else self._read_checkpoint()).get("generation", 0) or 0)
+        if generation > self._generation:
+            backups = [self._path.with_name(f"{self._path.name}.{g}") for g in range(self._generation, generation)]
+            if not backups[0].exists():
+                self._load()  # our generation was already pruned; resync from the checkpoint
+                return
+            for index, backup in enumerate(backups):
+                self._fold_from(backup, self._offset if index == 0 else 0)
+            self._generation, self._offset = generation, 0
+        try:
+            if self._path.stat().st_size == self._offset:
+                return
+        except OSError:
+            return
+        self._offset = self._fold_from(self._path, self._offset)
+
+    def _save_checkpoint(self) -> None:
+        try:
+            tmp = self._aggregate_path.with_name(f"{self._aggregate_path.name}.{os.getpid()}.tmp")
+            tmp.write_text(
+                json.dumps({"generation": self._generation, "offset": self._offset, "totals": self._totals}),
+                encoding="utf-8",
+            )
+            os.replace(tmp, self._aggregate_path)
+        except Exception:
+            pass
+
+    def _rotate(self) -> None:
+        os.replace(self._path, self._path.with_name(f"{self._path.name}.{self._generation}"))
+        self._path.with_name(f"{self._path.name}.{self._generation - self.rotate_keep}").unlink(missing_ok=True)
+        self._generation, self._offset = self._generation + 1, 0
 
     def record(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         item = dict(payload or {})
         item.setdefault("id", str(uuid.uuid4()))
         item.setdefault("created_at", time.time())
-        with self._lock:
+        with self._lock, self._file_lock():
+            self._refresh()
             _safe_jsonl_append(self._path, item)
+            self._refresh({"generation": self._generation})
+            if self.rotate_bytes and self._offset >= self.rotate_bytes:
+                try:
+                    self._rotate()
+                except OSError:
+                    pass
+            self._save_checkpoint()
         return item
 
     def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
-        if not self._path.exists():
-            return []
-        rows: List[Dict[str, Any]] = []
-        try:
-            with self._path.open("r", encoding="utf-8") as f:
-                for line in f:
-                    if line.strip():
-                        rows.append(json.loads(line))
-        except Exception:
-            return []
-        return rows[-max(1, min(limit, 500)):]
+        limit = max(1, min(limit, 500))
+        with self._lock, self._file_lock():
+            self._refresh()
+            if limit <= len(self._rows) or len(self._rows) == self._totals["count"]:
+                return list(self._rows)[-limit:]
+        # Asked for more than the window holds: read the extra rows backwards from EOF.
+        return self._tail_rows(self._path, limit)
 
     def summary(self) -> Dict[str, Any]:
-        rows = self.recent(500)
-        if not rows:
+        with self._lock, self._file_lock():
+            self._refresh()
+            if self._summary is None:
+                self._summary = self._build_summary()
+            return dict(self._summary)
+
+    def _build_summary(self) -> Dict[str, Any]:
+        count = len(self._metrics)
+        if not count:
             return {"count": 0, "quality_score_avg": 0.0, "pass_rate": 0.0, "recent": []}
-        scores = [float(row.get("quality_score_avg", row.get("quality_score", 0.0)) or 0.0) for row in rows]
-        passed = [bool(row.get("success", row.get("passed", False))) for row in rows]
-        controller = [float(row.get("controller_trigger_rate", row.get("controller_triggered_subsections", 0.0)) or 0.0) for row in rows]
+        scores = sorted(metric[0] for metric in self._metrics)
+        total = max(1, self._totals["count"])
         return {
-            "count": len(rows),
-            "quality_score_avg": round(sum(scores) / max(1, len(scores)), 4),
-            "pass_rate": round(sum(1 for x in passed if x) / max(1, len(passed)), 4),
-            "controller_signal_avg": round(sum(controller) / max(1, len(controller)), 4),
-            "recent": rows[-10:],
+            "count": count,
+            "quality_score_avg": round(self._window_sums[0] / count, 4),
+            "pass_rate": round(self._window_sums[1] / count, 4),
+            "controller_signal_avg": round(self._window_sums[2] / count, 4),
+            "quality_score_p10": round(scores[int(0.1 * (count - 1))], 4),
+            "quality_score_p50": round(scores[int(0.5 * (count - 1))], 4),
+            "quality_score_p90": round(scores[int(0.9 * (count - 1))], 4),
+            "window": self.window,
+            "total_count": self._totals["count"],
+            "lifetime_quality_score_avg": round(self._totals["quality_sum"] / total, 4),
+            "lifetime_pass_rate": round(self._totals["passed"] / total, 4),
+            "recent": list(self._rows)[-10:],
         }
 
 
@@ -593,14 +2012,39 @@ class LangGraphAdapter:
         }
 
 
+_EMBEDDERS: Dict[str, CachedEmbedder] = {}
+_EMBEDDERS_LOCK = threading.Lock()
 _VECTOR_STORE: Optional[VectorStore] = None
 _CHECKPOINT_STORE: Optional[CheckpointStore] = None
-_TASK_QUEUE: Optional[TaskQueue] = None
+_TASK_QUEUES: Dict[str, TaskQueue] = {}
 _EVAL_STORE: Optional[EvaluationStore] = None
 _TOOL_REGISTRY: Optional[ToolRegistry] = None
 _LANGGRAPH_ADAPTER: Optional[LangGraphAdapter] = None
 
 
+def get_embedder(dim: int = 256) -> CachedEmbedder:
+    """Shared content-hash-cached embedder selected by ``FLOWERNET_EMBEDDER`` (hash | sentence-transformers | onnx)."""
+    kind = os.getenv("FLOWERNET_EMBEDDER", "hash").strip().lower()
+    key = f"{kind}:{dim}"
+    with _EMBEDDERS_LOCK:
+        if key not in _EMBEDDERS:
+            embedder: Any = None
+            if kind in {"sentence-transformers", "onnx"}:
+                try:
+                    embedder = SentenceTransformerEmbedder(
+                        os.getenv("FLOWERNET_EMBEDDER_MODEL", "sentence-transformers/paraphrase-MiniLM-L6-v2"),
+                        backend="onnx" if kind == "onnx" else "torch",
+                        batch_size=int(os.getenv("FLOWERNET_EMBEDDER_BATCH_SIZE", "32")),
+                    )
+                except Exception as e:
+                    print(f"⚠️ Embedding model load failed, using hash embedder: {e}")
+            _EMBEDDERS[key] = CachedEmbedder(
+                embedder or HashEmbedder(dim),
+                cache_size=int(os.getenv("FLOWERNET_EMBEDDING_CACHE_SIZE", "8192")),
+            )
+        return _EMBEDDERS[key]
+
+
 def get_vector_store() -> VectorStore:
     global _VECTOR_STORE
     if _VECTOR_STORE is None:
@@ -616,10 +2060,9 @@ def get_checkpoint_store() -> CheckpointStore:
 
 
 def get_task_queue(name: str = "flowernet:tasks") -> TaskQueue:
-    global _TASK_QUEUE
-    if _TASK_QUEUE is None:
-        _TASK_QUEUE = TaskQueue(name=name)
-    return _TASK_QUEUE
+    if name not in _TASK_QUEUES:
+        _TASK_QUEUES[name] = TaskQueue(name=name)
+    return _TASK_QUEUES[name]
 
 
 def get_eval_store() -> EvaluationStore:
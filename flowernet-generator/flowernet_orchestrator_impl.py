@@ -30,19 +30,22 @@ FlowerNet 完整编排器 - 按照你的完整需求实现
 import requests
 import json
 from typing import Optional, Dict, Any, List, Tuple
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime
 import time
 import os
 import random
 import re
 import sys
+import threading
 
 _ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if _ROOT_DIR not in sys.path:
     sys.path.insert(0, _ROOT_DIR)
 
 try:
-    from rag_search import RAGSearchEngine, SourceVerifier
+    from rag_search import RAGQueryPlanner, RAGSearchEngine, SourceVerifier
     RAG_AVAILABLE = True
 except Exception:
     RAG_AVAILABLE = False
@@ -198,6 +201,11 @@ class DocumentGenerationOrchestrator:
             else None
         )
         self.source_verifier = SourceVerifier() if self.rag_enabled else None
+        # One query planner per in-flight document: memoised query candidates and
+        # known-empty queries are shared across that document's subsections.
+        self.rag_query_planner_max_documents = max(1, int(os.getenv("RAG_QUERY_PLANNER_MAX_DOCUMENTS", "32")))
+        self._rag_query_planners: "OrderedDict[str, Any]" = OrderedDict()
+        self._rag_query_planners_lock = threading.Lock()
 
     def _remaining_deadline_seconds(self) -> Optional[float]:
         if not self.deadline_monotonic:
@@ -1084,6 +1092,40 @@ Rules:
         except Exception as e:
             print(f"⚠️  写入流程事件失败: {e}")
 
+    @contextmanager
+    def _history_pipeline(self):
+        """
+        远程 history 支持 pipeline 时把块内相邻写入合并为批量请求；本地 HistoryManager 直接写入。
+        与 _emit_progress_event 一致，批量发送失败只告警，不中断生成。
+        """
+        pipeline = getattr(self.history_manager, "pipeline", None)
+        if not callable(pipeline):
+            yield
+            return
+        body_finished = False
+        try:
+            with pipeline():
+                yield
+                body_finished = True
+        except Exception as e:
+            if not body_finished:
+                raise
+            print(f"⚠️  批量写入 history 失败: {e}")
+
+    def _flush_history(self):
+        """
+        在小节 / 文档边界等待排队中的流程事件送达；本地 HistoryManager 无需等待。
+        内容类写入（history / 已通过历史链 / 追踪）是同步的，失败已在写入处抛出；这里超时或失败只告警。
+        """
+        flush = getattr(self.history_manager, "flush", None)
+        if not callable(flush):
+            return
+        try:
+            if not flush():
+                print("⚠️  history 流程事件未在超时内全部送达，继续生成")
+        except Exception as e:
+            print(f"⚠️  等待 history 写入失败: {e}")
+
     def _resolve_subsection_outline(
         self,
         document_id: str,
@@ -1096,7 +1138,7 @@ Rules:
             return fallback_outline
 
         try:
-            tracking = self.history_manager.get_subsection_tracking(document_id, section_id, subsection_id)
+            tracking = self.history_manager.get_subsection_tracking(document_id, section_id, subsection_id, fields=["outline"])
             if tracking and tracking.get("outline"):
                 return str(tracking["outline"]).strip()
         except Exception as e:
@@ -1178,6 +1220,26 @@ Rules:
         result = " ".join(domain_terms[:5])[:80]
         return result
 
+    def _get_rag_query_planner(self, document_id: str) -> Optional[Any]:
+        if not self.rag_enabled:
+            return None
+        key = str(document_id or "global")
+        with self._rag_query_planners_lock:
+            planner = self._rag_query_planners.get(key)
+            if planner is None:
+                planner = RAGQueryPlanner(document_id=key)
+                self._rag_query_planners[key] = planner
+                while len(self._rag_query_planners) > self.rag_query_planner_max_documents:
+                    self._rag_query_planners.popitem(last=False)
+            else:
+                self._rag_query_planners.move_to_end(key)
+            return planner
+
+    def _release_rag_query_planner(self, document_id: str) -> Dict[str, Any]:
+        with self._rag_query_planners_lock:
+            planner = self._rag_query_planners.pop(str(document_id or "global"), None)
+        return planner.snapshot() if planner is not None else {}
+
     def _build_rag_query_candidates(self, outline: str, initial_prompt: str) -> List[str]:
         outline_text = " ".join(str(outline or "").split()).strip()
         prompt_text = " ".join(str(initial_prompt or "").split()).strip()
@@ -1475,6 +1537,8 @@ Rules:
                 subsection_list = section.get("subsections", [])
                 
                 for subsection_index, subsection in enumerate(subsection_list):
+                    # 小节边界：上一小节的内容 / 追踪写入送达后再开始下一小节
+                    self._flush_history()
                     processed_subsections += 1
                     subsection_id = subsection["id"]
                     subsection_title = subsection["title"]
@@ -1497,35 +1561,36 @@ Rules:
                     
                     print(f"\n📖 生成 Section: {section_title} > Subsection: {subsection_title}")
                     print(f"   (顺序: {subsection_index + 1}/{len(subsection_list)})")
-                    self._emit_progress_event(
-                        document_id=document_id,
-                        section_id=section_id,
-                        subsection_id=subsection_id,
-                        stage="subsection_trace_ready",
-                        message=f"小节上下文已就绪: {section_title} > {subsection_title}",
-                        metadata={
-                            "section_title": section_title,
-                            "subsection_title": subsection_title,
-                            "subsection_order": subsection_index + 1,
-                            "section_subsection_total": len(subsection_list),
-                            "outline_chars": len(subsection_outline),
-                            "content_prompt_chars": len(content_prompt),
-                        },
-                    )
-                    self._emit_progress_event(
-                        document_id=document_id,
-                        section_id=section_id,
-                        subsection_id=subsection_id,
-                        stage="subsection_start",
-                        message=f"开始处理小节: {section_title} > {subsection_title}",
-                        metadata={
-                            "section_title": section_title,
-                            "subsection_title": subsection_title,
-                            "subsection_order": subsection_index + 1,
-                            "section_subsection_total": len(subsection_list),
-                            "enable_controller": True,
-                        },
-                    )
+                    with self._history_pipeline():
+                        self._emit_progress_event(
+                            document_id=document_id,
+                            section_id=section_id,
+                            subsection_id=subsection_id,
+                            stage="subsection_trace_ready",
+                            message=f"小节上下文已就绪: {section_title} > {subsection_title}",
+                            metadata={
+                                "section_title": section_title,
+                                "subsection_title": subsection_title,
+                                "subsection_order": subsection_index + 1,
+                                "section_subsection_total": len(subsection_list),
+                                "outline_chars": len(subsection_outline),
+                                "content_prompt_chars": len(content_prompt),
+                            },
+                        )
+                        self._emit_progress_event(
+                            document_id=document_id,
+                            section_id=section_id,
+                            subsection_id=subsection_id,
+                            stage="subsection_start",
+                            message=f"开始处理小节: {section_title} > {subsection_title}",
+                            metadata={
+                                "section_title": section_title,
+                                "subsection_title": subsection_title,
+                                "subsection_order": subsection_index + 1,
+                                "section_subsection_total": len(subsection_list),
+                                "enable_controller": True,
+                            },
+                        )
                     
                     try:
                         passed_history = self._load_passed_history(document_id)
@@ -1911,6 +1976,7 @@ Rules:
             cache_hits = int(document_result.get("token_usage", {}).get("prompt_cache_hit_tokens", 0) or 0)
             cache_misses = int(document_result.get("token_usage", {}).get("prompt_cache_miss_tokens", 0) or 0)
             document_result["prompt_cache_hit_rate"] = round(cache_hits / max(1, cache_hits + cache_misses), 4)
+            document_result["rag_query_planner"] = self._release_rag_query_planner(document_id)
 
             # 文档级成功判定：存在失败小节则返回 partial/failed，避免掩盖真实质量问题
             document_result["success"] = len(document_result["failed_subsections"]) == 0
@@ -1970,6 +2036,7 @@ Rules:
                     "controller_triggered_subsections": document_result["controller_triggered_subsections"],
                     "verifier_failed_total": document_result["verifier_failed_total"],
                     "verifier_error_total": document_result["verifier_error_total"],
+                    "rag_query_planner": document_result.get("rag_query_planner", {}),
                 },
             )
             
@@ -2030,6 +2097,9 @@ Rules:
                 "error": str(e),
                 "warning": f"document_exception_fallback: {str(e)[:180]}",
             }
+        finally:
+            # 文档边界：返回前确保流程事件已送达，web 端随后会读取
+            self._flush_history()
     
     def _generate_and_verify_subsection(
         self,
@@ -2106,14 +2176,19 @@ Rules:
         last_negative_constraints: Optional[Dict[str, Any]] = None
 
         if self.rag_enabled and self.search_engine is not None:
-            rag_query_candidates = self._build_rag_query_candidates(
-                outline=current_outline,
-                initial_prompt=current_prompt,
+            rag_query_planner = self._get_rag_query_planner(document_id)
+            rag_query_candidates = rag_query_planner.memoize(
+                "rag_query_candidates",
+                (current_outline, current_prompt),
+                lambda: self._build_rag_query_candidates(
+                    outline=current_outline,
+                    initial_prompt=current_prompt,
+                ),
             )
             selected_query = ""
             rag_error = "unknown"
             for rag_query in rag_query_candidates:
-                rag_search_result = self.search_engine.search(rag_query)
+                rag_search_result = self.search_engine.search(rag_query, planner=rag_query_planner)
                 if rag_search_result.get("success") and rag_search_result.get("results"):
                     selected_query = rag_query
                     rag_used = True
@@ -2162,6 +2237,7 @@ Rules:
                             "require_source_citations": require_source_citations,
                             "vector_indexed": rag_search_result.get("vector_indexed", 0),
                             "vector_backend": rag_search_result.get("vector_backend", ""),
+                            "query_planner": rag_query_planner.snapshot(),
                         },
                     )
             else:
@@ -2224,6 +2300,7 @@ Rules:
                             "query": rag_query_candidates[0] if rag_query_candidates else "",
                             "tried_queries": rag_query_candidates,
                             "error": rag_error,
+                            "query_planner": rag_query_planner.snapshot(),
                         },
                     )
             source_citation_required = require_source_citations
@@ -0,0 +1,219 @@
+"""
+HTTP Cassette - 外部检索请求的录制/回放传输层
+================================================
+
+Purpose:
+- Crossref / arXiv / Wikipedia / DuckDuckGo / Semantic Scholar 的响应随时间和网络波动，
+  导致检索与文档装配的基准耗时无法复现
+- record 模式：真实请求照常发出，同时把 request -> response 写入 gzip 压缩的 cassette
+- replay 模式：完全离线，从 cassette 返回响应，可按录制耗时模拟延迟
+
+Configuration:
+- FLOWERNET_HTTP_CASSETTE_MODE: off | record | replay（默认 off）
+- FLOWERNET_HTTP_CASSETTE_PATH: cassette 文件（默认 $FLOWERNET_STATE_DIR/http_cassette.jsonl.gz）
+- FLOWERNET_HTTP_CASSETTE_LATENCY_SCALE: 回放时按录制耗时 × scale 休眠（默认 0，不模拟）
+- FLOWERNET_HTTP_CASSETTE_ALLOW_MISS: 回放未命中时是否回落到真实网络（默认 false）
+
+The adapter is mounted on an existing ``requests.Session`` via
+``install_cassette(session)`` so call sites keep using ``session.get(...)``.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import base64
+import gzip
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+
+CASSETTE_MODES = {"off", "record", "replay"}
+_DROPPED_HEADERS = {"content-encoding", "transfer-encoding", "content-length", "connection", "set-cookie"}
+
+
+def _default_cassette_path() -> Path:
+    state_dir = Path(os.getenv("FLOWERNET_STATE_DIR", str(Path(__file__).resolve().parent / ".flowernet_state")))
+    return state_dir / "http_cassette.jsonl.gz"
+
+
+def request_key(method: str, url: str, body: Any = None) -> str:
+    """Stable key for a request: method + URL with sorted query params + body digest."""
+    parts = urlsplit(str(url or ""))
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    normalized = urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, query, ""))
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    body_digest = hashlib.sha1(body).hexdigest() if body else ""
+    return f"{str(method or 'GET').upper()} {normalized} {body_digest}".strip()
+
+
+class CassetteStore:
+    """Append-only gzip JSONL store of recorded interactions, indexed by request key."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._load()
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        try:
+            # gzip.open reads concatenated members, so appended sessions are seen as one stream.
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    if entry.get("key"):
+                        self._entries[entry["key"]] = entry
+        except (OSError, EOFError, ValueError):
+            # A truncated trailing member (e.g. killed recorder) keeps everything read so far.
+            pass
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self._entries.get(key)
+
+    def put(self, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[entry["key"]] = entry
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class CassetteAdapter(HTTPAdapter):
+    """``requests`` transport that records to or replays from a :class:`CassetteStore`."""
+
+    def __init__(
+        self,
+        store: CassetteStore,
+        mode: str = "replay",
+        latency_scale: float = 0.0,
+        allow_miss: bool = False,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(**kwargs)
+        if mode not in {"record", "replay"}:
+            raise ValueError(f"unsupported cassette mode: {mode}")
+        self.store = store
+        self.mode = mode
+        self.latency_scale = max(0.0, float(latency_scale or 0.0))
+        self.allow_miss = allow_miss
+        self._stats_lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "recorded": 0}
+
+    def _bump(self, name: str) -> None:
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def send(self, request: requests.PreparedRequest, **kwargs: Any) -> requests.Response:
+        key = request_key(request.method or "GET", request.url or "", request.body)
+        if self.mode == "replay":
+            entry = self.store.get(key)
+            if entry is not None:
+                self._bump("hits")
+                if self.latency_scale > 0:
+                    time.sleep(float(entry.get("elapsed", 0.0) or 0.0) * self.latency_scale)
+                return self._build_replay_response(request, entry)
+            self._bump("misses")
+            if not self.allow_miss:
+                raise requests.ConnectionError(f"cassette_miss: {key}", request=request)
+            return super().send(request, **kwargs)
+
+        started = time.time()
+        response = super().send(request, **kwargs)
+        content = response.content
+        elapsed = round(time.time() - started, 4)
+        self.store.put(
+            {
+                "key": key,
+                "method": request.method,
+                "url": request.url,
+                "status": response.status_code,
+                "reason": response.reason,
+                "headers": {k: v for k, v in response.headers.items() if k.lower() not in _DROPPED_HEADERS},
+                "body_b64": base64.b64encode(content or b"").decode("ascii"),
+                "elapsed": elapsed,
+                "recorded_at": time.time(),
+            }
+        )
+        self._bump("recorded")
+        return response
+
+    def _build_replay_response(self, request: requests.PreparedRequest, entry: Dict[str, Any]) -> requests.Response:
+        content = base64.b64decode(entry.get("body_b64") or "")
+        response = requests.Response()
+        response.status_code = int(entry.get("status", 200) or 200)
+        response.reason = str(entry.get("reason") or "")
+        response.headers = CaseInsensitiveDict(entry.get("headers") or {})
+        response.encoding = get_encoding_from_headers(response.headers)
+        # Serve the body through ``raw`` so stream=True callers can still read incrementally.
+        response.raw = io.BytesIO(content)
+        response.url = request.url or ""
+        response.request = request
+        response.connection = self
+        return response
+
+
+_STORES: Dict[str, CassetteStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def _shared_store(path: Path) -> CassetteStore:
+    key = str(Path(path).resolve())
+    with _STORES_LOCK:
+        store = _STORES.get(key)
+        if store is None:
+            store = CassetteStore(Path(path))
+            _STORES[key] = store
+        return store
+
+
+def cassette_mode() -> str:
+    mode = os.getenv("FLOWERNET_HTTP_CASSETTE_MODE", "off").strip().lower() or "off"
+    return mode if mode in CASSETTE_MODES else "off"
+
+
+def install_cassette(
+    session: requests.Session,
+    mode: Optional[str] = None,
+    path: Optional[Path] = None,
+    latency_scale: Optional[float] = None,
+    allow_miss: Optional[bool] = None,
+) -> Optional[CassetteAdapter]:
+    """Mount a cassette adapter on ``session`` for http/https; no-op when mode is ``off``."""
+    mode = (mode or cassette_mode()).lower()
+    if mode not in {"record", "replay"}:
+        return None
+    store = _shared_store(Path(path or os.getenv("FLOWERNET_HTTP_CASSETTE_PATH") or _default_cassette_path()))
+    if latency_scale is None:
+        latency_scale = float(os.getenv("FLOWERNET_HTTP_CASSETTE_LATENCY_SCALE", "0") or 0)
+    if allow_miss is None:
+        allow_miss = os.getenv("FLOWERNET_HTTP_CASSETTE_ALLOW_MISS", "false").lower() == "true"
+    adapter = CassetteAdapter(store, mode=mode, latency_scale=latency_scale, allow_miss=allow_miss)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return adapter
+
+
+def cassette_stats(session: requests.Session) -> Dict[str, Any]:
+    for adapter in session.adapters.values():
+        if isinstance(adapter, CassetteAdapter):
+            return {"mode": adapter.mode, "entries": len(adapter.store), **adapter.stats}
+    return {"mode": "off"}
@@ -10,8 +10,8 @@ import uvicorn
 import os
 import sys
 import threading
-import queue
 import time
+import uuid
 import importlib.util
 from datetime import datetime
 
@@ -149,7 +149,6 @@ document_orchestrator = None
 history_manager = None
 document_generation_lock = threading.Lock()
 generator_init_lock = threading.Lock()
-document_task_queue: "queue.Queue[str]" = queue.Queue()
 document_tasks: Dict[str, Dict[str, Any]] = {}
 document_tasks_lock = threading.Lock()
 document_worker_started = False
@@ -162,10 +161,12 @@ DOCUMENT_TASK_HARD_TIMEOUT = min(
 DOCUMENT_TASK_STALE_SECONDS = max(120, int(os.getenv("DOCUMENT_TASK_STALE_SECONDS", "900")))
 DOCUMENT_TASK_WORKERS = max(1, min(4, int(os.getenv("DOCUMENT_TASK_WORKERS", "2"))))
 DOCUMENT_TASK_HEARTBEAT_SECONDS = max(10.0, float(os.getenv("DOCUMENT_TASK_HEARTBEAT_SECONDS", "30")))
+# 持久化队列租约：心跳续租；进程崩溃后租约过期，任务由其他 worker 进程重新领取
+DOCUMENT_TASK_LEASE_SECONDS = max(120.0, DOCUMENT_TASK_HEARTBEAT_SECONDS * 4)
 PROVIDER_DIAGNOSTIC_TIMEOUT = max(3.0, float(os.getenv("PROVIDER_DIAGNOSTIC_TIMEOUT", "20")))
 DOCUMENT_TERMINAL_STATUSES = {"completed", "failed", "cancelled"}
 checkpoint_store = get_checkpoint_store()
-agent_task_queue = get_task_queue("flowernet:generator:tasks")
+document_task_queue = get_task_queue("flowernet:generator:tasks")
 vector_store = get_vector_store()
 eval_store = get_eval_store()
 tool_registry = get_tool_registry()
@@ -355,10 +356,47 @@ def _execute_generate_document(request: GenerateDocumentRequest, use_lock: bool
             document_generation_lock.release()
 
 
+def _restore_document_task(task_id: str, item: Dict[str, Any]) -> None:
+    """登记从持久化队列领取、但本进程内存中没有的任务（重启后或由其他进程提交）。"""
+    with document_tasks_lock:
+        if task_id in document_tasks:
+            return
+    checkpoint = dict(checkpoint_store.get(f"generator_task:{task_id}") or {})
+    try:
+        request = GenerateDocumentRequest(**(item.get("request") or {}))
+    except Exception:
+        request = None
+    if str(checkpoint.get("status") or "") not in DOCUMENT_TERMINAL_STATUSES:
+        # 上一次执行的进程已退出：按排队状态重新执行，心跳计时从现在开始
+        checkpoint.update(status="queued", updated_at=datetime.now().isoformat())
+        for key in ("started_at", "heartbeat_at", "runtime_seconds"):
+            checkpoint.pop(key, None)
+    checkpoint.setdefault("created_at", item.get("created_at") or datetime.now().isoformat())
+    checkpoint.update(task_id=task_id, document_id=item.get("document_id"), request=request)
+    with document_tasks_lock:
+        document_tasks.setdefault(task_id, checkpoint)
+
+
+def _document_task_cancelled_elsewhere(task_id: str) -> bool:
+    try:
+        checkpoint = checkpoint_store.get(f"generator_task:{task_id}") or {}
+    except Exception:
+        return False
+    return bool(checkpoint.get("cancel_requested")) and checkpoint.get("status") == "cancelled"
+
+
 def _document_task_worker_loop() -> None:
     while True:
-        task_id = document_task_queue.get()
+        leased = document_task_queue.lease(timeout=5.0, lease_seconds=DOCUMENT_TASK_LEASE_SECONDS)
+        if leased is None:
+            continue
+        item = leased.get("item") or {}
+        receipt = leased.get("receipt")
+        task_id = str(item.get("task_id") or "")
         try:
+            if not task_id:
+                continue
+            _restore_document_task(task_id, item)
             _mark_stale_document_tasks()
             with document_tasks_lock:
                 task = document_tasks.get(task_id, {})
@@ -369,17 +407,29 @@ def _document_task_worker_loop() -> None:
             if not isinstance(request, GenerateDocumentRequest):
                 _set_document_task(task_id, status="failed", error="invalid_task_request")
                 continue
-            _set_document_task(task_id, status="running", started_at=datetime.now().isoformat())
+            _set_document_task(
+                task_id,
+                status="running",
+                started_at=datetime.now().isoformat(),
+                attempt=int(leased.get("attempts") or 1),
+            )
 
             started_monotonic = time.monotonic()
             stop_heartbeat = threading.Event()
 
             def heartbeat_loop() -> None:
                 while not stop_heartbeat.wait(DOCUMENT_TASK_HEARTBEAT_SECONDS):
+                    if _document_task_cancelled_elsewhere(task_id):
+                        # 另一个进程处理了取消请求（只写入了 checkpoint）
+                        with document_tasks_lock:
+                            document_tasks.get(task_id, {})["cancel_requested"] = True
+                        _mark_stale_document_tasks()
+                        return
                     with document_tasks_lock:
                         current = str(document_tasks.get(task_id, {}).get("status") or "")
                     if current in {"failed", "completed"}:
                         return
+                    document_task_queue.extend(receipt, DOCUMENT_TASK_LEASE_SECONDS)
                     _set_document_task(
                         task_id,
                         status="running",
@@ -429,7 +479,7 @@ def _document_task_worker_loop() -> None:
                 completed_at=datetime.now().isoformat(),
             )
         finally:
-            document_task_queue.task_done()
+            document_task_queue.ack(receipt)
 
 
 def _ensure_document_worker_started() -> None:
@@ -583,6 +633,13 @@ async def startup_event():
     sys.stdout.flush()
 
 
+@app.on_event("shutdown")
+def shutdown_event():
+    """退出前把写后（write-behind）队列中的 RAG 索引落盘"""
+    if not vector_store.flush(timeout=float(os.getenv("FLOWERNET_VECTOR_INDEX_SHUTDOWN_SECONDS", "10"))):
+        print("⚠️  Vector 索引队列未在超时内清空")
+
+
 # 调试端点：检查 Generator 状态
 @app.get("/debug")
 async def debug():
@@ -623,6 +680,7 @@ async def health():
         "document_task_workers": DOCUMENT_TASK_WORKERS,
         "document_task_hard_timeout_seconds": DOCUMENT_TASK_HARD_TIMEOUT,
         "document_task_hard_timeout_cap_seconds": DOCUMENT_TASK_HARD_TIMEOUT_CAP,
+        "history_writes": history_manager.write_stats() if hasattr(history_manager, "write_stats") else None,
     }
 
 
@@ -734,6 +792,9 @@ def generate_section(request: GenerateSectionRequest):
             rel_threshold=request.rel_threshold,
             red_threshold=request.red_threshold
         )
+        # 调用方随后会读取 history，返回前等待异步写入送达
+        if hasattr(history_manager, "flush"):
+            history_manager.flush()
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -798,7 +859,8 @@ def start_generate_document_task(request: GenerateDocumentRequest):
             "reused": True,
         }
 
-    task_id = f"doc_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{len(document_tasks) + 1}"
+    # 多个 worker 进程共享持久化队列，任务 ID 需跨进程唯一
+    task_id = f"doc_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{len(document_tasks) + 1}_{uuid.uuid4().hex[:6]}"
     now = datetime.now().isoformat()
     with document_tasks_lock:
         document_tasks[task_id] = {
@@ -821,10 +883,17 @@ def start_generate_document_task(request: GenerateDocumentRequest):
             },
             ttl_seconds=7 * 24 * 3600,
         )
-        agent_task_queue.put({"type": "generate_document", "task_id": task_id, "document_id": request.document_id, "created_at": now})
     except Exception:
         pass
-    document_task_queue.put(task_id)
+    document_task_queue.put(
+        {
+            "type": "generate_document",
+            "task_id": task_id,
+            "document_id": request.document_id,
+            "created_at": now,
+            "request": request.model_dump(),
+        }
+    )
     return {
         "success": True,
         "task_id": task_id,
@@ -936,8 +1005,8 @@ def get_generate_document_tasks_summary():
     items.sort(key=lambda item: str(item.get("created_at") or ""), reverse=True)
     return {
         "success": True,
-        "queue_size": document_task_queue.qsize(),
-        "agent_queue": agent_task_queue.capabilities(),
+        "queue_size": document_task_queue.size(),
+        "agent_queue": document_task_queue.capabilities(),
         "checkpoint_store": checkpoint_store.capabilities(),
         "worker_started": document_worker_started,
         "hard_timeout_seconds": DOCUMENT_TASK_HARD_TIMEOUT,
@@ -954,7 +1023,7 @@ def get_agent_capabilities():
     caps = agent_stack_capabilities()
     caps["generator_service"] = {
         "document_worker_started": document_worker_started,
-        "document_queue_size": document_task_queue.qsize(),
+        "document_queue_size": document_task_queue.size(),
         "provider_chain": os.getenv("GENERATOR_PROVIDER_CHAIN", os.getenv("GENERATOR_PROVIDER", "")),
     }
     return {"success": True, "capabilities": caps}
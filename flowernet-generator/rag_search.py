@@ -1,23 +1,384 @@
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Optional, Tuple
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import codecs
 import re
 import time
 import html
 import os
+import threading
 from urllib.parse import unquote, urlparse, parse_qs
 
 import requests
 import os as _os
 
+from domain_authority import get_domain_authority
+from http_cassette import install_cassette
+
+
+def _parse_retry_after(value: Any) -> Optional[float]:
+    text = str(value or "").strip()
+    if not text:
+        return None
+    try:
+        return max(0.0, float(text))
+    except ValueError:
+        pass
+    try:
+        dt = parsedate_to_datetime(text)
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return max(0.0, (dt - datetime.now(timezone.utc)).total_seconds())
+    except Exception:
+        return None
+
+
+class HostThrottle:
+    """Process-wide per-host rate limiter with a circuit breaker.
+
+    Each host starts at a configured QPS. A 429/503 halves it (and honours
+    ``Retry-After``), successes grow it back additively up to the ceiling.
+    Consecutive failures open the host's circuit; while open, callers skip
+    the host instead of burning their search deadline on it. After the open
+    window a single half-open probe decides whether to close or reopen.
+    """
+
+    THROTTLE_STATUSES = {429, 503}
+
+    def __init__(self) -> None:
+        self.default_qps = max(0.05, float(os.getenv("RAG_HOST_DEFAULT_QPS", "2.0")))
+        self.max_qps = max(self.default_qps, float(os.getenv("RAG_HOST_MAX_QPS", "8.0")))
+        self.min_qps = max(0.01, float(os.getenv("RAG_HOST_MIN_QPS", "0.1")))
+        self.qps_step = max(0.01, float(os.getenv("RAG_HOST_QPS_STEP", "0.25")))
+        self.failure_threshold = max(1, int(os.getenv("RAG_CIRCUIT_FAILURE_THRESHOLD", "3")))
+        self.open_seconds = max(1.0, float(os.getenv("RAG_CIRCUIT_OPEN_SECONDS", "30")))
+        self.max_open_seconds = max(self.open_seconds, float(os.getenv("RAG_CIRCUIT_MAX_OPEN_SECONDS", "300")))
+        self.initial_qps = {
+            "api.crossref.org": 4.0,
+            "export.arxiv.org": 1.0,
+            "duckduckgo.com": 1.0,
+            "html.duckduckgo.com": 1.0,
+            "lite.duckduckgo.com": 1.0,
+        }
+        self._hosts: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _state(self, host: str) -> Dict[str, Any]:
+        state = self._hosts.get(host)
+        if state is None:
+            qps = min(self.max_qps, max(self.min_qps, float(self.initial_qps.get(host, self.default_qps))))
+            state = {
+                "qps": qps,
+                "next_slot": 0.0,
+                "failures": 0,
+                "open_until": 0.0,
+                "open_seconds": self.open_seconds,
+                "probe_in_flight": False,
+                "throttled": 0,
+                "skipped": 0,
+                "requests": 0,
+            }
+            self._hosts[host] = state
+        return state
+
+    def acquire(self, host: str, deadline: Optional[float] = None) -> bool:
+        """Reserve a request slot for ``host``; False means skip the host."""
+        if not host:
+            return True
+        with self._lock:
+            state = self._state(host)
+            now = time.time()
+            if state["open_until"]:
+                if now < state["open_until"] or state["probe_in_flight"]:
+                    state["skipped"] += 1
+                    return False
+                # Open window elapsed: let exactly one half-open probe through.
+                state["probe_in_flight"] = True
+            slot = max(now, state["next_slot"])
+            if deadline is not None and slot >= deadline:
+                state["skipped"] += 1
+                state["probe_in_flight"] = False
+                return False
+            state["next_slot"] = slot + 1.0 / state["qps"]
+            state["requests"] += 1
+            wait = slot - now
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+    def release(self, host: str) -> None:
+        """Give back an acquired slot that was never used against the host.
+
+        For requests abandoned because the caller's own deadline ran out: the
+        half-open probe is cleared and the slot reservation is undone, but
+        failure counts and the open window are left untouched.
+        """
+        if not host:
+            return
+        with self._lock:
+            state = self._state(host)
+            state["probe_in_flight"] = False
+            state["next_slot"] = max(time.time(), state["next_slot"] - 1.0 / state["qps"])
+
+    def record(self, host: str, status_code: Optional[int], retry_after: Any = None) -> None:
+        """Feed back an outcome; ``status_code`` None means a transport error."""
+        if not host:
+            return
+        with self._lock:
+            state = self._state(host)
+            was_probe = state["probe_in_flight"]
+            state["probe_in_flight"] = False
+            now = time.time()
+            if status_code is not None and status_code not in self.THROTTLE_STATUSES and status_code < 500:
+                state["failures"] = 0
+                state["open_until"] = 0.0
+                state["open_seconds"] = self.open_seconds
+                state["qps"] = min(self.max_qps, state["qps"] + self.qps_step)
+                return
+
+            state["failures"] += 1
+            delay = _parse_retry_after(retry_after)
+            if status_code in self.THROTTLE_STATUSES:
+                state["throttled"] += 1
+                state["qps"] = max(self.min_qps, state["qps"] * 0.5)
+                if delay is not None:
+                    state["next_slot"] = max(state["next_slot"], now + delay)
+                    # Learn the server's pace: never plan faster than one request per Retry-After.
+                    if delay > 0:
+                        state["qps"] = max(self.min_qps, min(state["qps"], 1.0 / delay))
+            if was_probe or state["failures"] >= self.failure_threshold:
+                if was_probe:
+                    state["open_seconds"] = min(self.max_open_seconds, state["open_seconds"] * 2)
+                window = max(state["open_seconds"], delay or 0.0)
+                state["open_until"] = now + window
+
+    def is_open(self, host: str) -> bool:
+        with self._lock:
+            state = self._hosts.get(host)
+            return bool(state and state["open_until"] and time.time() < state["open_until"])
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            return {
+                host: {
+                    "qps": round(state["qps"], 3),
+                    "failures": state["failures"],
+                    "circuit": (
+                        "open" if state["open_until"] and now < state["open_until"]
+                        else "half_open" if state["open_until"] else "closed"
+                    ),
+                    "throttled": state["throttled"],
+                    "skipped": state["skipped"],
+                    "requests": state["requests"],
+                }
+                for host, state in self._hosts.items()
+            }
+
+
+_HOST_THROTTLE: Optional[HostThrottle] = None
+_HOST_THROTTLE_LOCK = threading.Lock()
+
+
+def get_host_throttle() -> HostThrottle:
+    global _HOST_THROTTLE
+    if _HOST_THROTTLE is None:
+        with _HOST_THROTTLE_LOCK:
+            if _HOST_THROTTLE is None:
+                _HOST_THROTTLE = HostThrottle()
+    return _HOST_THROTTLE
+
+
+class RAGQueryPlanner:
+    """Per-document memo of query candidates and of queries known to come back empty.
+
+    Subsections of one document share most of their topic terms, so candidate
+    generation (tokenisation, profile inference, variant expansion) repeats and
+    identical variants are re-issued against the same providers. The planner
+    memoises the candidate builders and remembers ``(channel, query)`` pairs
+    that returned nothing or only low-alignment hits, so later searches in the
+    same document skip them. ``snapshot()`` reports the calls saved.
+    """
+
+    def __init__(self, document_id: str = "", max_entries: Optional[int] = None) -> None:
+        self.document_id = str(document_id or "")
+        self.max_entries = max(16, int(max_entries or os.getenv("RAG_QUERY_PLANNER_MAX_ENTRIES", "2048")))
+        self._lock = threading.Lock()
+        self._memo: "OrderedDict[Tuple[str, Any], Any]" = OrderedDict()
+        self._known_empty: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        self.stats: Dict[str, int] = {"memo_hits": 0, "memo_misses": 0, "skipped_calls": 0, "recorded_empty": 0}
+        self.skipped_by_channel: Dict[str, int] = {}
+
+    @staticmethod
+    def _normalize(query: str) -> str:
+        return " ".join(str(query or "").split()).lower()
+
+    def memoize(self, kind: str, key: Any, compute):
+        """Return the cached value for ``(kind, key)``, computing it on first use."""
+        memo_key = (kind, key)
+        with self._lock:
+            if memo_key in self._memo:
+                self._memo.move_to_end(memo_key)
+                self.stats["memo_hits"] += 1
+                value = self._memo[memo_key]
+                return list(value) if isinstance(value, list) else value
+            self.stats["memo_misses"] += 1
+        value = compute()
+        with self._lock:
+            self._memo[memo_key] = value
+            while len(self._memo) > self.max_entries:
+                self._memo.popitem(last=False)
+        return list(value) if isinstance(value, list) else value
+
+    def should_skip(self, channel: str, query: str) -> bool:
+        """True (and counted as a saved call) when ``query`` is known empty on ``channel``."""
+        key = (channel, self._normalize(query))
+        with self._lock:
+            if key not in self._known_empty:
+                return False
+            self.stats["skipped_calls"] += 1
+            self.skipped_by_channel[channel] = self.skipped_by_channel.get(channel, 0) + 1
+            return True
+
+    def record_empty(self, channel: str, query: str, reason: str = "empty") -> None:
+        normalized = self._normalize(query)
+        if not normalized:
+            return
+        with self._lock:
+            key = (channel, normalized)
+            if key not in self._known_empty:
+                self.stats["recorded_empty"] += 1
+            self._known_empty[key] = reason
+            while len(self._known_empty) > self.max_entries:
+                self._known_empty.popitem(last=False)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "document_id": self.document_id,
+                **self.stats,
+                "saved_calls": self.stats["skipped_calls"],
+                "skipped_by_channel": dict(self.skipped_by_channel),
+                "known_empty_queries": len(self._known_empty),
+            }
+
+
+class DuckDuckGoStreamParser:
+    """Incremental DuckDuckGo result parser that stops once enough usable results exist.
+
+    Chunks are appended to a buffer that is scanned forward only. A result
+    link is emitted once its snippet (or the next result link) has arrived,
+    so callers can stop reading the response body as soon as ``done`` is set.
+    ``truncated`` marks a body that was cut off by the search deadline before
+    ``done``; its results are partial and must not be read as "no results".
+    Pages without the html/lite result markup fall back to ``_parse_results``
+    over the consumed body when the stream is closed.
+    """
+
+    LINK_PATTERN = re.compile(
+        r'<a[^>]*class="(?:result__a|result-link)"[^>]*href="(?P<href>[^"]+)"[^>]*>(?P<title>.*?)</a>',
+        flags=re.IGNORECASE | re.DOTALL,
+    )
+    SNIPPET_PATTERN = re.compile(
+        r'<(?:a|td|div)[^>]*class="(?:result__snippet|result-snippet|snippet)"[^>]*>(?P<snippet>.*?)</(?:a|td|div)>',
+        flags=re.IGNORECASE | re.DOTALL,
+    )
+
+    def __init__(self, engine: "RAGSearchEngine", max_items: int, accept=None) -> None:
+        self.engine = engine
+        self.max_items = max(1, int(max_items))
+        self.accept = accept
+        self.results: List[Dict[str, Any]] = []
+        self.done = False
+        self.truncated = False
+        self.bytes_read = 0
+        self._buffer = ""
+        self._pos = 0
+        self._pending = None
+        self._seen: set[str] = set()
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Consume a decoded chunk and return results completed by it."""
+        if self.done or not chunk:
+            return []
+        self._buffer += chunk
+        start = len(self.results)
+        while not self.done:
+            if self._pending is None:
+                match = self.LINK_PATTERN.search(self._buffer, self._pos)
+                if match is None:
+                    break
+                self._pending = match
+                self._pos = match.end()
+                continue
+            next_link = self.LINK_PATTERN.search(self._buffer, self._pos)
+            limit = next_link.start() if next_link else len(self._buffer)
+            snippet = self.SNIPPET_PATTERN.search(self._buffer, self._pos, limit)
+            if snippet is not None:
+                self._emit(self._pending, snippet.group("snippet"))
+                self._pending = None
+                self._pos = snippet.end()
+            elif next_link is not None:
+                self._emit(self._pending, "")
+                self._pending = None
+            else:
+                break
+        return self.results[start:]
+
+    def close(self) -> List[Dict[str, Any]]:
+        if not self.done and self._pending is not None:
+            self._emit(self._pending, "")
+            self._pending = None
+        if not self.done and self._buffer:
+            for item in self.engine._parse_results(self._buffer, self.max_items * 4):
+                if self.done:
+                    break
+                href = item.get("href", "")
+                if href in self._seen or (self.accept is not None and not self.accept(item)):
+                    continue
+                self._seen.add(href)
+                self._append(item)
+        return self.results
+
+    def _emit(self, link_match, snippet_html: str) -> None:
+        href = self.engine._clean_href(link_match.group("href"))
+        if not href or href in self._seen:
+            return
+        self._seen.add(href)
+        title = self.engine._strip_html(link_match.group("title") or "")
+        if not title:
+            return
+        item = {
+            "title": title,
+            "body": self.engine._strip_html(snippet_html)[:400] if snippet_html else "",
+            "href": href,
+            "source": self.engine._extract_domain(href),
+        }
+        if self.accept is not None and not self.accept(item):
+            return
+        self._append(item)
+
+    def _append(self, item: Dict[str, Any]) -> None:
+        self.results.append(item)
+        if len(self.results) >= self.max_items:
+            self.done = True
+
 
 class RAGSearchEngine:
     def __init__(self, max_results: int = 5, timeout: int = 10):
         self.max_results = max_results
         self.timeout = timeout
         self.max_total_seconds = max(3.0, float(os.getenv("RAG_SEARCH_MAX_SECONDS", str(timeout))))
-        self._active_deadline: float | None = None
+        # Per-search state (deadline, planner, degraded flag) lives in thread-local
+        # storage: one engine is shared by all document workers.
+        self._search_state = threading.local()
         self.available = True
         self.session = requests.Session()
         self.session.trust_env = False
+        self.cassette = install_cassette(self.session)
+        self.host_throttle = get_host_throttle()
+        self.stream_chunk_bytes = max(1024, int(os.getenv("RAG_DDG_STREAM_CHUNK_BYTES", "8192")))
         self._user_agent = (
             "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
             "AppleWebKit/537.36 (KHTML, like Gecko) "
@@ -39,27 +400,7 @@ class RAGSearchEngine:
         self.min_topic_alignment = float(os.getenv("RAG_MIN_TOPIC_ALIGNMENT", "0.18"))
         self.safe_min_results = max(1, int(os.getenv("RAG_SAFE_MIN_RESULTS", "1")))
         self.safe_backfill_enabled = os.getenv("RAG_SAFE_BACKFILL_ENABLED", "true").lower() == "true"
-        self.high_quality_domains = {
-            "nature.com", "science.org", "sciencedirect.com", "springer.com", "ieee.org",
-            "acm.org", "arxiv.org", "crossref.org", "pubmed.ncbi.nlm.nih.gov",
-            "ncbi.nlm.nih.gov", "who.int", "oecd.org", "un.org",
-            "nist.gov", "nih.gov", "gov.cn", "edu.cn", "ruc.edu.cn", "tsinghua.edu.cn",
-            "pku.edu.cn", "cass.cn", "moe.gov.cn", "doi.org",
-            "eric.ed.gov", "apa.org", "psycnet.apa.org", "tandfonline.com", "sagepub.com",
-            "frontiersin.org", "cambridge.org", "oxfordacademic.com", "academic.oup.com",
-            "wiley.com", "onlinelibrary.wiley.com", "jstor.org", "cell.com", "thelancet.com",
-            "nejm.org", "bmj.com", "cochranelibrary.com", "aclweb.org", "openreview.net",
-            "proceedings.neurips.cc", "proceedings.mlr.press",
-        }
-        self.low_quality_domains = {
-            "baike.baidu.com", "zhidao.baidu.com", "tieba.baidu.com", "jingyan.baidu.com",
-            "m.baidu.com", "t.co", "bit.ly", "tinyurl.com", "researchgate.net",
-        }
-        self.social_quality_domains = {
-            "zhihu.com", "bilibili.com", "weibo.com", "xiaohongshu.com", "douyin.com",
-            "x.com", "twitter.com", "reddit.com", "linkedin.com", "substack.com",
-            "medium.com", "youtube.com", "facebook.com", "instagram.com",
-        }
+        self.domain_authority = get_domain_authority()
         self._domain_profiles = {
             "long_context_llm": {
                 "signals": [
@@ -286,6 +627,57 @@ class RAGSearchEngine:
             return 0.0
         return max(0.5, min(float(self.timeout), remaining))
 
+    def _planned(self, kind: str, key: Any, compute):
+        """Memoise ``compute()`` in the active query planner; plain call when none is attached."""
+        planner = self._active_planner
+        if planner is None:
+            return compute()
+        return planner.memoize(kind, key, compute)
+
+    def _skip_known_empty(self, channel: str, query: str) -> bool:
+        planner = self._active_planner
+        return planner is not None and planner.should_skip(channel, query)
+
+    def _record_empty(self, channel: str, query: str, reason: str = "empty") -> None:
+        if self._active_planner is not None:
+            self._active_planner.record_empty(channel, query, reason)
+
+    def _throttled_get(self, url: str, **kwargs: Any) -> Optional[requests.Response]:
+        """session.get routed through the shared host throttle; None when the host is skipped."""
+        host = (urlparse(url).netloc or "").lower()
+        if not self.host_throttle.acquire(host, self._active_deadline):
+            self._active_degraded = True
+            return None
+        shortened = False
+        if self._active_deadline is not None and "timeout" in kwargs:
+            # Time spent waiting for a slot comes out of this request's budget.
+            remaining = self._request_timeout()
+            if remaining <= 0:
+                # Our deadline, not the host's fault: free the slot without counting a failure.
+                self.host_throttle.release(host)
+                self._active_degraded = True
+                return None
+            shortened = remaining < float(kwargs["timeout"])
+            kwargs["timeout"] = min(float(kwargs["timeout"]), remaining)
+        try:
+            response = self.session.get(url, **kwargs)
+        except requests.Timeout:
+            if shortened:
+                # Timed out inside the budget we cut short; the host may have answered in time.
+                self.host_throttle.release(host)
+            else:
+                self.host_throttle.record(host, None)
+            self._active_degraded = True
+            raise
+        except Exception:
+            self.host_throttle.record(host, None)
+            self._active_degraded = True
+            raise
+        self.host_throttle.record(host, response.status_code, response.headers.get("Retry-After"))
+        if response.status_code >= 500 or response.status_code in self.host_throttle.THROTTLE_STATUSES:
+            self._active_degraded = True
+        return response
+
     def _clean_query_for_retrieval(self, query: str, max_chars: int = 220) -> str:
         text = " ".join(str(query or "").split())
         if not text:
@@ -300,13 +692,55 @@ class RAGSearchEngine:
             return text[:max_chars]
         return " ".join(tokens[:14])[:max_chars]
 
-    def search(self, query: str) -> Dict[str, Any]:
+    @property
+    def _active_deadline(self) -> Optional[float]:
+        return getattr(self._search_state, "deadline", None)
+
+    @_active_deadline.setter
+    def _active_deadline(self, value: Optional[float]) -> None:
+        self._search_state.deadline = value
+
+    @property
+    def _active_planner(self) -> Optional[RAGQueryPlanner]:
+        return getattr(self._search_state, "planner", None)
+
+    @_active_planner.setter
+    def _active_planner(self, value: Optional[RAGQueryPlanner]) -> None:
+        self._search_state.planner = value
+
+    @property
+    def _active_degraded(self) -> bool:
+        return getattr(self._search_state, "degraded", False)
+
+    @_active_degraded.setter
+    def _active_degraded(self, value: bool) -> None:
+        self._search_state.degraded = value
+
+    def search(self, query: str, planner: Optional[RAGQueryPlanner] = None) -> Dict[str, Any]:
+        previous_deadline = self._active_deadline
+        previous_planner = self._active_planner
+        previous_degraded = self._active_degraded
         try:
             started_at = time.time()
-            previous_deadline = self._active_deadline
             self._active_deadline = started_at + self.max_total_seconds
+            # Without a document planner, still memoise within this call (profile
+            # inference otherwise re-tokenises the query once per ranked item).
+            self._active_planner = planner or RAGQueryPlanner()
+            self._active_degraded = False
+            if self._skip_known_empty("search", query):
+                return {
+                    "success": False,
+                    "query": query,
+                    "results": [],
+                    "search_time": 0.0,
+                    "error": "known_empty_query",
+                }
             retrieval_query = self._clean_query_for_retrieval(query)
-            query_candidates = self._build_query_candidates(retrieval_query or query)
+            query_candidates = self._planned(
+                "query_candidates",
+                retrieval_query or query,
+                lambda: self._build_query_candidates(retrieval_query or query),
+            )
             results: List[Dict[str, Any]] = []
             last_error = "no_results_parsed"
 
@@ -341,21 +775,26 @@ class RAGSearchEngine:
                 if self._deadline_exceeded():
                     last_error = "rag_search_timeout"
                     break
-                raw_html, fetch_error = self._fetch_duckduckgo_html(query_candidate)
-                if raw_html:
-                    results = self._parse_results(raw_html, self.max_results)
-                    if results:
-                        ranked_results = self._rank_results(query_candidate, results)
-                        if ranked_results:
-                            return {
-                                "success": True,
-                                "query": query,
-                                "effective_query": query_candidate,
-                                "results": ranked_results,
-                                "search_time": round(time.time() - started_at, 3),
-                                "error": None,
-                                "source_type": "web",
-                            }
+                if self._skip_known_empty("web", query_candidate):
+                    continue
+                results, fetch_error = self._fetch_duckduckgo_results(query_candidate, self.max_results)
+                if results:
+                    ranked_results = self._rank_results(query_candidate, results)
+                    if ranked_results:
+                        return {
+                            "success": True,
+                            "query": query,
+                            "effective_query": query_candidate,
+                            "results": ranked_results,
+                            "search_time": round(time.time() - started_at, 3),
+                            "error": None,
+                            "source_type": "web",
+                        }
+                    if not fetch_error:
+                        self._record_empty("web", query_candidate, "low_alignment")
+                elif not fetch_error:
+                    # Only a fully read (or completed) body proves the query is empty.
+                    self._record_empty("web", query_candidate)
                 if fetch_error:
                     last_error = fetch_error
 
@@ -382,7 +821,12 @@ class RAGSearchEngine:
                             "error": "fallback_wikipedia",
                             "source_type": "wiki",
                         }
+                    self._record_empty("wiki", fallback_query, "low_alignment")
 
+            if last_error == "no_results_parsed" and not self._active_degraded and not self._deadline_exceeded():
+                # Every channel answered and nothing usable came back; timeouts and
+                # throttled or failing hosts are transient and stay retryable.
+                self._record_empty("search", query)
             return {
                 "success": False,
                 "query": query,
@@ -398,7 +842,9 @@ class RAGSearchEngine:
                 "error": str(exc),
             }
         finally:
-            self._active_deadline = previous_deadline if "previous_deadline" in locals() else None
+            self._active_deadline = previous_deadline
+            self._active_planner = previous_planner
+            self._active_degraded = previous_degraded
 
     @staticmethod
     def _has_usable_results(results: List[Dict[str, Any]]) -> bool:
@@ -472,9 +918,14 @@ class RAGSearchEngine:
         seen: set[str] = set()
         raw_limit = max(self.max_results * 4, 12)
         query_text = " ".join(str(query or "").split())[:180]
-        semantic_query = self._semantic_query(query_text)
+        semantic_query = self._planned("semantic_query", query_text, lambda: self._semantic_query(query_text))
         profile_name, profile = self._infer_domain_profile(query_text)
-        academic_queries = self._academic_queries(query_text, semantic_query, profile)
+        # The profile is derived from query_text, so it does not need to be part of the key.
+        academic_queries = self._planned(
+            "academic_queries",
+            (query_text, semantic_query),
+            lambda: self._academic_queries(query_text, semantic_query, profile),
+        )
 
         if profile_name == "long_context_llm":
             for item in self._curated_long_context_sources(query_text):
@@ -613,7 +1064,7 @@ class RAGSearchEngine:
 
     def _safe_backfill_results(self, query: str, existing: List[Dict[str, Any]] | None = None) -> List[Dict[str, Any]]:
         query_text = " ".join(str(query or "").split())[:180]
-        semantic_query = self._semantic_query(query_text)
+        semantic_query = self._planned("semantic_query", query_text, lambda: self._semantic_query(query_text))
         profile_name, profile = self._infer_domain_profile(query_text)
         candidates: List[Dict[str, Any]] = []
         seen: set[str] = set()
@@ -624,7 +1075,11 @@ class RAGSearchEngine:
                 seen.add(href)
                 candidates.append(item)
 
-        backfill_queries = self._safe_backfill_queries(query_text, semantic_query, profile)
+        backfill_queries = self._planned(
+            "safe_backfill_queries",
+            (query_text, semantic_query),
+            lambda: self._safe_backfill_queries(query_text, semantic_query, profile),
+        )
         for backfill_query in backfill_queries:
             if self._deadline_exceeded():
                 return self._rank_results(query, candidates)
@@ -692,6 +1147,9 @@ class RAGSearchEngine:
         return dedup[:10]
 
     def _infer_domain_profile(self, query: str) -> Tuple[str, Dict[str, Any]]:
+        return self._planned("domain_profile", str(query or ""), lambda: self._match_domain_profile(query))
+
+    def _match_domain_profile(self, query: str) -> Tuple[str, Dict[str, Any]]:
         text = str(query or "").lower()
         best_name = ""
         best_profile: Dict[str, Any] = {}
@@ -810,14 +1268,14 @@ class RAGSearchEngine:
         return dedup[:6]
 
     def _search_crossref(self, query: str, max_items: int | None = None) -> List[Dict[str, Any]]:
-        if not query:
+        if not query or self._skip_known_empty("crossref", query):
             return []
         request_timeout = self._request_timeout()
         if request_timeout <= 0:
             return []
         try:
             rows = max(2, int(max_items or self.max_results))
-            response = self.session.get(
+            response = self._throttled_get(
                 "https://api.crossref.org/works",
                 params={
                     "query": query,
@@ -828,7 +1286,7 @@ class RAGSearchEngine:
                 timeout=request_timeout,
                 headers={"User-Agent": self._user_agent},
             )
-            if response.status_code != 200:
+            if response is None or response.status_code != 200:
                 return []
 
             payload = response.json() if response.content else {}
@@ -887,19 +1345,21 @@ class RAGSearchEngine:
                 )
                 if len(results) >= rows:
                     break
+            if not results:
+                self._record_empty("crossref", query)
             return results
         except Exception:
             return []
 
     def _search_arxiv(self, query: str) -> List[Dict[str, Any]]:
-        if not query:
+        if not query or self._skip_known_empty("arxiv", query):
             return []
         request_timeout = self._request_timeout()
         if request_timeout <= 0:
             return []
         try:
             api_url = "http://export.arxiv.org/api/query"
-            response = self.session.get(
+            response = self._throttled_get(
                 api_url,
                 params={
                     "search_query": f"all:{query}",
@@ -911,7 +1371,7 @@ class RAGSearchEngine:
                 timeout=request_timeout,
                 headers={"User-Agent": self._user_agent},
             )
-            if response.status_code != 200 or not response.text:
+            if response is None or response.status_code != 200 or not response.text:
                 return []
 
             import xml.etree.ElementTree as ET
@@ -945,6 +1405,8 @@ class RAGSearchEngine:
                 )
                 if len(results) >= self.max_results:
                     break
+            if not results:
+                self._record_empty("arxiv", query)
             return results
         except Exception:
             return []
@@ -955,16 +1417,16 @@ class RAGSearchEngine:
         if self._deadline_exceeded():
             return []
         site_query = f"{query} site:{domain}"
-        raw_html, _ = self._fetch_duckduckgo_html(site_query)
-        if not raw_html:
+        if self._skip_known_empty("site", site_query):
             return []
-        items = self._parse_results(raw_html, self.max_results)
-        filtered: List[Dict[str, Any]] = []
-        for item in items:
-            href = str(item.get("href", ""))
-            if domain in self._extract_domain(href):
-                filtered.append(item)
-        return filtered[: self.max_results]
+        items, fetch_error = self._fetch_duckduckgo_results(
+            site_query,
+            self.max_results,
+            accept=lambda item: domain in self._extract_domain(str(item.get("href", ""))),
+        )
+        if not items and not fetch_error:
+            self._record_empty("site", site_query)
+        return items[: self.max_results]
 
     def _tokenize_query(self, text: str) -> List[str]:
         tokens = re.findall(r"[A-Za-z\u4e00-\u9fff][A-Za-z0-9\u4e00-\u9fff\-_]{1,30}", text or "")
@@ -980,29 +1442,7 @@ class RAGSearchEngine:
         return out
 
     def _domain_score(self, domain: str) -> float:
-        host = (domain or "").lower().strip()
-        if not host:
-            return 0.0
-
-        if host in self.low_quality_domains:
-            return 0.15
-        if host in self.high_quality_domains:
-            return 1.0
-        if host in self.social_quality_domains:
-            if host in {"zhihu.com", "bilibili.com", "reddit.com", "substack.com", "medium.com"}:
-                return 0.72
-            if host in {"x.com", "twitter.com", "linkedin.com", "youtube.com", "facebook.com", "instagram.com"}:
-                return 0.68
-            return 0.66
-        if host.endswith(".gov") or host.endswith(".edu") or host.endswith(".gov.cn") or host.endswith(".edu.cn"):
-            return 0.95
-        if "wikipedia.org" in host:
-            return 0.70
-        if host.endswith(".org"):
-            return 0.78
-        if host.endswith(".com"):
-            return 0.62
-        return 0.5
+        return self.domain_authority.score(domain)
 
     def _source_tier(self, item: Dict[str, Any], domain: str) -> float:
         host = (domain or self._extract_domain(str(item.get("href", "")))).lower().replace("www.", "")
@@ -1218,7 +1658,7 @@ class RAGSearchEngine:
             return self._compact_query(query)
         return " ".join(refined)[:120]
 
-    def _fetch_duckduckgo_html(self, query: str) -> Tuple[str, str]:
+    def _fetch_duckduckgo_results(self, query: str, max_items: int, accept=None) -> Tuple[List[Dict[str, Any]], str]:
         headers = {"User-Agent": self._user_agent}
         endpoints = [
             "https://duckduckgo.com/html/",
@@ -1231,29 +1671,59 @@ class RAGSearchEngine:
             for attempt in range(1, 3):
                 request_timeout = self._request_timeout()
                 if request_timeout <= 0:
-                    return "", "rag_search_timeout"
+                    return [], "rag_search_timeout"
                 try:
-                    response = self.session.get(
+                    response = self._throttled_get(
                         endpoint,
                         params={"q": query},
                         timeout=request_timeout,
                         headers=headers,
+                        stream=True,
                     )
-                    if response.status_code == 200 and response.text:
-                        return response.text, ""
-                    last_error = f"http_{response.status_code}"
+                    if response is None:
+                        last_error = f"host_throttled: {urlparse(endpoint).netloc}"
+                        break
+                    try:
+                        if response.status_code == 200:
+                            parser = self._stream_duckduckgo_response(response, max_items, accept)
+                            if parser.truncated:
+                                return parser.results, "rag_search_timeout"
+                            if parser.bytes_read:
+                                return parser.results, ""
+                        last_error = f"http_{response.status_code}"
+                    finally:
+                        response.close()
                 except Exception as exc:
                     last_error = str(exc)
 
                 if attempt == 1:
                     if self._deadline_exceeded():
-                        return "", "rag_search_timeout"
+                        return [], "rag_search_timeout"
                     time.sleep(min(0.35, max(0.0, self._request_timeout())))
 
-        return "", f"duckduckgo_html_fetch_failed: {last_error}"
+        return [], f"duckduckgo_html_fetch_failed: {last_error}"
+
+    def _stream_duckduckgo_response(self, response: requests.Response, max_items: int, accept=None) -> DuckDuckGoStreamParser:
+        """Feed the body into the stream parser, stopping the read once enough results are parsed."""
+        parser = DuckDuckGoStreamParser(self, max_items, accept=accept)
+        decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="replace")
+        for chunk in response.iter_content(chunk_size=self.stream_chunk_bytes):
+            if not chunk:
+                continue
+            parser.bytes_read += len(chunk)
+            parser.feed(decoder.decode(chunk))
+            if parser.done:
+                break
+            if self._deadline_exceeded():
+                parser.truncated = True
+                break
+        else:
+            parser.feed(decoder.decode(b"", final=True))
+        parser.close()
+        return parser
 
     def _search_wikipedia(self, query: str) -> List[Dict[str, Any]]:
-        if not query:
+        if not query or self._skip_known_empty("wiki", query):
             return []
 
         endpoints = [
@@ -1265,13 +1735,14 @@ class RAGSearchEngine:
 
         seen: set[str] = set()
         results: List[Dict[str, Any]] = []
+        answered = 0
 
         for endpoint in endpoints:
             request_timeout = self._request_timeout()
             if request_timeout <= 0:
                 return results
             try:
-                response = self.session.get(
+                response = self._throttled_get(
                     endpoint,
                     params={
                         "action": "query",
@@ -1284,10 +1755,11 @@ class RAGSearchEngine:
                     timeout=request_timeout,
                     headers=headers,
                 )
-                if response.status_code != 200:
+                if response is None or response.status_code != 200:
                     continue
 
                 payload = response.json()
+                answered += 1
                 entries = ((payload or {}).get("query") or {}).get("search") or []
                 wiki_host = urlparse(endpoint).netloc
 
@@ -1314,6 +1786,8 @@ class RAGSearchEngine:
             except Exception:
                 continue
 
+        if not results and answered == len(endpoints):
+            self._record_empty("wiki", query)
         return results
 
     def _parse_results(self, html_text: str, max_items: int) -> List[Dict[str, Any]]:
@@ -1,17 +1,255 @@
+import atexit
+import copy
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
 import requests
-from typing import Any, Dict, List, Optional
+
+
+# 大纲 / subsection 追踪的读缓存：本进程的写入会同步更新或失效缓存，
+# 其他进程（如 controller）的写入最多在 TTL 内不可见；TTL 为 0 关闭缓存
+REMOTE_HISTORY_CACHE_SECONDS = float(os.getenv("FLOWERNET_REMOTE_HISTORY_CACHE_SECONDS", "30"))
+REMOTE_HISTORY_CACHE_SIZE = int(os.getenv("FLOWERNET_REMOTE_HISTORY_CACHE_SIZE", "4096"))
+
+# 流程事件的异步写队列：入队后立即返回，由后台线程批量发送，积压超过上限时丢弃；
+# history / 已通过历史链 / subsection 追踪等内容类写入总是同步发送，失败直接抛给调用方
+REMOTE_HISTORY_ASYNC_WRITES = os.getenv("FLOWERNET_REMOTE_HISTORY_ASYNC_WRITES", "true").lower() == "true"
+REMOTE_HISTORY_QUEUE_SIZE = int(os.getenv("FLOWERNET_REMOTE_HISTORY_QUEUE_SIZE", "5000"))
+REMOTE_HISTORY_WRITE_RETRIES = int(os.getenv("FLOWERNET_REMOTE_HISTORY_WRITE_RETRIES", "4"))
+REMOTE_HISTORY_RETRY_BACKOFF_SECONDS = float(os.getenv("FLOWERNET_REMOTE_HISTORY_RETRY_BACKOFF", "0.5"))
+REMOTE_HISTORY_FLUSH_TIMEOUT_SECONDS = float(os.getenv("FLOWERNET_REMOTE_HISTORY_FLUSH_TIMEOUT", "30"))
+
+
+class _PendingRead:
+    """正在进行中的读请求，相同请求的并发调用方等待同一个结果。"""
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class _AsyncWriteQueue:
+    """
+    后台线程按 FIFO 顺序发送写入，因此同一文档的写入按产生顺序送达。
+
+    每次取出最多 batch_size 条，按类型合并后调用 send(kind, items)；失败按指数退避重试，
+    4xx 或重试用尽后计入 failed_writes 并丢弃（只用于可丢失的流程事件）。
+    droppable_kinds 中的类型在积压达到 max_pending 时直接丢弃。
+    """
+
+    def __init__(
+        self,
+        send: Callable[[str, List[Dict[str, Any]]], Any],
+        max_pending: int,
+        batch_size: int,
+        retries: int,
+        backoff_seconds: float,
+        droppable_kinds: Set[str],
+        on_failure: Optional[Callable[[], None]] = None,
+        linger_seconds: float = 0.05,
+    ):
+        self._send = send
+        self.max_pending = max(1, int(max_pending))
+        self.batch_size = max(1, int(batch_size))
+        self.retries = max(0, int(retries))
+        self.backoff_seconds = max(0.0, float(backoff_seconds))
+        self.droppable_kinds = set(droppable_kinds)
+        self.linger_seconds = max(0.0, float(linger_seconds))
+        self._on_failure = on_failure
+        self._pending: Deque[Tuple[str, Dict[str, Any]]] = deque()
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        # 各文档尚未送达（排队或发送中）的条数，flush(document_id=...) 只等待该文档
+        self._document_pending: Dict[str, int] = {}
+        self._thread: Optional[threading.Thread] = None
+        self.last_error: Optional[str] = None
+        self.stats = {
+            "queued_writes": 0,
+            "delivered_writes": 0,
+            "write_batches": 0,
+            "write_retries": 0,
+            "failed_writes": 0,
+            "dropped_writes": 0,
+        }
+
+    @property
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._pending) + self._in_flight
+
+    def submit(self, writes: Iterable[Tuple[str, Dict[str, Any]]]):
+        with self._cond:
+            self._ensure_worker()
+            for kind, item in writes:
+                if kind in self.droppable_kinds and len(self._pending) >= self.max_pending:
+                    self.stats["dropped_writes"] += 1
+                    continue
+                self._pending.append((kind, item))
+                self._document_pending[item["document_id"]] = self._document_pending.get(item["document_id"], 0) + 1
+                self.stats["queued_writes"] += 1
+            self._cond.notify_all()
+
+    def _ensure_worker(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, daemon=True, name="remote-history-writer")
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                if len(self._pending) < self.batch_size and self.linger_seconds:
+                    # 让一个小节内连续产生的写入合并进同一批
+                    self._cond.wait(self.linger_seconds)
+                batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+                self._in_flight = len(batch)
+            groups: Dict[str, List[Dict[str, Any]]] = {}
+            for kind, item in batch:
+                groups.setdefault(kind, []).append(item)
+            for kind, items in groups.items():
+                self._deliver(kind, items)
+            with self._cond:
+                self.stats["write_batches"] += 1
+                self._in_flight = 0
+                for _, item in batch:
+                    remaining = self._document_pending.get(item["document_id"], 0) - 1
+                    if remaining > 0:
+                        self._document_pending[item["document_id"]] = remaining
+                    else:
+                        self._document_pending.pop(item["document_id"], None)
+                self._cond.notify_all()
+
+    def _deliver(self, kind: str, items: List[Dict[str, Any]]):
+        attempt = 0
+        while True:
+            try:
+                self._send(kind, items)
+                with self._cond:
+                    self.stats["delivered_writes"] += len(items)
+                return
+            except Exception as e:
+                self.last_error = f"{kind}: {e}"
+                status = getattr(getattr(e, "response", None), "status_code", None)
+                if attempt >= self.retries or (status is not None and 400 <= status < 500):
+                    with self._cond:
+                        self.stats["failed_writes"] += len(items)
+                    print(f"⚠️ history 异步写入失败，已丢弃 {len(items)} 条 {kind}: {e}")
+                    if self._on_failure is not None:
+                        self._on_failure()
+                    return
+                with self._cond:
+                    self.stats["write_retries"] += 1
+                time.sleep(self.backoff_seconds * (2 ** attempt))
+                attempt += 1
+
+    def flush(self, timeout: Optional[float] = None, document_id: Optional[str] = None) -> bool:
+        """等待全部（或 document_id 的）写入送达或被丢弃；超时返回 False。"""
+        deadline = None if timeout is None else time.time() + timeout
+
+        def busy() -> bool:
+            if document_id is not None:
+                return document_id in self._document_pending
+            return bool(self._pending or self._in_flight)
+
+        with self._cond:
+            if self._pending:
+                self._ensure_worker()
+                self._cond.notify_all()
+            while busy():
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
 
 
 class RemoteHistoryManager:
-    """通过 outliner 服务访问共享数据库。"""
+    """
+    通过 outliner 服务访问共享数据库。
+
+    - get_outline / get_subsection_tracking 走带 TTL 的读缓存，本进程写入时同步更新或失效
+    - 并发的相同读请求合并为一次 HTTP 调用
+    - pipeline() 内的写入按类型合并为批量请求
+    - 默认异步发送流程事件：add_progress_event(s) 入队后立即返回，flush() 等待送达；
+      内容类写入同步发送，失败时抛出异常
+    - outliner 没有批量接口（404）时退回逐条调用单条接口
+    """
+
+    # 单次批量请求的最大条数（outliner 端上限为 1000）
+    BATCH_SIZE = 500
+    # 可在 pipeline 中合并的写入：类型 -> (单条接口, 批量接口, 批量请求体键)
+    PIPELINED_WRITES = {
+        "entry": ("/history/add", "/history/add-batch", "entries"),
+        "progress": ("/progress/add", "/progress/add-batch", "events"),
+        "tracking_update": ("/subsection-tracking/update", "/subsection-tracking/update-batch", "updates"),
+        "passed": ("/passed-history/add", "/passed-history/add-batch", "entries"),
+    }
+    # 异步写入时由客户端记录产生时间的字段
+    WRITE_TIME_FIELDS = {"progress": "timestamp"}
+    # 经异步队列发送、失败或积压超过上限时可以丢弃的写入（流程事件只用于展示）
+    ASYNC_WRITES = {"progress"}
+    # 写入这些列时缓存中的追踪记录可以原地更新；其余情况直接失效
+    TRACKING_PATCH_COLUMNS = ("outline", "generated_content", "relevancy_index", "redundancy_index", "is_passed", "iteration_count")
 
-    def __init__(self, base_url: str, timeout: int = 60):
+    def __init__(
+        self,
+        base_url: str,
+        timeout: int = 60,
+        cache_seconds: Optional[float] = None,
+        cache_size: Optional[int] = None,
+        async_writes: Optional[bool] = None,
+        queue_size: Optional[int] = None,
+        write_retries: Optional[int] = None,
+        retry_backoff_seconds: Optional[float] = None,
+    ):
         self.base_url = (base_url or "http://localhost:8003").rstrip("/")
         self.timeout = timeout
         self.session = requests.Session()
         self.session.trust_env = False
+        self.cache_seconds = REMOTE_HISTORY_CACHE_SECONDS if cache_seconds is None else cache_seconds
+        self.cache_size = REMOTE_HISTORY_CACHE_SIZE if cache_size is None else cache_size
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._cache: "OrderedDict[Tuple[Any, ...], Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Tuple[Any, ...], _PendingRead] = {}
+        # 每次写入递增：读请求只与同一代的请求合并，写入前发出的读请求结果不进入缓存
+        self._write_generation = 0
+        self.stats = {
+            "requests": 0,
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "coalesced_reads": 0,
+            "pipelined_writes": 0,
+            "batch_fallbacks": 0,
+        }
+        # outliner 返回 404 的批量接口（旧版本），之后直接走单条接口
+        self._unsupported_batch_paths: Set[str] = set()
+        self._write_queue: Optional[_AsyncWriteQueue] = None
+        if REMOTE_HISTORY_ASYNC_WRITES if async_writes is None else async_writes:
+            self._write_queue = _AsyncWriteQueue(
+                self._send_writes,
+                max_pending=REMOTE_HISTORY_QUEUE_SIZE if queue_size is None else queue_size,
+                batch_size=self.BATCH_SIZE,
+                retries=REMOTE_HISTORY_WRITE_RETRIES if write_retries is None else write_retries,
+                backoff_seconds=REMOTE_HISTORY_RETRY_BACKOFF_SECONDS if retry_backoff_seconds is None else retry_backoff_seconds,
+                droppable_kinds=self.ASYNC_WRITES,
+            )
+            atexit.register(self.flush)
 
     def _post(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            self.stats["requests"] += 1
         response = self.session.post(f"{self.base_url}{path}", json=payload, timeout=self.timeout)
         response.raise_for_status()
         body = response.json()
@@ -19,6 +257,263 @@ class RemoteHistoryManager:
             raise Exception(body.get("error") or body.get("detail") or f"RemoteHistoryManager request failed: {path}")
         return body
 
+    def _read(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """读请求：先发送本线程 pipeline 中的写入，再与进行中的相同请求合并。"""
+        self._flush_pipeline()
+        with self._lock:
+            key = (path, json.dumps(payload, sort_keys=True), self._write_generation)
+            pending = self._inflight.get(key)
+            leader = pending is None
+            if leader:
+                pending = self._inflight[key] = _PendingRead()
+            else:
+                self.stats["coalesced_reads"] += 1
+        if not leader:
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return copy.deepcopy(pending.result)
+        try:
+            pending.result = self._post(path, payload)
+            return pending.result
+        except BaseException as e:
+            pending.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            pending.done.set()
+
+    def _cached_read(self, cache_key: Tuple[Any, ...], path: str, payload: Dict[str, Any], result_key: str) -> Any:
+        if self.cache_seconds > 0:
+            with self._lock:
+                cached = self._cache.get(cache_key)
+                if cached is not None and cached[0] > time.monotonic():
+                    self._cache.move_to_end(cache_key)
+                    self.stats["cache_hits"] += 1
+                    return copy.deepcopy(cached[1])
+                self.stats["cache_misses"] += 1
+                generation = self._write_generation
+        else:
+            generation = None
+        value = self._read(path, payload).get(result_key)
+        if generation is not None:
+            with self._lock:
+                # 读请求发出后有过写入时不缓存，避免把旧值放回缓存
+                if generation == self._write_generation:
+                    self._cache_put(cache_key, copy.deepcopy(value))
+        return value
+
+    def _cache_put(self, cache_key: Tuple[Any, ...], value: Any):
+        """写入缓存；调用方持有 self._lock。"""
+        if self.cache_seconds <= 0:
+            return
+        self._cache[cache_key] = (time.monotonic() + self.cache_seconds, value)
+        self._cache.move_to_end(cache_key)
+        while len(self._cache) > max(1, self.cache_size):
+            self._cache.popitem(last=False)
+
+    def _invalidate_tracking(self, document_id: str, section_id: str, subsection_id: str, update: Optional[Dict[str, Any]] = None):
+        """
+        写入 subsection 追踪后更新缓存：只改动了可原地更新的列时修补缓存的投影，否则失效。
+        调用方持有 self._lock。
+        """
+        changed = {
+            column: update[column]
+            for column in self.TRACKING_PATCH_COLUMNS
+            if update is not None and update.get(column) is not None
+        }
+        patchable = update is not None and update.get("metadata") is None
+        for cache_key in [key for key in self._cache if key[:4] == ("tracking", document_id, section_id, subsection_id)]:
+            fields = cache_key[4]
+            value = self._cache[cache_key][1]
+            if patchable and value is not None and fields and "updated_at" not in fields and "metadata" not in fields:
+                for column, column_value in changed.items():
+                    if column in value:
+                        value[column] = bool(column_value) if column == "is_passed" else column_value
+            else:
+                del self._cache[cache_key]
+
+    def invalidate_cache(self, document_id: Optional[str] = None):
+        """清空读缓存（可只清某个文档），用于已知有其他进程写入的场景。"""
+        with self._lock:
+            self._write_generation += 1
+            if document_id is None:
+                self._cache.clear()
+                return
+            for cache_key in [key for key in self._cache if key[1] == document_id]:
+                del self._cache[cache_key]
+
+    @contextmanager
+    def pipeline(self):
+        """
+        在当前线程内缓冲写入，退出时按类型合并为批量请求发送（异步模式下整体交给写队列；嵌套时由最外层发送）。
+
+        同一类型的写入保持原有顺序，不同类型按首次出现的顺序发送；读取、create_subsection_tracking、
+        save_outline 和 clear_* 会先发送已缓冲的写入。
+        """
+        if getattr(self._local, "pending", None) is not None:
+            yield self
+            return
+        self._local.pending = []
+        try:
+            yield self
+        finally:
+            self._flush_pipeline(close=True)
+
+    def _flush_pipeline(self, close: bool = False):
+        pending = getattr(self._local, "pending", None)
+        if pending is None:
+            return
+        self._local.pending = None if close else []
+        if not pending:
+            return
+        with self._lock:
+            self.stats["pipelined_writes"] += len(pending)
+        if self._write_queue is not None:
+            self._enqueue([(kind, item) for kind, item in pending if kind in self.ASYNC_WRITES])
+            pending = [(kind, item) for kind, item in pending if kind not in self.ASYNC_WRITES]
+        groups: Dict[str, List[Dict[str, Any]]] = {}
+        for kind, item in pending:
+            groups.setdefault(kind, []).append(item)
+        try:
+            for kind, items in groups.items():
+                self._send_writes(kind, items)
+        except Exception:
+            # 缓存已按缓冲的写入修补过，发送失败时整体失效
+            self.invalidate_cache()
+            raise
+
+    def _write(self, kind: str, item: Dict[str, Any]) -> Dict[str, Any]:
+        pending = getattr(self._local, "pending", None)
+        if pending is not None:
+            pending.append((kind, item))
+            return {}
+        if self._write_queue is not None and kind in self.ASYNC_WRITES:
+            self._enqueue([(kind, item)])
+            return {}
+        return self._post(self.PIPELINED_WRITES[kind][0], item)
+
+    def _enqueue(self, writes: List[Tuple[str, Dict[str, Any]]]):
+        if not writes:
+            return
+        timestamp = datetime.now().isoformat()
+        for kind, item in writes:
+            time_field = self.WRITE_TIME_FIELDS.get(kind)
+            if time_field and not item.get(time_field):
+                item[time_field] = timestamp
+        self._write_queue.submit(writes)
+
+    def _send_writes(self, kind: str, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """调用批量接口；outliner 尚无该批量接口（404）时逐条调用单条接口，不丢弃写入。"""
+        single_path, batch_path, key = self.PIPELINED_WRITES[kind]
+        if batch_path not in self._unsupported_batch_paths:
+            try:
+                return self._post_batch(batch_path, key, items)
+            except requests.HTTPError as e:
+                if getattr(e.response, "status_code", None) != 404:
+                    raise
+                print(f"⚠️ outliner 不支持 {batch_path}，改用 {single_path} 逐条写入")
+                with self._lock:
+                    self._unsupported_batch_paths.add(batch_path)
+        with self._lock:
+            self.stats["batch_fallbacks"] += 1
+        return [self._post(single_path, item) for item in items]
+
+    def flush(self, timeout: Optional[float] = None, document_id: Optional[str] = None) -> bool:
+        """
+        发送本线程 pipeline 中的写入，并等待异步队列中（可只等 document_id 的）流程事件送达。
+        超时返回 False；同步模式下总是返回 True。内容类写入失败会在发送时直接抛出。
+        """
+        self._flush_pipeline()
+        if self._write_queue is None:
+            return True
+        return self._write_queue.flush(
+            REMOTE_HISTORY_FLUSH_TIMEOUT_SECONDS if timeout is None else timeout,
+            document_id=document_id,
+        )
+
+    def write_stats(self) -> Dict[str, Any]:
+        """请求 / 缓存计数，以及异步写队列的积压、送达、重试、失败和溢出丢弃计数。"""
+        with self._lock:
+            stats: Dict[str, Any] = dict(self.stats)
+        stats["async_writes"] = self._write_queue is not None
+        if self._write_queue is not None:
+            stats.update(self._write_queue.stats)
+            stats["pending_writes"] = self._write_queue.pending
+            stats["last_write_error"] = self._write_queue.last_error
+        return stats
+
+    def _mark_written(self):
+        with self._lock:
+            self._write_generation += 1
+
+    def _post_batch(self, path: str, key: str, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """按 BATCH_SIZE 分块调用批量接口，每块在 outliner 端是一个事务。"""
+        return [
+            self._post(path, {key: items[start:start + self.BATCH_SIZE]})
+            for start in range(0, len(items), self.BATCH_SIZE)
+        ]
+
+    def _write_many(self, kind: str, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        pending = getattr(self._local, "pending", None)
+        if pending is not None:
+            pending.extend((kind, item) for item in items)
+            return []
+        if self._write_queue is not None and kind in self.ASYNC_WRITES:
+            self._enqueue([(kind, item) for item in items])
+            return []
+        return self._send_writes(kind, items)
+
+    @staticmethod
+    def _entry_payload(entry: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "document_id": entry["document_id"],
+            "section_id": entry["section_id"],
+            "subsection_id": entry["subsection_id"],
+            "content": entry["content"],
+            "metadata": entry.get("metadata") or {},
+            "timestamp": entry.get("timestamp"),
+        }
+
+    @staticmethod
+    def _tracking_update_payload(update: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "document_id": update["document_id"],
+            "section_id": update["section_id"],
+            "subsection_id": update["subsection_id"],
+            "generated_content": update.get("generated_content"),
+            "relevancy_index": update.get("relevancy_index"),
+            "redundancy_index": update.get("redundancy_index"),
+            "is_passed": update.get("is_passed"),
+            "iteration_count": update.get("iteration_count"),
+            "outline": update.get("outline"),
+            "metadata": update.get("metadata"),
+        }
+
+    @staticmethod
+    def _passed_payload(entry: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "document_id": entry["document_id"],
+            "section_id": entry["section_id"],
+            "subsection_id": entry["subsection_id"],
+            "content": entry["content"],
+            "order_index": entry["order_index"],
+            "created_at": entry.get("created_at"),
+        }
+
+    @staticmethod
+    def _progress_payload(event: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "document_id": event["document_id"],
+            "stage": event["stage"],
+            "message": event["message"],
+            "section_id": event.get("section_id"),
+            "subsection_id": event.get("subsection_id"),
+            "metadata": event.get("metadata") or {},
+            "timestamp": event.get("timestamp"),
+        }
+
     def add_entry(
         self,
         document_id: str,
@@ -27,25 +522,38 @@ class RemoteHistoryManager:
         content: str,
         metadata: Optional[Dict[str, Any]] = None,
     ):
-        self._post(
-            "/history/add",
-            {
-                "document_id": document_id,
-                "section_id": section_id,
-                "subsection_id": subsection_id,
-                "content": content,
-                "metadata": metadata or {},
-            },
+        self._mark_written()
+        self._write(
+            "entry",
+            self._entry_payload(
+                {
+                    "document_id": document_id,
+                    "section_id": section_id,
+                    "subsection_id": subsection_id,
+                    "content": content,
+                    "metadata": metadata,
+                }
+            ),
         )
 
-    def get_history(self, document_id: str) -> List[Dict[str, Any]]:
-        return self._post("/history/get", {"document_id": document_id}).get("history", [])
+    def add_entries(self, entries: List[Dict[str, Any]]) -> int:
+        self._mark_written()
+        bodies = self._write_many("entry", [self._entry_payload(entry) for entry in entries])
+        return sum(int(body.get("count", 0)) for body in bodies)
+
+    def get_history(self, document_id: str, fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        payload: Dict[str, Any] = {"document_id": document_id}
+        if fields:
+            payload["fields"] = list(fields)
+        return self._read("/history/get", payload).get("history", [])
 
     def get_history_text(self, document_id: str, separator: str = "\n\n---\n\n") -> str:
-        return self._post("/history/get-text", {"document_id": document_id}).get("history_text", "")
+        return self._read("/history/get-text", {"document_id": document_id}).get("history_text", "")
 
     def clear_history(self, document_id: str):
+        self._flush_pipeline()
         self._post("/history/clear", {"document_id": document_id})
+        self._mark_written()
 
     def save_outline(
         self,
@@ -56,6 +564,7 @@ class RemoteHistoryManager:
         subsection_id: Optional[str] = None,
         metadata: Optional[Dict[str, Any]] = None,
     ):
+        self._flush_pipeline()
         self._post(
             "/outline/save",
             {
@@ -67,6 +576,25 @@ class RemoteHistoryManager:
                 "metadata": metadata or {},
             },
         )
+        with self._lock:
+            self._write_generation += 1
+            self._cache_put(self._outline_cache_key(document_id, outline_type, section_id, subsection_id), outline_content)
+
+    @staticmethod
+    def _outline_cache_key(
+        document_id: str,
+        outline_type: str,
+        section_id: Optional[str],
+        subsection_id: Optional[str],
+    ) -> Tuple[Any, ...]:
+        # 与 outliner 端的查询条件一致：document 级忽略 section/subsection，section 级忽略 subsection
+        return (
+            "outline",
+            document_id,
+            outline_type,
+            section_id if outline_type in ("section", "subsection") else None,
+            subsection_id if outline_type == "subsection" else None,
+        )
 
     def get_outline(
         self,
@@ -75,7 +603,8 @@ class RemoteHistoryManager:
         section_id: Optional[str] = None,
         subsection_id: Optional[str] = None,
     ) -> Optional[str]:
-        return self._post(
+        return self._cached_read(
+            self._outline_cache_key(document_id, outline_type, section_id, subsection_id),
             "/outline/get",
             {
                 "document_id": document_id,
@@ -83,7 +612,8 @@ class RemoteHistoryManager:
                 "section_id": section_id,
                 "subsection_id": subsection_id,
             },
-        ).get("outline")
+            "outline",
+        )
 
     def create_subsection_tracking(
         self,
@@ -92,6 +622,7 @@ class RemoteHistoryManager:
         subsection_id: str,
         outline: str,
     ):
+        self._flush_pipeline()
         self._post(
             "/subsection-tracking/create",
             {
@@ -101,6 +632,9 @@ class RemoteHistoryManager:
                 "outline": outline,
             },
         )
+        with self._lock:
+            self._write_generation += 1
+            self._invalidate_tracking(document_id, section_id, subsection_id)
 
     def update_subsection_content(
         self,
@@ -115,8 +649,7 @@ class RemoteHistoryManager:
         outline: Optional[str] = None,
         metadata: Optional[Dict[str, Any]] = None,
     ):
-        self._post(
-            "/subsection-tracking/update",
+        payload = self._tracking_update_payload(
             {
                 "document_id": document_id,
                 "section_id": section_id,
@@ -128,23 +661,43 @@ class RemoteHistoryManager:
                 "iteration_count": iteration_count,
                 "outline": outline,
                 "metadata": metadata,
-            },
+            }
         )
+        self._write("tracking_update", payload)
+        self._patch_tracking_cache([payload])
+
+    def update_subsection_contents(self, updates: List[Dict[str, Any]]) -> int:
+        payloads = [self._tracking_update_payload(update) for update in updates]
+        bodies = self._write_many("tracking_update", payloads)
+        self._patch_tracking_cache(payloads)
+        return sum(int(body.get("count", 0)) for body in bodies)
+
+    def _patch_tracking_cache(self, payloads: List[Dict[str, Any]]):
+        with self._lock:
+            self._write_generation += 1
+            for payload in payloads:
+                self._invalidate_tracking(payload["document_id"], payload["section_id"], payload["subsection_id"], payload)
 
     def get_subsection_tracking(
         self,
         document_id: str,
         section_id: str,
         subsection_id: str,
+        fields: Optional[List[str]] = None,
     ) -> Optional[Dict[str, Any]]:
-        return self._post(
+        payload: Dict[str, Any] = {
+            "document_id": document_id,
+            "section_id": section_id,
+            "subsection_id": subsection_id,
+        }
+        if fields:
+            payload["fields"] = list(fields)
+        return self._cached_read(
+            ("tracking", document_id, section_id, subsection_id, tuple(fields) if fields else None),
             "/subsection-tracking/get",
-            {
-                "document_id": document_id,
-                "section_id": section_id,
-                "subsection_id": subsection_id,
-            },
-        ).get("tracking")
+            payload,
+            "tracking",
+        )
 
     def add_passed_history(
         self,
@@ -154,8 +707,9 @@ class RemoteHistoryManager:
         content: str,
         order_index: int,
     ):
-        self._post(
-            "/passed-history/add",
+        self._mark_written()
+        self._write(
+            "passed",
             {
                 "document_id": document_id,
                 "section_id": section_id,
@@ -165,14 +719,21 @@ class RemoteHistoryManager:
             },
         )
 
+    def add_passed_histories(self, entries: List[Dict[str, Any]]) -> int:
+        self._mark_written()
+        bodies = self._write_many("passed", [self._passed_payload(entry) for entry in entries])
+        return sum(int(body.get("count", 0)) for body in bodies)
+
     def get_passed_history(self, document_id: str) -> List[Dict[str, Any]]:
-        return self._post("/passed-history/get", {"document_id": document_id}).get("history", [])
+        return self._read("/passed-history/get", {"document_id": document_id}).get("history", [])
 
     def get_passed_history_text(self, document_id: str, separator: str = "\n\n") -> str:
-        return self._post("/passed-history/get-text", {"document_id": document_id}).get("history_text", "")
+        return self._read("/passed-history/get-text", {"document_id": document_id}).get("history_text", "")
 
     def clear_passed_history(self, document_id: str):
+        self._flush_pipeline()
         self._post("/passed-history/clear", {"document_id": document_id})
+        self._mark_written()
 
     def add_progress_event(
         self,
@@ -183,20 +744,40 @@ class RemoteHistoryManager:
         subsection_id: Optional[str] = None,
         metadata: Optional[Dict[str, Any]] = None,
     ):
-        self._post(
-            "/progress/add",
-            {
-                "document_id": document_id,
-                "stage": stage,
-                "message": message,
-                "section_id": section_id,
-                "subsection_id": subsection_id,
-                "metadata": metadata or {},
-            },
+        self._mark_written()
+        self._write(
+            "progress",
+            self._progress_payload(
+                {
+                    "document_id": document_id,
+                    "stage": stage,
+                    "message": message,
+                    "section_id": section_id,
+                    "subsection_id": subsection_id,
+                    "metadata": metadata,
+                }
+            ),
         )
 
-    def get_progress_events(self, document_id: str, after_id: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
-        return self._post(
-            "/history/progress",
-            {"document_id": document_id, "after_id": after_id, "limit": limit},
-        ).get("events", [])
+    def add_progress_events(self, events: List[Dict[str, Any]]) -> List[int]:
+        self._mark_written()
+        bodies = self._write_many("progress", [self._progress_payload(event) for event in events])
+        return [event_id for body in bodies for event_id in body.get("event_ids", [])]
+
+    def get_progress_events(
+        self,
+        document_id: str,
+        after_id: int = 0,
+        limit: int = 100,
+        stages: Optional[List[str]] = None,
+        fields: Optional[List[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        payload: Dict[str, Any] = {"document_id": document_id, "after_id": after_id, "limit": limit}
+        if stages:
+            payload["stages"] = list(stages)
+        if fields:
+            payload["fields"] = list(fields)
+        # 只等待本文档排队中的流程事件；超时抛出而不是返回缺少最新事件的结果
+        if not self.flush(document_id=document_id):
+            raise TimeoutError(f"history 流程事件未在 {REMOTE_HISTORY_FLUSH_TIMEOUT_SECONDS}s 内送达: {document_id}")
+        return self._read("/history/progress", payload).get("events", [])
@@ -0,0 +1,280 @@
+import sys
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import rag_search
+from rag_search import DuckDuckGoStreamParser, HostThrottle, RAGSearchEngine
+
+
+class _Response:
+    def __init__(self, status_code: int, headers=None, text: str = ""):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = text
+        self.content = text.encode("utf-8")
+
+    def json(self):
+        return {}
+
+
+def _ddg_page(count: int) -> str:
+    blocks = []
+    for i in range(count):
+        blocks.append(
+            f'<div class="result"><a rel="nofollow" class="result__a" '
+            f'href="//duckduckgo.com/l/?uddg=https%3A%2F%2Fexample{i}.org%2Fpaper">Paper <b>{i}</b></a>'
+            f'<a class="result__snippet" href="#">Snippet &amp; text {i}</a></div>'
+        )
+    return "<html><body>" + "".join(blocks) + "<footer>" + ("x" * 4000) + "</footer></body></html>"
+
+
+class _StreamResponse:
+    encoding = "utf-8"
+    status_code = 200
+
+    def __init__(self, body: str):
+        self.body = body.encode("utf-8")
+
+    def close(self):
+        pass
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.body), chunk_size):
+            yield self.body[i:i + chunk_size]
+
+
+class DuckDuckGoStreamParserTests(unittest.TestCase):
+    def test_stream_matches_full_parse_and_stops_early(self):
+        engine = RAGSearchEngine(max_results=3)
+        engine.stream_chunk_bytes = 64
+        page = _ddg_page(10)
+        parser = engine._stream_duckduckgo_response(_StreamResponse(page), 3)
+        self.assertEqual(parser.results, engine._parse_results(page, 3))
+        self.assertEqual(parser.results[0]["href"], "https://example0.org/paper")
+        self.assertEqual(parser.results[0]["body"], "Snippet & text 0")
+        self.assertLess(parser.bytes_read, len(page.encode("utf-8")) // 2)
+
+    def test_deadline_mid_stream_is_reported_as_timeout(self):
+        engine = RAGSearchEngine(max_results=3)
+        engine.stream_chunk_bytes = 64
+        page = _ddg_page(10)
+        clock = iter([0.0] + [100.0] * 50)  # the deadline passes after the first chunk
+        engine._active_deadline = 50.0
+        with patch.object(rag_search.time, "time", side_effect=lambda: next(clock)):
+            parser = engine._stream_duckduckgo_response(_StreamResponse(page), 3)
+        self.assertTrue(parser.truncated)
+        self.assertFalse(parser.done)
+        self.assertEqual(parser.results, [])
+
+        with patch.object(engine, "_throttled_get", return_value=_StreamResponse(page)), \
+                patch.object(engine, "_stream_duckduckgo_response", return_value=parser):
+            engine._active_deadline = time.time() + 30
+            self.assertEqual(engine._fetch_duckduckgo_results("moss", 3), ([], "rag_search_timeout"))
+        engine._active_deadline = None
+
+    def test_accept_filter_and_generic_fallback(self):
+        engine = RAGSearchEngine(max_results=2)
+        parser = DuckDuckGoStreamParser(
+            engine, 2, accept=lambda item: item["source"] in {"example3.org", "example5.org"}
+        )
+        parser.feed(_ddg_page(8))
+        self.assertEqual([item["source"] for item in parser.close()], ["example3.org", "example5.org"])
+
+        plain = DuckDuckGoStreamParser(engine, 2)
+        plain.feed('<p><a href="https://plain.example.org/a">Plain result</a></p>')
+        self.assertEqual(plain.close()[0]["href"], "https://plain.example.org/a")
+
+
+class HostThrottleTests(unittest.TestCase):
+    def tearDown(self):
+        rag_search._HOST_THROTTLE = None
+
+    def test_retry_after_slows_host_and_failures_open_circuit(self):
+        throttle = HostThrottle()
+        host = "api.crossref.org"
+        self.assertTrue(throttle.acquire(host))
+        throttle.record(host, 429, "2")
+        self.assertLessEqual(throttle.snapshot()[host]["qps"], 0.5)
+        # The Retry-After window cannot be met inside a 0.5s search deadline.
+        self.assertFalse(throttle.acquire(host, deadline=time.time() + 0.5))
+
+        for _ in range(throttle.failure_threshold):
+            throttle.record(host, None)
+        self.assertTrue(throttle.is_open(host))
+        self.assertFalse(throttle.acquire(host))
+        self.assertEqual(throttle.snapshot()[host]["circuit"], "open")
+
+    def test_half_open_probe_closes_circuit_on_success(self):
+        throttle = HostThrottle()
+        host = "export.arxiv.org"
+        for _ in range(throttle.failure_threshold):
+            throttle.record(host, 503)
+        throttle._hosts[host]["open_until"] = time.time() - 1
+        throttle._hosts[host]["next_slot"] = 0.0
+        self.assertTrue(throttle.acquire(host))
+        self.assertFalse(throttle.acquire(host))  # only one probe at a time
+        throttle.record(host, 200)
+        self.assertEqual(throttle.snapshot()[host]["circuit"], "closed")
+
+    def test_release_clears_probe_without_counting_a_failure(self):
+        throttle = HostThrottle()
+        host = "export.arxiv.org"
+        for _ in range(throttle.failure_threshold):
+            throttle.record(host, 503)
+        throttle._hosts[host]["open_until"] = time.time() - 1
+        throttle._hosts[host]["next_slot"] = 0.0
+        open_seconds = throttle._hosts[host]["open_seconds"]
+        self.assertTrue(throttle.acquire(host))
+        throttle.release(host)
+        self.assertEqual(throttle._hosts[host]["open_seconds"], open_seconds)
+        self.assertTrue(throttle.acquire(host))  # the probe slot is available again
+
+    def test_deadline_aborts_do_not_count_as_host_failures(self):
+        engine = RAGSearchEngine()
+        host = "api.crossref.org"
+        engine._active_deadline = time.time() + 5.0
+        with patch.object(engine.session, "get", side_effect=rag_search.requests.Timeout("read timed out")):
+            for _ in range(engine.host_throttle.failure_threshold + 1):
+                with self.assertRaises(rag_search.requests.Timeout):
+                    engine._throttled_get(f"https://{host}/works", timeout=30)
+        # The deadline runs out while waiting for the slot.
+        with patch.object(engine, "_request_timeout", return_value=0.0):
+            self.assertIsNone(engine._throttled_get(f"https://{host}/works", timeout=30))
+        self.assertEqual(engine.host_throttle.snapshot()[host]["failures"], 0)
+        self.assertFalse(engine.host_throttle.is_open(host))
+
+    def test_engines_share_throttle_and_skip_open_hosts(self):
+        first = RAGSearchEngine()
+        second = RAGSearchEngine()
+        self.assertIs(first.host_throttle, second.host_throttle)
+        for _ in range(first.host_throttle.failure_threshold):
+            first.host_throttle.record("api.crossref.org", 429)
+        with patch.object(second.session, "get", return_value=_Response(200)) as mocked:
+            self.assertEqual(second._search_crossref("alpine plants"), [])
+            mocked.assert_not_called()
+
+
+class RAGQueryPlannerTests(unittest.TestCase):
+    def tearDown(self):
+        rag_search._HOST_THROTTLE = None
+
+    def test_memoises_candidates_and_profiles_across_searches(self):
+        engine = RAGSearchEngine()
+        engine.include_academic_sources = False
+        planner = rag_search.RAGQueryPlanner(document_id="doc-1")
+        with patch.object(engine, "_fetch_duckduckgo_results", return_value=([], "")), \
+                patch.object(engine, "_search_wikipedia", return_value=[]), \
+                patch.object(engine, "_build_query_candidates", wraps=engine._build_query_candidates) as build:
+            engine.search("alpine plant cold adaptation strategies", planner=planner)
+            engine.search("alpine plant cold adaptation strategies.", planner=planner)
+        self.assertEqual(build.call_count, 1)
+        self.assertGreater(planner.snapshot()["memo_hits"], 0)
+        self.assertIsNone(engine._active_planner)
+
+    def test_known_empty_queries_are_skipped_and_reported(self):
+        engine = RAGSearchEngine()
+        engine.include_academic_sources = False
+        planner = rag_search.RAGQueryPlanner(document_id="doc-2")
+        query = "glacier moss freeze tolerance"
+        with patch.object(engine, "_fetch_duckduckgo_results", return_value=([], "")) as fetch, \
+                patch.object(engine, "_search_wikipedia", return_value=[]):
+            first = engine.search(query, planner=planner)
+            second = engine.search(query, planner=planner)
+            # A later subsection query whose cleaned variant is already known empty skips it.
+            engine.search("Glacier moss freeze tolerance 2024", planner=planner)
+        self.assertEqual(first["error"], "no_results_parsed")
+        self.assertEqual(second["error"], "known_empty_query")
+        issued = [call.args[0].lower() for call in fetch.call_args_list]
+        self.assertIn(query, issued)
+        self.assertEqual(len(issued), len(set(issued)))
+        snapshot = planner.snapshot()
+        self.assertGreater(snapshot["saved_calls"], 1)
+        self.assertEqual(snapshot["skipped_by_channel"]["search"], 1)
+        self.assertIn("web", snapshot["skipped_by_channel"])
+
+    def test_concurrent_searches_keep_their_own_planner(self):
+        engine = RAGSearchEngine()
+        engine.include_academic_sources = False
+        second_inside = threading.Event()
+        first_done = threading.Event()
+
+        def fetch(*args, **kwargs):
+            # The first search runs to completion while the second is paused mid-search.
+            if threading.current_thread().name == "search-0":
+                second_inside.wait(5)
+            else:
+                second_inside.set()
+                first_done.wait(5)
+            return [], ""
+
+        queries = ["moss freeze tolerance", "lichen desiccation limits"]
+        planners = [rag_search.RAGQueryPlanner(document_id=f"doc-{i}") for i in range(2)]
+
+        def run(index):
+            engine.search(queries[index], planner=planners[index])
+            if index == 0:
+                first_done.set()
+
+        with patch.object(engine, "_fetch_duckduckgo_results", side_effect=fetch), \
+                patch.object(engine, "_search_wikipedia", return_value=[]):
+            threads = [threading.Thread(target=run, args=(i,), name=f"search-{i}") for i in range(2)]
+            threads[0].start()
+            time.sleep(0.05)
+            threads[1].start()
+            for thread in threads:
+                thread.join()
+
+        for index, planner in enumerate(planners):
+            self.assertTrue(planner.should_skip("search", queries[index]))
+            self.assertFalse(planner.should_skip("search", queries[1 - index]))
+
+    def test_deadline_truncated_reads_are_not_remembered(self):
+        engine = RAGSearchEngine()
+        engine.include_academic_sources = False
+        engine.stream_chunk_bytes = 64
+        planner = rag_search.RAGQueryPlanner(document_id="doc-3")
+
+        class _ExpiringResponse(_StreamResponse):
+            def iter_content(self, chunk_size=1):
+                for index, chunk in enumerate(super().iter_content(chunk_size)):
+                    if index == 8:
+                        engine._active_deadline = time.time() - 1  # the deadline passes mid-stream
+                    yield chunk
+
+        query = "permafrost lichen respiration"
+        engine._active_degraded = True  # state of an enclosing search is restored afterwards
+        with patch.object(engine, "_throttled_get", side_effect=lambda *a, **k: _ExpiringResponse(_ddg_page(10))), \
+                patch.object(engine, "_rank_results", return_value=[]), \
+                patch.object(engine, "_search_wikipedia", return_value=[]):
+            result = engine.search(query, planner=planner)
+            self.assertEqual(result["error"], "rag_search_timeout")
+            engine._active_planner = planner
+            engine._active_deadline = time.time() + 30
+            self.assertEqual(engine._search_site_targeted(query, "example3.org"), [])
+            engine._active_planner = None
+            engine._active_deadline = None
+        self.assertFalse(planner.should_skip("web", query))
+        self.assertFalse(planner.should_skip("site", f"{query} site:example3.org"))
+        self.assertFalse(planner.should_skip("search", query))
+        self.assertEqual(planner.snapshot()["saved_calls"], 0)
+        self.assertTrue(engine._active_degraded)
+
+    def test_transient_failures_are_not_remembered(self):
+        engine = RAGSearchEngine()
+        engine.include_academic_sources = False
+        planner = rag_search.RAGQueryPlanner()
+        with patch.object(engine, "_fetch_duckduckgo_results", return_value=([], "duckduckgo_html_fetch_failed: http_503")), \
+                patch.object(engine, "_search_wikipedia", return_value=[]):
+            engine.search("quantum annealing review", planner=planner)
+            result = engine.search("quantum annealing review", planner=planner)
+        self.assertNotEqual(result["error"], "known_empty_query")
+        self.assertEqual(planner.snapshot()["saved_calls"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
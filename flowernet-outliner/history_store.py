@@ -3,159 +3,573 @@ Shared History store for FlowerNet services.
 Provides HistoryManager for memory/SQLite storage.
 """
 
+import atexit
+import copy
+import gzip
+import hashlib
 import json
 import os
+import re
 import sqlite3
-from datetime import datetime
-from typing import List, Dict, Any, Optional
+import threading
+import time
+from bisect import bisect_right
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+
+SQLITE_BUSY_TIMEOUT_SECONDS = float(os.getenv("FLOWERNET_HISTORY_SQLITE_BUSY_TIMEOUT", "10"))
+SQLITE_SYNCHRONOUS = os.getenv("FLOWERNET_HISTORY_SQLITE_SYNCHRONOUS", "NORMAL").strip().upper()
+SQLITE_CACHE_KB = int(os.getenv("FLOWERNET_HISTORY_SQLITE_CACHE_KB", "16384"))
+SQLITE_CACHED_STATEMENTS = int(os.getenv("FLOWERNET_HISTORY_SQLITE_CACHED_STATEMENTS", "256"))
+
+if SQLITE_SYNCHRONOUS not in {"OFF", "NORMAL", "FULL", "EXTRA"}:
+    SQLITE_SYNCHRONOUS = "NORMAL"
+
+# 内存模式快照：路径为空则不落盘；间隔为 0 时只在进程退出时保存
+MEMORY_SNAPSHOT_PATH = os.getenv("FLOWERNET_HISTORY_SNAPSHOT_PATH", "").strip()
+MEMORY_SNAPSHOT_SECONDS = float(os.getenv("FLOWERNET_HISTORY_SNAPSHOT_SECONDS", "30"))
+MEMORY_SNAPSHOT_VERSION = 1
+
+# 数据库模式的保留与归档（天/小时为 0 表示关闭对应策略）
+# TTL 删除与归档一样会让读接口静默返回空、且不留副本，因此各表默认都不过期，需显式开启
+RETENTION_DAYS = {
+    "progress_events": float(os.getenv("FLOWERNET_HISTORY_TTL_PROGRESS_DAYS", "0")),
+    "subsection_tracking": float(os.getenv("FLOWERNET_HISTORY_TTL_TRACKING_DAYS", "0")),
+    "history": float(os.getenv("FLOWERNET_HISTORY_TTL_HISTORY_DAYS", "0")),
+    "passed_history": float(os.getenv("FLOWERNET_HISTORY_TTL_PASSED_DAYS", "0")),
+    "outlines": float(os.getenv("FLOWERNET_HISTORY_TTL_OUTLINES_DAYS", "0")),
+}
+# 各表判断过期 / 压缩所用的时间列
+TABLE_TIME_COLUMNS = {
+    "progress_events": "timestamp",
+    "subsection_tracking": "updated_at",
+    "history": "timestamp",
+    "passed_history": "created_at",
+    "outlines": "created_at",
+}
+ARCHIVE_DIR = os.getenv("FLOWERNET_HISTORY_ARCHIVE_DIR", "").strip()
+# 归档会把文档移出在线表（之后 get_* 只能通过 read_archive 读取），因此默认关闭
+ARCHIVE_AFTER_HOURS = float(os.getenv("FLOWERNET_HISTORY_ARCHIVE_AFTER_HOURS", "0"))
+METADATA_COMPACT_AFTER_HOURS = float(os.getenv("FLOWERNET_HISTORY_METADATA_COMPACT_AFTER_HOURS", "0"))
+METADATA_MAX_BYTES = int(os.getenv("FLOWERNET_HISTORY_METADATA_MAX_BYTES", "4096"))
+# 压缩时不移除的 metadata 字段：web 从 history 的 source_results 生成参考文献，其余为各服务读取的评分/状态
+METADATA_KEEP_KEYS = {
+    key.strip()
+    for key in os.getenv(
+        "FLOWERNET_HISTORY_METADATA_KEEP_KEYS",
+        "source_results,forced_pass,force_reason,relevancy_index,redundancy_index,quality_score",
+    ).split(",")
+    if key.strip()
+}
+MAINTENANCE_SECONDS = float(os.getenv("FLOWERNET_HISTORY_MAINTENANCE_SECONDS", "3600"))
+VACUUM_PAGES_PER_RUN = int(os.getenv("FLOWERNET_HISTORY_VACUUM_PAGES", "4096"))
+MAINTENANCE_BATCH_ROWS = 2000
+
+# 数据库模式按文档分片：> 0 时各文档按 document_id 哈希写入 N 个分片文件，主库保存文档目录；0 = 单文件
+HISTORY_SHARDS = int(os.getenv("FLOWERNET_HISTORY_SHARDS", "0"))
 
 
 class HistoryManager:
     """
     History 管理器
-    - 支持内存模式（小规模数据）
-    - 支持 SQLite 数据库模式（大规模数据）
+    - 支持内存模式（按文档索引的字典，可选快照落盘；适合测试、基准和单进程部署）
+    - 支持 SQLite 数据库模式（大规模数据）；可按文档分片到多个 SQLite 文件，
+      不同文档的写入不再排在同一把写锁后面
+
+    两种模式的方法契约一致：返回字段、排序与增量拉取语义相同。
     """
 
-    def __init__(self, use_database: bool = False, db_path: str = "flowernet_history.db"):
+    # update_subsection_content 可更新的列（顺序固定，便于复用 prepared statement）
+    TRACKING_UPDATE_COLUMNS = (
+        "outline",
+        "generated_content",
+        "relevancy_index",
+        "redundancy_index",
+        "is_passed",
+        "iteration_count",
+        "metadata",
+    )
+    # get_subsection_tracking 返回的字段
+    TRACKING_FIELDS = (
+        "id",
+        "outline",
+        "generated_content",
+        "is_passed",
+        "relevancy_index",
+        "redundancy_index",
+        "iteration_count",
+        "created_at",
+        "updated_at",
+        "metadata",
+    )
+    # get_history / get_progress_events 返回的字段（fields 投影只能取这些列或 metadata.<key>）
+    HISTORY_FIELDS = ("document_id", "section_id", "subsection_id", "content", "timestamp", "metadata")
+    PROGRESS_FIELDS = ("id", "document_id", "section_id", "subsection_id", "stage", "message", "timestamp", "metadata")
+
+    def __init__(
+        self,
+        use_database: bool = False,
+        db_path: str = "flowernet_history.db",
+        snapshot_path: Optional[str] = None,
+        shards: Optional[int] = None,
+    ):
         self.use_database = use_database
         self.db_path = db_path
-        self.memory_history: List[Dict[str, Any]] = []
+        self.shards = max(0, HISTORY_SHARDS if shards is None else int(shards))
+        self._local = threading.local()
+        self._schema_ready = False
+        # 分片模式：已建表的数据库文件、document_id -> 所在文件（目录登记后不再变化）
+        self._ready_paths = set()
+        self._document_paths: Dict[str, str] = {}
+        self._shard_lock = threading.Lock()
+        self._progress_listeners: List[Callable[[str, int], None]] = []
+
+        # 内存模式索引（均按 document_id 分桶）
+        self._memory_lock = threading.RLock()
+        self._memory_history: Dict[str, List[Dict[str, Any]]] = {}
+        self._memory_outlines: Dict[Tuple[str, str, Optional[str], Optional[str]], Dict[str, Any]] = {}
+        self._memory_tracking: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        self._memory_passed: Dict[str, List[Dict[str, Any]]] = {}
+        self._memory_events: Dict[str, List[Dict[str, Any]]] = {}
+        # 与 _memory_events 平行的事件 ID 列表，供 bisect 定位（bisect 的 key= 参数需要 Python 3.10）
+        self._memory_event_ids: Dict[str, List[int]] = {}
+        self._next_event_id = 1
+        self._next_tracking_id = 1
+        self._memory_dirty = False
+        self._maintenance_lock = threading.Lock()
+        self._maintenance_thread: Optional[threading.Thread] = None
+        self.last_maintenance: Optional[Dict[str, Any]] = None
+        self.snapshot_path = (snapshot_path if snapshot_path is not None else MEMORY_SNAPSHOT_PATH) or None
 
         if self.use_database:
             self._init_database()
-            print(f"✅ History Manager: Database mode ({db_path})")
+            if self.shards:
+                print(f"✅ History Manager: Database mode ({db_path}, {self.shards} shards)")
+            else:
+                print(f"✅ History Manager: Database mode ({db_path})")
         else:
-            print("✅ History Manager: Memory mode")
+            if self.snapshot_path:
+                self._load_snapshot()
+                self._start_snapshotter()
+                print(f"✅ History Manager: Memory mode (snapshot: {self.snapshot_path})")
+            else:
+                print("✅ History Manager: Memory mode")
 
-    def _init_database(self):
-        conn = sqlite3.connect(self.db_path)
+    def _connect(self, path: Optional[str] = None) -> sqlite3.Connection:
+        """
+        返回当前线程到 path（默认主库）的持久连接（首次使用时创建并设置 WAL / pragma）。
+
+        SQL 文本固定，sqlite3 的语句缓存会复用已编译的 prepared statement。
+        """
+        path = path or self.db_path
+        conns = getattr(self._local, "conns", None)
+        if conns is None or self._local.pid != os.getpid():
+            conns = self._local.conns = {}
+            self._local.pid = os.getpid()
+        conn = conns.get(path)
+        if conn is not None:
+            return conn
+
+        conn = sqlite3.connect(
+            path,
+            timeout=SQLITE_BUSY_TIMEOUT_SECONDS,
+            cached_statements=SQLITE_CACHED_STATEMENTS,
+        )
+        # 必须在 WAL 之前设置：新库据此启用增量 VACUUM（旧库需一次完整 VACUUM 才会生效）
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.DatabaseError:
+            # 只读或不支持 WAL 的文件系统：保持默认 rollback journal
+            pass
+        conn.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA cache_size=-{max(0, SQLITE_CACHE_KB)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+
+        conns[path] = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self, path: Optional[str] = None):
+        """在 path（默认主库）的持久连接上执行一次写事务；异常时回滚，避免连接残留未提交的写锁。"""
+        conn = self._connect(path)
         cursor = conn.cursor()
+        try:
+            yield cursor
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
 
-        # 旧 history 表（保留兼容性）
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                document_id TEXT NOT NULL,
-                section_id TEXT NOT NULL,
-                subsection_id TEXT NOT NULL,
-                content TEXT NOT NULL,
-                timestamp TEXT NOT NULL,
-                metadata TEXT
-            )
-            """
+    def close(self):
+        """关闭当前线程的数据库连接（含各分片；其他线程的连接随线程结束释放）。"""
+        conns = getattr(self._local, "conns", None) or {}
+        self._local.conns = {}
+        for conn in conns.values():
+            conn.close()
+
+    def add_progress_listener(self, listener: Callable[[str, int], None]):
+        """
+        注册进程内的流程事件回调：add_progress_events 提交后按文档调用 listener(document_id, last_event_id)。
+
+        回调在写入线程中同步执行，应只做轻量的唤醒操作。
+        """
+        self._progress_listeners.append(listener)
+
+    def _notify_progress(self, events: List[Dict[str, Any]], event_ids: List[int]):
+        if not self._progress_listeners:
+            return
+        latest: Dict[str, int] = {}
+        for event, event_id in zip(events, event_ids):
+            latest[event["document_id"]] = event_id
+        for listener in list(self._progress_listeners):
+            for document_id, event_id in latest.items():
+                try:
+                    listener(document_id, event_id)
+                except Exception as e:
+                    print(f"⚠️ progress listener 调用失败: {e}")
+
+    # ============ 内存模式快照 ============
+
+    def save_snapshot(self, path: Optional[str] = None) -> bool:
+        """把内存模式数据写入 JSON 快照（先写临时文件再原子替换）。数据库模式或未配置路径时返回 False。"""
+        path = path or self.snapshot_path
+        if self.use_database or not path:
+            return False
+
+        with self._memory_lock:
+            payload = {
+                "version": MEMORY_SNAPSHOT_VERSION,
+                "saved_at": datetime.now().isoformat(),
+                "next_event_id": self._next_event_id,
+                "next_tracking_id": self._next_tracking_id,
+                "history": self._memory_history,
+                "outlines": list(self._memory_outlines.values()),
+                "tracking": list(self._memory_tracking.values()),
+                "passed_history": self._memory_passed,
+                "progress_events": self._memory_events,
+            }
+            data = json.dumps(payload, ensure_ascii=False)
+            self._memory_dirty = False
+
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            tmp_path = f"{path}.tmp-{os.getpid()}"
+            with open(tmp_path, "w", encoding="utf-8") as handle:
+                handle.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            self._memory_dirty = True
+            raise
+        return True
+
+    def _load_snapshot(self):
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as handle:
+                payload = json.load(handle)
+        except Exception as e:
+            print(f"⚠️ History 快照读取失败，使用空内存数据: {e}")
+            return
+
+        with self._memory_lock:
+            self._memory_history = {doc: list(rows) for doc, rows in payload.get("history", {}).items()}
+            self._memory_outlines = {
+                self._outline_key(
+                    record["document_id"],
+                    record.get("outline_type") or "document",
+                    record.get("section_id"),
+                    record.get("subsection_id"),
+                ): record
+                for record in payload.get("outlines", [])
+            }
+            self._memory_tracking = {
+                (record["document_id"], record["section_id"], record["subsection_id"]): record
+                for record in payload.get("tracking", [])
+            }
+            self._memory_passed = {doc: list(rows) for doc, rows in payload.get("passed_history", {}).items()}
+            self._memory_events = {doc: list(rows) for doc, rows in payload.get("progress_events", {}).items()}
+            self._memory_event_ids = {doc: [row["id"] for row in rows] for doc, rows in self._memory_events.items()}
+            max_event_id = max((rows[-1]["id"] for rows in self._memory_events.values() if rows), default=0)
+            max_tracking_id = max((record["id"] for record in self._memory_tracking.values()), default=0)
+            self._next_event_id = max(int(payload.get("next_event_id", 1)), max_event_id + 1)
+            self._next_tracking_id = max(int(payload.get("next_tracking_id", 1)), max_tracking_id + 1)
+
+    def _start_snapshotter(self):
+        atexit.register(self._save_snapshot_if_dirty)
+        if MEMORY_SNAPSHOT_SECONDS <= 0:
+            return
+
+        def run():
+            while True:
+                time.sleep(MEMORY_SNAPSHOT_SECONDS)
+                self._save_snapshot_if_dirty()
+
+        threading.Thread(target=run, daemon=True, name="history-snapshot").start()
+
+    def _save_snapshot_if_dirty(self):
+        if not self._memory_dirty:
+            return
+        try:
+            self.save_snapshot()
+        except Exception as e:
+            print(f"⚠️ History 快照保存失败: {e}")
+
+    @staticmethod
+    def _outline_key(
+        document_id: str,
+        outline_type: str,
+        section_id: Optional[str],
+        subsection_id: Optional[str],
+    ) -> Tuple[str, str, Optional[str], Optional[str]]:
+        # 与 get_outline 的 SQL 过滤条件一致：document 级忽略 section/subsection，section 级忽略 subsection
+        return (
+            document_id,
+            outline_type,
+            section_id if outline_type in ("section", "subsection") else None,
+            subsection_id if outline_type == "subsection" else None,
         )
 
-        # 新表：大纲存储（支持整篇文章和每个 section/subsection 的大纲）
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS outlines (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                document_id TEXT NOT NULL,
-                section_id TEXT,  -- NULL for document-level outline
-                subsection_id TEXT,  -- NULL for section-level outline
-                outline_content TEXT NOT NULL,
-                outline_type TEXT,  -- 'document', 'section', 'subsection'
-                created_at TEXT NOT NULL,
-                metadata TEXT
+    @staticmethod
+    def _projection(
+        fields: Optional[Sequence[str]],
+        allowed: Tuple[str, ...],
+    ) -> Tuple[List[str], Optional[List[str]]]:
+        """
+        解析读接口的字段投影，返回 (列名, metadata 子键)；子键为 None 表示完整 metadata。
+        fields 为空时取全部列；"metadata.<key>" 只取 metadata 中的指定键。
+        """
+        if not fields:
+            return list(allowed), None
+        columns: List[str] = []
+        metadata_keys: List[str] = []
+        for field in fields:
+            if field.startswith("metadata."):
+                key = field[len("metadata."):]
+                if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", key):
+                    raise ValueError(f"不支持的 metadata 字段: {field}")
+                if key not in metadata_keys:
+                    metadata_keys.append(key)
+            elif field in allowed:
+                if field not in columns:
+                    columns.append(field)
+            else:
+                raise ValueError(f"未知字段: {field}（可选: {', '.join(allowed)}，或 metadata.<key>）")
+        if "metadata" in columns or not metadata_keys:
+            return columns, None
+        columns.append("metadata")
+        return columns, metadata_keys
+
+    @staticmethod
+    def _select_sql(columns: List[str], metadata_keys: Optional[List[str]]) -> str:
+        if metadata_keys is None:
+            return ", ".join(columns)
+        # 只取 metadata 的部分键时在 SQLite 内抽取，不把整块 JSON 读出再解码
+        pairs = ", ".join(f"'{key}', json_extract(NULLIF(metadata, ''), '$.{key}')" for key in metadata_keys)
+        return ", ".join(f"json_object({pairs})" if column == "metadata" else column for column in columns)
+
+    @staticmethod
+    def _row_record(
+        columns: List[str],
+        row: Tuple[Any, ...],
+        metadata_keys: Optional[List[str]],
+    ) -> Dict[str, Any]:
+        record = dict(zip(columns, row))
+        if "metadata" in record:
+            metadata = json.loads(record["metadata"]) if record["metadata"] else {}
+            if metadata_keys is not None:
+                metadata = {key: value for key, value in metadata.items() if value is not None}
+            record["metadata"] = metadata
+        return record
+
+    @staticmethod
+    def _project_record(
+        record: Dict[str, Any],
+        columns: List[str],
+        metadata_keys: Optional[List[str]],
+    ) -> Dict[str, Any]:
+        projected = {column: record[column] for column in columns}
+        if metadata_keys is not None:
+            metadata = record.get("metadata") or {}
+            projected["metadata"] = {key: metadata[key] for key in metadata_keys if metadata.get(key) is not None}
+        # 内存模式读出的是副本，与数据库模式（每次反序列化）一致，调用方修改不会影响存储
+        return copy.deepcopy(projected)
+
+    def _init_database(self):
+        self._create_schema(self.db_path)
+        if self.shards:
+            self._init_catalogue()
+        self._schema_ready = True
+
+    def _create_schema(self, path: str):
+        """在 path 对应的数据库文件（主库或分片）中建表和索引。"""
+        with self._transaction(path) as cursor:
+            # 旧 history 表（保留兼容性）
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    document_id TEXT NOT NULL,
+                    section_id TEXT NOT NULL,
+                    subsection_id TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    metadata TEXT
+                )
+                """
             )
-            """
-        )
 
-        # 新表：Subsection 内容来源追踪（记录每个 subsection 的大纲、生成和验证）
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS subsection_tracking (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                document_id TEXT NOT NULL,
-                section_id TEXT NOT NULL,
-                subsection_id TEXT NOT NULL,
-                outline TEXT NOT NULL,  -- subsection 的大纲
-                generated_content TEXT,  -- 生成的内容
-                is_passed BOOLEAN DEFAULT 0,  -- 是否通过验证
-                relevancy_index REAL,  -- 相关性分数
-                redundancy_index REAL,  -- 冗余度分数
-                iteration_count INTEGER DEFAULT 0,  -- 迭代次数
-                created_at TEXT NOT NULL,
-                updated_at TEXT NOT NULL,
-                metadata TEXT
+            # 新表：大纲存储（支持整篇文章和每个 section/subsection 的大纲）
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS outlines (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    document_id TEXT NOT NULL,
+                    section_id TEXT,  -- NULL for document-level outline
+                    subsection_id TEXT,  -- NULL for section-level outline
+                    outline_content TEXT NOT NULL,
+                    outline_type TEXT,  -- 'document', 'section', 'subsection'
+                    created_at TEXT NOT NULL,
+                    metadata TEXT
+                )
+                """
             )
-            """
-        )
 
-        # 新表：历史链（用于记录已通过的 subsection 作为下一个的历史上下文）
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS passed_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                document_id TEXT NOT NULL,
-                section_id TEXT NOT NULL,
-                subsection_id TEXT NOT NULL,
-                content TEXT NOT NULL,
-                order_index INTEGER,  -- subsection 的顺序
-                created_at TEXT NOT NULL
+            # 新表：Subsection 内容来源追踪（记录每个 subsection 的大纲、生成和验证）
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS subsection_tracking (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    document_id TEXT NOT NULL,
+                    section_id TEXT NOT NULL,
+                    subsection_id TEXT NOT NULL,
+                    outline TEXT NOT NULL,  -- subsection 的大纲
+                    generated_content TEXT,  -- 生成的内容
+                    is_passed BOOLEAN DEFAULT 0,  -- 是否通过验证
+                    relevancy_index REAL,  -- 相关性分数
+                    redundancy_index REAL,  -- 冗余度分数
+                    iteration_count INTEGER DEFAULT 0,  -- 迭代次数
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    metadata TEXT
+                )
+                """
+            )
+
+            # 新表：历史链（用于记录已通过的 subsection 作为下一个的历史上下文）
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS passed_history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    document_id TEXT NOT NULL,
+                    section_id TEXT NOT NULL,
+                    subsection_id TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    order_index INTEGER,  -- subsection 的顺序
+                    created_at TEXT NOT NULL
+                )
+                """
             )
-            """
-        )
 
-        # 新表：流程事件（用于前端展示生成细节）
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS progress_events (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                document_id TEXT NOT NULL,
-                section_id TEXT,
-                subsection_id TEXT,
-                stage TEXT NOT NULL,
-                message TEXT NOT NULL,
-                timestamp TEXT NOT NULL,
-                metadata TEXT
+            # 新表：流程事件（用于前端展示生成细节）
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS progress_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    document_id TEXT NOT NULL,
+                    section_id TEXT,
+                    subsection_id TEXT,
+                    stage TEXT NOT NULL,
+                    message TEXT NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    metadata TEXT
+                )
+                """
             )
-            """
-        )
 
-        # 创建索引
-        cursor.execute(
-            """
-            CREATE INDEX IF NOT EXISTS idx_document_id
-            ON history(document_id)
-            """
-        )
+            # 创建索引
+            cursor.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_document_id
+                ON history(document_id)
+                """
+            )
         
-        cursor.execute(
-            """
-            CREATE INDEX IF NOT EXISTS idx_outlines_document
-            ON outlines(document_id)
-            """
-        )
+            cursor.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_outlines_document
+                ON outlines(document_id)
+                """
+            )
         
-        cursor.execute(
-            """
-            CREATE INDEX IF NOT EXISTS idx_tracking_document
-            ON subsection_tracking(document_id, section_id, subsection_id)
-            """
-        )
+            cursor.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_tracking_document
+                ON subsection_tracking(document_id, section_id, subsection_id)
+                """
+            )
         
-        cursor.execute(
-            """
-            CREATE INDEX IF NOT EXISTS idx_passed_history
-            ON passed_history(document_id)
-            """
-        )
+            cursor.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_passed_history
+                ON passed_history(document_id)
+                """
+            )
 
-        cursor.execute(
-            """
-            CREATE INDEX IF NOT EXISTS idx_progress_document
-            ON progress_events(document_id, id)
-            """
-        )
+            cursor.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_progress_document
+                ON progress_events(document_id, id)
+                """
+            )
+
+            # stages 过滤（如只取 subsection_passed）按文档 + 阶段走索引
+            cursor.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_progress_stage
+                ON progress_events(document_id, stage, id)
+                """
+            )
+
+            # 保留 / 归档扫描用的时间索引
+            cursor.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_progress_timestamp
+                ON progress_events(timestamp)
+                """
+            )
+
+            cursor.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_progress_completed
+                ON progress_events(timestamp) WHERE stage = 'document_complete'
+                """
+            )
+
+            cursor.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_history_timestamp
+                ON history(timestamp)
+                """
+            )
 
-        conn.commit()
-        conn.close()
+            cursor.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_tracking_updated
+                ON subsection_tracking(updated_at)
+                """
+            )
+        self._ready_paths.add(path)
 
     def _ensure_database_ready(self):
-        if not self.use_database:
+        """只在首次调用时检查表结构；之后由 _schema_ready 标记短路。"""
+        if not self.use_database or self._schema_ready:
             return
 
         required_tables = {
@@ -171,17 +585,136 @@ class HistoryManager:
                 self._init_database()
                 return
 
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            cursor = self._connect().cursor()
             cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
             existing_tables = {row[0] for row in cursor.fetchall()}
-            conn.close()
 
             if not required_tables.issubset(existing_tables):
                 self._init_database()
+            else:
+                self._schema_ready = True
         except Exception:
             self._init_database()
 
+    # ============ 按文档分片 ============
+
+    def _init_catalogue(self):
+        """
+        在主库中创建文档目录（document_id -> 分片号）。
+
+        首次启用分片时，主库里已有的文档登记为 shard = NULL，继续从主库读写。
+        """
+        with self._transaction() as cursor:
+            exists = cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'document_catalogue'"
+            ).fetchone()
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS document_catalogue (
+                    document_id TEXT PRIMARY KEY,
+                    shard INTEGER,  -- NULL 表示启用分片前写在主库中的文档
+                    created_at TEXT NOT NULL
+                )
+                """
+            )
+            if not exists:
+                sources = " UNION ".join(f"SELECT document_id FROM {table}" for table in TABLE_TIME_COLUMNS)
+                cursor.execute(
+                    f"INSERT OR IGNORE INTO document_catalogue (document_id, shard, created_at) SELECT document_id, NULL, ? FROM ({sources})",
+                    (datetime.now().isoformat(),),
+                )
+
+    def _shard_index(self, document_id: str) -> int:
+        digest = hashlib.blake2b(document_id.encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "big") % self.shards
+
+    def _shard_path(self, shard: Optional[int]) -> str:
+        if shard is None:
+            return self.db_path
+        root, ext = os.path.splitext(self.db_path)
+        return f"{root}.shard-{shard:03d}{ext or '.db'}"
+
+    def _ready_path(self, path: str) -> str:
+        if path not in self._ready_paths:
+            with self._shard_lock:
+                if path not in self._ready_paths:
+                    self._create_schema(path)
+        return path
+
+    def _document_path(self, document_id: str, register: bool = False) -> str:
+        """
+        返回文档所在的数据库文件：未分片时为主库；分片时以文档目录为准（目录未登记则按哈希）。
+
+        register=True（写入）时把未登记的文档写入目录，之后分片数变化也不会改变它的位置。
+        """
+        if not self.shards:
+            return self.db_path
+        path = self._document_paths.get(document_id)
+        if path is not None:
+            return path
+
+        row = self._connect().execute(
+            "SELECT shard FROM document_catalogue WHERE document_id = ?", (document_id,)
+        ).fetchone()
+        if row is None:
+            shard = self._shard_index(document_id)
+            if not register:
+                # 不缓存：其他进程登记后（可能登记到不同的分片）仍能找到
+                return self._ready_path(self._shard_path(shard))
+            with self._transaction() as cursor:
+                cursor.execute(
+                    "INSERT OR IGNORE INTO document_catalogue (document_id, shard, created_at) VALUES (?, ?, ?)",
+                    (document_id, shard, datetime.now().isoformat()),
+                )
+                row = cursor.execute(
+                    "SELECT shard FROM document_catalogue WHERE document_id = ?", (document_id,)
+                ).fetchone()
+
+        path = self._ready_path(self._shard_path(row[0]))
+        self._document_paths[document_id] = path
+        return path
+
+    def _group_by_path(
+        self, items: List[Dict[str, Any]], register: bool = False
+    ) -> Dict[str, List[Tuple[int, Dict[str, Any]]]]:
+        """按所在数据库文件分组 (输入下标, 记录)，组内保持输入顺序。"""
+        groups: Dict[str, List[Tuple[int, Dict[str, Any]]]] = {}
+        for index, item in enumerate(items):
+            groups.setdefault(self._document_path(item["document_id"], register), []).append((index, item))
+        return groups
+
+    def _database_paths(self) -> List[str]:
+        """主库和目录中出现过的分片文件（维护与统计逐个处理）。"""
+        if not self.shards:
+            return [self.db_path]
+        shards = [
+            row[0]
+            for row in self._connect().execute(
+                "SELECT DISTINCT shard FROM document_catalogue WHERE shard IS NOT NULL ORDER BY shard"
+            )
+        ]
+        return [self.db_path] + [self._ready_path(self._shard_path(shard)) for shard in shards]
+
+    def list_documents(self) -> List[str]:
+        """
+        列出文档 ID。
+
+        分片模式直接读文档目录（不扫描各分片），包含已清空或已归档但登记过的文档。
+        """
+        if not self.use_database:
+            with self._memory_lock:
+                documents = set(self._memory_history) | set(self._memory_passed) | set(self._memory_events)
+                documents.update(key[0] for key in self._memory_outlines)
+                documents.update(key[0] for key in self._memory_tracking)
+            return sorted(documents)
+
+        if self.shards:
+            rows = self._connect().execute("SELECT document_id FROM document_catalogue ORDER BY document_id")
+        else:
+            sources = " UNION ".join(f"SELECT document_id FROM {table}" for table in TABLE_TIME_COLUMNS)
+            rows = self._connect().execute(f"SELECT document_id FROM ({sources}) ORDER BY document_id")
+        return [row[0] for row in rows]
+
     def add_entry(
         self,
         document_id: str,
@@ -190,49 +723,86 @@ class HistoryManager:
         content: str,
         metadata: Optional[Dict[str, Any]] = None,
     ):
-        timestamp = datetime.now().isoformat()
+        self.add_entries(
+            [
+                {
+                    "document_id": document_id,
+                    "section_id": section_id,
+                    "subsection_id": subsection_id,
+                    "content": content,
+                    "metadata": metadata,
+                }
+            ]
+        )
 
-        entry = {
-            "document_id": document_id,
-            "section_id": section_id,
-            "subsection_id": subsection_id,
-            "content": content,
-            "timestamp": timestamp,
-            "metadata": metadata or {},
-        }
+    def add_entries(self, entries: List[Dict[str, Any]]) -> int:
+        """
+        批量添加 History（同一事务内 executemany）
 
-        if self.use_database:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+        Args:
+            entries: 每项包含 document_id/section_id/subsection_id/content/metadata
 
-            cursor.execute(
-                """
-                INSERT INTO history (document_id, section_id, subsection_id, content, timestamp, metadata)
-                VALUES (?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    document_id,
-                    section_id,
-                    subsection_id,
-                    content,
-                    timestamp,
-                    json.dumps(metadata or {}),
-                ),
-            )
+        Returns:
+            写入条数
+        """
+        timestamp = datetime.now().isoformat()
+        rows = [
+            {
+                "document_id": entry["document_id"],
+                "section_id": entry["section_id"],
+                "subsection_id": entry["subsection_id"],
+                "content": entry["content"],
+                "timestamp": entry.get("timestamp") or timestamp,
+                "metadata": entry.get("metadata") or {},
+            }
+            for entry in entries
+        ]
+        if not rows:
+            return 0
 
-            conn.commit()
-            conn.close()
+        if self.use_database:
+            for path, group in self._group_by_path(rows, register=True).items():
+                with self._transaction(path) as cursor:
+                    cursor.executemany(
+                        """
+                        INSERT INTO history (document_id, section_id, subsection_id, content, timestamp, metadata)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                        """,
+                        [
+                            (
+                                row["document_id"],
+                                row["section_id"],
+                                row["subsection_id"],
+                                row["content"],
+                                row["timestamp"],
+                                json.dumps(row["metadata"]),
+                            )
+                            for _, row in group
+                        ],
+                    )
         else:
-            self.memory_history.append(entry)
+            with self._memory_lock:
+                for row in rows:
+                    # 写入时深拷贝 metadata，与数据库模式序列化后的语义一致
+                    row["metadata"] = copy.deepcopy(row["metadata"])
+                    self._memory_history.setdefault(row["document_id"], []).append(row)
+                self._memory_dirty = True
+        return len(rows)
+
+    def get_history(self, document_id: str, fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """
+        获取文档的 history（按写入顺序）。
 
-    def get_history(self, document_id: str) -> List[Dict[str, Any]]:
+        fields 为可选投影（HISTORY_FIELDS 中的列或 metadata.<key>），例如只取 ["subsection_id"] 计数；
+        未投影 metadata 时不读取也不解码它。
+        """
+        columns, metadata_keys = self._projection(fields, self.HISTORY_FIELDS)
         if self.use_database:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            cursor = self._connect(self._document_path(document_id)).cursor()
 
             cursor.execute(
-                """
-                SELECT document_id, section_id, subsection_id, content, timestamp, metadata
+                f"""
+                SELECT {self._select_sql(columns, metadata_keys)}
                 FROM history
                 WHERE document_id = ?
                 ORDER BY id ASC
@@ -240,47 +810,34 @@ class HistoryManager:
                 (document_id,),
             )
 
-            rows = cursor.fetchall()
-            conn.close()
+            return [self._row_record(columns, row, metadata_keys) for row in cursor.fetchall()]
 
-            return [
-                {
-                    "document_id": row[0],
-                    "section_id": row[1],
-                    "subsection_id": row[2],
-                    "content": row[3],
-                    "timestamp": row[4],
-                    "metadata": json.loads(row[5]) if row[5] else {},
-                }
-                for row in rows
-            ]
-
-        return [
-            entry for entry in self.memory_history if entry["document_id"] == document_id
-        ]
+        with self._memory_lock:
+            entries = self._memory_history.get(document_id, [])
+            if not fields:
+                return copy.deepcopy(entries)
+            return [self._project_record(entry, columns, metadata_keys) for entry in entries]
 
     def get_history_text(self, document_id: str, separator: str = "\n\n---\n\n") -> str:
-        history = self.get_history(document_id)
+        history = self.get_history(document_id, fields=["content"])
         return separator.join([entry["content"] for entry in history])
 
     def clear_history(self, document_id: str):
         if self.use_database:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            cursor.execute("DELETE FROM history WHERE document_id = ?", (document_id,))
-
-            conn.commit()
-            conn.close()
+            with self._transaction(self._document_path(document_id)) as cursor:
+                cursor.execute("DELETE FROM history WHERE document_id = ?", (document_id,))
             print(f"✅ 已清空文档 {document_id} 的 history (Database)")
         else:
-            self.memory_history = [
-                entry for entry in self.memory_history if entry["document_id"] != document_id
-            ]
+            with self._memory_lock:
+                self._memory_history.pop(document_id, None)
+                self._memory_dirty = True
             print(f"✅ 已清空文档 {document_id} 的 history (Memory)")
 
     def get_statistics(self, document_id: str) -> Dict[str, Any]:
-        history = self.get_history(document_id)
+        history = self.get_history(
+            document_id,
+            fields=["section_id", "subsection_id", "content", "metadata.relevancy_index", "metadata.redundancy_index"],
+        )
 
         if not history:
             return {
@@ -343,27 +900,34 @@ class HistoryManager:
         
         if self.use_database:
             self._ensure_database_ready()
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute(
-                """
-                INSERT INTO outlines (document_id, section_id, subsection_id, outline_content, outline_type, created_at, metadata)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    document_id,
-                    section_id,
-                    subsection_id,
-                    outline_content,
-                    outline_type,
-                    timestamp,
-                    json.dumps(metadata or {}),
-                ),
-            )
-            
-            conn.commit()
-            conn.close()
+            with self._transaction(self._document_path(document_id, register=True)) as cursor:
+                cursor.execute(
+                    """
+                    INSERT INTO outlines (document_id, section_id, subsection_id, outline_content, outline_type, created_at, metadata)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (
+                        document_id,
+                        section_id,
+                        subsection_id,
+                        outline_content,
+                        outline_type,
+                        timestamp,
+                        json.dumps(metadata or {}),
+                    ),
+                )
+        else:
+            with self._memory_lock:
+                self._memory_outlines[self._outline_key(document_id, outline_type, section_id, subsection_id)] = {
+                    "document_id": document_id,
+                    "section_id": section_id,
+                    "subsection_id": subsection_id,
+                    "outline_content": outline_content,
+                    "outline_type": outline_type,
+                    "created_at": timestamp,
+                    "metadata": copy.deepcopy(metadata or {}),
+                }
+                self._memory_dirty = True
 
     def get_outline(
         self,
@@ -375,8 +939,7 @@ class HistoryManager:
         """获取特定类型的大纲"""
         if self.use_database:
             self._ensure_database_ready()
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            cursor = self._connect(self._document_path(document_id)).cursor()
             
             if outline_type == "document":
                 cursor.execute(
@@ -395,11 +958,14 @@ class HistoryManager:
                 )
             
             row = cursor.fetchone()
-            conn.close()
             
             return row[0] if row else None
         
-        return None
+        if outline_type not in ("document", "section", "subsection"):
+            return None
+        with self._memory_lock:
+            record = self._memory_outlines.get(self._outline_key(document_id, outline_type, section_id, subsection_id))
+            return record["outline_content"] if record else None
 
     # ============ 新增方法：Subsection 追踪 ============
 
@@ -414,26 +980,40 @@ class HistoryManager:
         timestamp = datetime.now().isoformat()
         
         if self.use_database:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute(
-                """
-                DELETE FROM subsection_tracking
-                WHERE document_id = ? AND section_id = ? AND subsection_id = ?
-                """,
-                (document_id, section_id, subsection_id),
-            )
-            cursor.execute(
-                """
-                INSERT INTO subsection_tracking (document_id, section_id, subsection_id, outline, created_at, updated_at)
-                VALUES (?, ?, ?, ?, ?, ?)
-                """,
-                (document_id, section_id, subsection_id, outline, timestamp, timestamp),
-            )
-            
-            conn.commit()
-            conn.close()
+            with self._transaction(self._document_path(document_id, register=True)) as cursor:
+                cursor.execute(
+                    """
+                    DELETE FROM subsection_tracking
+                    WHERE document_id = ? AND section_id = ? AND subsection_id = ?
+                    """,
+                    (document_id, section_id, subsection_id),
+                )
+                cursor.execute(
+                    """
+                    INSERT INTO subsection_tracking (document_id, section_id, subsection_id, outline, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    """,
+                    (document_id, section_id, subsection_id, outline, timestamp, timestamp),
+                )
+        else:
+            with self._memory_lock:
+                self._memory_tracking[(document_id, section_id, subsection_id)] = {
+                    "id": self._next_tracking_id,
+                    "document_id": document_id,
+                    "section_id": section_id,
+                    "subsection_id": subsection_id,
+                    "outline": outline,
+                    "generated_content": None,
+                    "is_passed": False,
+                    "relevancy_index": None,
+                    "redundancy_index": None,
+                    "iteration_count": 0,
+                    "created_at": timestamp,
+                    "updated_at": timestamp,
+                    "metadata": {},
+                }
+                self._next_tracking_id += 1
+                self._memory_dirty = True
 
     def update_subsection_content(
         self,
@@ -449,68 +1029,110 @@ class HistoryManager:
         metadata: Optional[Dict[str, Any]] = None,
     ):
         """更新 subsection 的大纲、生成内容和验证结果"""
+        self.update_subsection_contents(
+            [
+                {
+                    "document_id": document_id,
+                    "section_id": section_id,
+                    "subsection_id": subsection_id,
+                    "generated_content": generated_content,
+                    "relevancy_index": relevancy_index,
+                    "redundancy_index": redundancy_index,
+                    "is_passed": is_passed,
+                    "iteration_count": iteration_count,
+                    "outline": outline,
+                    "metadata": metadata,
+                }
+            ]
+        )
+
+    def update_subsection_contents(self, updates: List[Dict[str, Any]]) -> int:
+        """
+        批量更新 subsection 追踪（同一事务；相邻且更新字段相同的记录合并为一次 executemany）
+
+        Args:
+            updates: 每项包含 document_id/section_id/subsection_id 以及 update_subsection_content 的可选字段，
+                     值为 None 的字段不更新
+
+        Returns:
+            处理的更新条数
+        """
+        if not updates:
+            return 0
+
         timestamp = datetime.now().isoformat()
-        
-        if self.use_database:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            fields = []
-            values = []
-
-            if outline is not None:
-                fields.append("outline = ?")
-                values.append(outline)
-            if generated_content is not None:
-                fields.append("generated_content = ?")
-                values.append(generated_content)
-            if relevancy_index is not None:
-                fields.append("relevancy_index = ?")
-                values.append(relevancy_index)
-            if redundancy_index is not None:
-                fields.append("redundancy_index = ?")
-                values.append(redundancy_index)
-            if is_passed is not None:
-                fields.append("is_passed = ?")
-                values.append(1 if is_passed else 0)
-            if iteration_count is not None:
-                fields.append("iteration_count = ?")
-                values.append(iteration_count)
-            if metadata is not None:
-                fields.append("metadata = ?")
-                values.append(json.dumps(metadata))
-
-            fields.append("updated_at = ?")
-            values.append(timestamp)
-            values.extend([document_id, section_id, subsection_id])
+        if not self.use_database:
+            with self._memory_lock:
+                for update in updates:
+                    record = self._memory_tracking.get(
+                        (update["document_id"], update["section_id"], update["subsection_id"])
+                    )
+                    if record is None:
+                        continue
+                    for column in self.TRACKING_UPDATE_COLUMNS:
+                        value = update.get(column)
+                        if value is None:
+                            continue
+                        if column == "is_passed":
+                            value = bool(value)
+                        elif column == "metadata":
+                            value = copy.deepcopy(value)
+                        record[column] = value
+                    record["updated_at"] = timestamp
+                self._memory_dirty = True
+            return len(updates)
 
-            cursor.execute(
-                f"""
-                UPDATE subsection_tracking
-                SET {', '.join(fields)}
-                WHERE document_id = ? AND section_id = ? AND subsection_id = ?
-                """,
-                values,
-            )
-            
-            conn.commit()
-            conn.close()
+        for path, group in self._group_by_path(updates).items():
+            self._apply_tracking_updates(path, [update for _, update in group], timestamp)
+        return len(updates)
+
+    def _apply_tracking_updates(self, path: str, updates: List[Dict[str, Any]], timestamp: str):
+        batches: List[Tuple[Tuple[str, ...], List[List[Any]]]] = []
+        for update in updates:
+            columns = tuple(column for column in self.TRACKING_UPDATE_COLUMNS if update.get(column) is not None)
+            values: List[Any] = []
+            for column in columns:
+                value = update[column]
+                if column == "is_passed":
+                    value = 1 if value else 0
+                elif column == "metadata":
+                    value = json.dumps(value)
+                values.append(value)
+            values.extend([timestamp, update["document_id"], update["section_id"], update["subsection_id"]])
+
+            # 只合并相邻的同构更新，保证同一 subsection 的多次更新按原顺序生效
+            if batches and batches[-1][0] == columns:
+                batches[-1][1].append(values)
+            else:
+                batches.append((columns, [values]))
+
+        with self._transaction(path) as cursor:
+            for columns, rows in batches:
+                assignments = ", ".join([f"{column} = ?" for column in columns] + ["updated_at = ?"])
+                cursor.executemany(
+                    f"""
+                    UPDATE subsection_tracking
+                    SET {assignments}
+                    WHERE document_id = ? AND section_id = ? AND subsection_id = ?
+                    """,
+                    rows,
+                )
 
     def get_subsection_tracking(
         self,
         document_id: str,
         section_id: str,
         subsection_id: str,
+        fields: Optional[Sequence[str]] = None,
     ) -> Optional[Dict[str, Any]]:
-        """获取 subsection 追踪信息"""
+        """获取 subsection 追踪信息；fields 为可选投影（TRACKING_FIELDS 中的列或 metadata.<key>）"""
+        columns, metadata_keys = self._projection(fields, self.TRACKING_FIELDS)
         if self.use_database:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            cursor = self._connect(self._document_path(document_id)).cursor()
             
             cursor.execute(
-                """
-                SELECT id, outline, generated_content, is_passed, relevancy_index, 
-                       redundancy_index, iteration_count, created_at, updated_at, metadata
+                f"""
+                SELECT {self._select_sql(columns, metadata_keys)}
                 FROM subsection_tracking
                 WHERE document_id = ? AND section_id = ? AND subsection_id = ?
                 """,
@@ -518,23 +1140,19 @@ class HistoryManager:
             )
             
             row = cursor.fetchone()
-            conn.close()
             
             if row:
-                return {
-                    "id": row[0],
-                    "outline": row[1],
-                    "generated_content": row[2],
-                    "is_passed": bool(row[3]),
-                    "relevancy_index": row[4],
-                    "redundancy_index": row[5],
-                    "iteration_count": row[6],
-                    "created_at": row[7],
-                    "updated_at": row[8],
-                    "metadata": json.loads(row[9]) if row[9] else {},
-                }
-        
-        return None
+                tracking = self._row_record(columns, row, metadata_keys)
+                if "is_passed" in tracking:
+                    tracking["is_passed"] = bool(tracking["is_passed"])
+                return tracking
+            return None
+
+        with self._memory_lock:
+            record = self._memory_tracking.get((document_id, section_id, subsection_id))
+            if record is None:
+                return None
+            return self._project_record(record, columns, metadata_keys)
 
     # ============ 新增方法：历史链管理 ============
 
@@ -547,28 +1165,69 @@ class HistoryManager:
         order_index: int,
     ):
         """添加已通过的 subsection 到历史链中"""
+        self.add_passed_histories(
+            [
+                {
+                    "document_id": document_id,
+                    "section_id": section_id,
+                    "subsection_id": subsection_id,
+                    "content": content,
+                    "order_index": order_index,
+                }
+            ]
+        )
+
+    def add_passed_histories(self, entries: List[Dict[str, Any]]) -> int:
+        """批量添加已通过的 subsection 到历史链中（同一事务内 executemany）"""
+        if not entries:
+            return 0
+
         timestamp = datetime.now().isoformat()
-        
-        if self.use_database:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute(
-                """
-                INSERT INTO passed_history (document_id, section_id, subsection_id, content, order_index, created_at)
-                VALUES (?, ?, ?, ?, ?, ?)
-                """,
-                (document_id, section_id, subsection_id, content, order_index, timestamp),
-            )
-            
-            conn.commit()
-            conn.close()
+        if not self.use_database:
+            with self._memory_lock:
+                for entry in entries:
+                    # 按 order_index 有序插入；相同 order_index 保持写入顺序（list.insert 本身是 O(n)，现算键列表不改变复杂度）
+                    rows = self._memory_passed.setdefault(entry["document_id"], [])
+                    position = bisect_right([row["order_index"] for row in rows], entry["order_index"])
+                    rows.insert(
+                        position,
+                        {
+                            "document_id": entry["document_id"],
+                            "section_id": entry["section_id"],
+                            "subsection_id": entry["subsection_id"],
+                            "content": entry["content"],
+                            "order_index": entry["order_index"],
+                            "created_at": entry.get("created_at") or timestamp,
+                        },
+                    )
+                self._memory_dirty = True
+            return len(entries)
+
+        for path, group in self._group_by_path(entries, register=True).items():
+            with self._transaction(path) as cursor:
+                cursor.executemany(
+                    """
+                    INSERT INTO passed_history (document_id, section_id, subsection_id, content, order_index, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    """,
+                    [
+                        (
+                            entry["document_id"],
+                            entry["section_id"],
+                            entry["subsection_id"],
+                            entry["content"],
+                            entry["order_index"],
+                            entry.get("created_at") or timestamp,
+                        )
+                        for _, entry in group
+                    ],
+                )
+        return len(entries)
 
     def get_passed_history(self, document_id: str) -> List[Dict[str, Any]]:
         """获取某个文档的所有已通过的 subsection（有序）"""
         if self.use_database:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            cursor = self._connect(self._document_path(document_id)).cursor()
             
             cursor.execute(
                 """
@@ -581,7 +1240,6 @@ class HistoryManager:
             )
             
             rows = cursor.fetchall()
-            conn.close()
             
             return [
                 {
@@ -595,7 +1253,8 @@ class HistoryManager:
                 for row in rows
             ]
         
-        return []
+        with self._memory_lock:
+            return [dict(entry) for entry in self._memory_passed.get(document_id, [])]
 
     def get_passed_history_text(self, document_id: str, separator: str = "\n\n") -> str:
         """获取已通过的所有 subsection 作为文本"""
@@ -605,14 +1264,14 @@ class HistoryManager:
     def clear_passed_history(self, document_id: str):
         """清空某个文档的历史链"""
         if self.use_database:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("DELETE FROM passed_history WHERE document_id = ?", (document_id,))
-            
-            conn.commit()
-            conn.close()
+            with self._transaction(self._document_path(document_id)) as cursor:
+                cursor.execute("DELETE FROM passed_history WHERE document_id = ?", (document_id,))
             print(f"✅ 已清空文档 {document_id} 的已通过历史链 (Database)")
+        else:
+            with self._memory_lock:
+                self._memory_passed.pop(document_id, None)
+                self._memory_dirty = True
+            print(f"✅ 已清空文档 {document_id} 的已通过历史链 (Memory)")
 
     # ============ 新增方法：流程事件管理 ============
 
@@ -626,77 +1285,475 @@ class HistoryManager:
         metadata: Optional[Dict[str, Any]] = None,
     ) -> Optional[int]:
         """记录一条流程事件，用于前端展示详细生成过程。"""
-        timestamp = datetime.now().isoformat()
+        event_ids = self.add_progress_events(
+            [
+                {
+                    "document_id": document_id,
+                    "stage": stage,
+                    "message": message,
+                    "section_id": section_id,
+                    "subsection_id": subsection_id,
+                    "metadata": metadata,
+                }
+            ]
+        )
+        return event_ids[0] if event_ids else None
 
-        if self.use_database:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-                INSERT INTO progress_events (document_id, section_id, subsection_id, stage, message, timestamp, metadata)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    document_id,
-                    section_id,
-                    subsection_id,
-                    stage,
-                    message,
-                    timestamp,
-                    json.dumps(metadata or {}),
-                ),
-            )
-            event_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
-            return event_id
+    def add_progress_events(self, events: List[Dict[str, Any]]) -> List[int]:
+        """
+        批量记录流程事件（同一事务内 executemany；分片模式下每个分片一个事务）
+
+        Returns:
+            按输入顺序返回新事件 ID（同一文档内单调递增；分片模式下不同文档的 ID 可能重复）
+        """
+        if not events:
+            return []
 
-        return None
+        timestamp = datetime.now().isoformat()
+        if not self.use_database:
+            with self._memory_lock:
+                event_ids = list(range(self._next_event_id, self._next_event_id + len(events)))
+                self._next_event_id += len(events)
+                for event, event_id in zip(events, event_ids):
+                    self._memory_events.setdefault(event["document_id"], []).append(
+                        {
+                            "id": event_id,
+                            "document_id": event["document_id"],
+                            "section_id": event.get("section_id"),
+                            "subsection_id": event.get("subsection_id"),
+                            "stage": event["stage"],
+                            "message": event["message"],
+                            "timestamp": event.get("timestamp") or timestamp,
+                            "metadata": copy.deepcopy(event.get("metadata") or {}),
+                        }
+                    )
+                    self._memory_event_ids.setdefault(event["document_id"], []).append(event_id)
+                self._memory_dirty = True
+            self._notify_progress(events, event_ids)
+            return event_ids
+
+        event_ids = [0] * len(events)
+        for path, group in self._group_by_path(events, register=True).items():
+            with self._transaction(path) as cursor:
+                cursor.executemany(
+                    """
+                    INSERT INTO progress_events (document_id, section_id, subsection_id, stage, message, timestamp, metadata)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    [
+                        (
+                            event["document_id"],
+                            event.get("section_id"),
+                            event.get("subsection_id"),
+                            event["stage"],
+                            event["message"],
+                            event.get("timestamp") or timestamp,
+                            json.dumps(event.get("metadata") or {}),
+                        )
+                        for _, event in group
+                    ],
+                )
+                # 事务持有写锁，AUTOINCREMENT 在本次 executemany 内连续分配
+                last_id = cursor.execute("SELECT last_insert_rowid()").fetchone()[0]
+            for offset, (index, _) in enumerate(group):
+                event_ids[index] = last_id - len(group) + 1 + offset
+        self._notify_progress(events, event_ids)
+        return event_ids
 
     def get_progress_events(
         self,
         document_id: str,
         after_id: int = 0,
         limit: int = 100,
+        stages: Optional[Sequence[str]] = None,
+        fields: Optional[Sequence[str]] = None,
     ) -> List[Dict[str, Any]]:
-        """获取某文档的流程事件，支持增量拉取。"""
+        """
+        获取某文档的流程事件，支持增量拉取。
+
+        stages 只返回指定阶段的事件（如 ["subsection_passed"]，在 SQL 中过滤，limit 按过滤后计数）；
+        fields 为可选投影（PROGRESS_FIELDS 中的列或 metadata.<key>），id 始终返回以便续拉。
+        """
+        if fields and "id" not in fields:
+            fields = ["id", *fields]
+        columns, metadata_keys = self._projection(fields, self.PROGRESS_FIELDS)
+        after_id = max(0, int(after_id))
+        limit = max(1, int(limit))
         if self.use_database:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            stage_filter = f"AND stage IN ({', '.join('?' * len(stages))})" if stages else ""
+            cursor = self._connect(self._document_path(document_id)).cursor()
             cursor.execute(
-                """
-                SELECT id, document_id, section_id, subsection_id, stage, message, timestamp, metadata
+                f"""
+                SELECT {self._select_sql(columns, metadata_keys)}
                 FROM progress_events
-                WHERE document_id = ? AND id > ?
+                WHERE document_id = ? AND id > ? {stage_filter}
                 ORDER BY id ASC
                 LIMIT ?
                 """,
-                (document_id, max(0, int(after_id)), max(1, int(limit))),
+                (document_id, after_id, *(stages or ()), limit),
             )
-            rows = cursor.fetchall()
-            conn.close()
-
-            return [
-                {
-                    "id": row[0],
-                    "document_id": row[1],
-                    "section_id": row[2],
-                    "subsection_id": row[3],
-                    "stage": row[4],
-                    "message": row[5],
-                    "timestamp": row[6],
-                    "metadata": json.loads(row[7]) if row[7] else {},
-                }
-                for row in rows
-            ]
+            return [self._row_record(columns, row, metadata_keys) for row in cursor.fetchall()]
 
-        return []
+        with self._memory_lock:
+            document_events = self._memory_events.get(document_id, [])
+            start = bisect_right(self._memory_event_ids.get(document_id, []), after_id)
+            if stages:
+                wanted = set(stages)
+                selected = islice(
+                    (document_events[index] for index in range(start, len(document_events)) if document_events[index]["stage"] in wanted),
+                    limit,
+                )
+            else:
+                selected = document_events[start:start + limit]
+            if not fields:
+                return copy.deepcopy(list(selected))
+            return [self._project_record(event, columns, metadata_keys) for event in selected]
 
     def clear_progress_events(self, document_id: str):
         """清空某文档的流程事件。"""
         if self.use_database:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM progress_events WHERE document_id = ?", (document_id,))
-            conn.commit()
-            conn.close()
\ No newline at end of file
+            with self._transaction(self._document_path(document_id)) as cursor:
+                cursor.execute("DELETE FROM progress_events WHERE document_id = ?", (document_id,))
+        else:
+            with self._memory_lock:
+                self._memory_events.pop(document_id, None)
+                self._memory_event_ids.pop(document_id, None)
+                self._memory_dirty = True
+
+    # ============ 保留、压缩与归档 ============
+
+    def start_maintenance(self, interval_seconds: Optional[float] = None) -> bool:
+        """启动后台维护线程（数据库模式）；由持有共享库的服务（outliner）在启动时调用。"""
+        interval = MAINTENANCE_SECONDS if interval_seconds is None else interval_seconds
+        if not self.use_database or interval <= 0 or self._maintenance_thread is not None:
+            return False
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.run_maintenance()
+                except Exception as e:
+                    print(f"⚠️ History 维护失败: {e}")
+
+        self._maintenance_thread = threading.Thread(target=run, daemon=True, name="history-maintenance")
+        self._maintenance_thread.start()
+        return True
+
+    def run_maintenance(self, now: Optional[datetime] = None, convert_vacuum: bool = False) -> Dict[str, Any]:
+        """
+        执行一轮维护：归档已完成文档（需开启 ARCHIVE_AFTER_HOURS）、按表 TTL 删除过期行、压缩旧行的大 metadata、增量 VACUUM。
+
+        每步按 MAINTENANCE_BATCH_ROWS 分批提交，避免长时间持有写锁；分片模式下逐个文件处理，计数合计。
+        尚未启用增量 VACUUM 的旧库需要一次阻塞的完整 VACUUM，只在 convert_vacuum=True（显式调用）时执行。
+        """
+        if not self.use_database:
+            return {"skipped": "memory mode"}
+        if not self._maintenance_lock.acquire(blocking=False):
+            return {"skipped": "maintenance already running"}
+
+        try:
+            now = now or datetime.now()
+            started = time.perf_counter()
+            report: Dict[str, Any] = {"started_at": now.isoformat()}
+            paths = self._database_paths()
+
+            report["archived_documents"] = (
+                [
+                    document_id
+                    for path in paths
+                    for document_id in self._archive_completed_documents(
+                        path, (now - timedelta(hours=ARCHIVE_AFTER_HOURS)).isoformat()
+                    )
+                ]
+                if ARCHIVE_AFTER_HOURS > 0
+                else []
+            )
+            report["expired_rows"] = {
+                table: sum(self._delete_expired(path, table, (now - timedelta(days=days)).isoformat()) for path in paths)
+                for table, days in RETENTION_DAYS.items()
+                if days > 0
+            }
+            report["compacted_rows"] = (
+                {
+                    table: sum(
+                        self._compact_metadata(path, table, (now - timedelta(hours=METADATA_COMPACT_AFTER_HOURS)).isoformat())
+                        for path in paths
+                    )
+                    for table in ("progress_events", "subsection_tracking", "history")
+                }
+                if METADATA_COMPACT_AFTER_HOURS > 0 and METADATA_MAX_BYTES > 0
+                else {}
+            )
+            report["vacuum"] = self._incremental_vacuum(self.db_path, convert_vacuum)
+            if self.shards:
+                report["shard_vacuum"] = {
+                    os.path.basename(path): self._incremental_vacuum(path, convert_vacuum) for path in paths[1:]
+                }
+            report["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            self.last_maintenance = report
+            return report
+        finally:
+            self._maintenance_lock.release()
+
+    def _delete_expired(self, path: str, table: str, cutoff: str) -> int:
+        column = TABLE_TIME_COLUMNS[table]
+        deleted = 0
+        while True:
+            with self._transaction(path) as cursor:
+                cursor.execute(
+                    f"DELETE FROM {table} WHERE id IN (SELECT id FROM {table} WHERE {column} < ? LIMIT ?)",
+                    (cutoff, MAINTENANCE_BATCH_ROWS),
+                )
+                count = cursor.rowcount
+            deleted += count
+            if count < MAINTENANCE_BATCH_ROWS:
+                return deleted
+
+    @staticmethod
+    def _compacted_metadata(raw: str) -> Optional[str]:
+        """按体积从大到小移除 metadata 字段直到不超过 METADATA_MAX_BYTES（METADATA_KEEP_KEYS 除外）；被移除的字段记录在 _compacted_keys。"""
+        try:
+            metadata = json.loads(raw)
+        except (TypeError, ValueError):
+            return None
+        if not isinstance(metadata, dict):
+            return None
+
+        sizes = {key: len(json.dumps(value, ensure_ascii=False)) for key, value in metadata.items()}
+        compacted = dict(metadata)
+        removed = dict(compacted.pop("_compacted_keys", None) or {})
+        newly_removed = 0
+        for key in sorted(sizes, key=sizes.get, reverse=True):
+            if len(json.dumps(compacted, ensure_ascii=False)) <= METADATA_MAX_BYTES:
+                break
+            if key == "_compacted_keys" or key in METADATA_KEEP_KEYS:
+                continue
+            compacted.pop(key, None)
+            removed[key] = sizes[key]
+            newly_removed += 1
+        if not newly_removed:
+            return None
+        compacted["_compacted_keys"] = removed
+        return json.dumps(compacted, ensure_ascii=False)
+
+    def _compact_metadata(self, path: str, table: str, cutoff: str) -> int:
+        column = TABLE_TIME_COLUMNS[table]
+        compacted = 0
+        last_id = 0
+        while True:
+            rows = self._connect(path).execute(
+                f"""
+                SELECT id, metadata FROM {table}
+                WHERE id > ? AND {column} < ? AND length(metadata) > ?
+                ORDER BY id
+                LIMIT ?
+                """,
+                (last_id, cutoff, METADATA_MAX_BYTES, MAINTENANCE_BATCH_ROWS),
+            ).fetchall()
+            if not rows:
+                return compacted
+            last_id = rows[-1][0]
+            updates = []
+            for row_id, raw in rows:
+                value = self._compacted_metadata(raw)
+                if value is not None:
+                    updates.append((value, row_id))
+            if updates:
+                with self._transaction(path) as cursor:
+                    cursor.executemany(f"UPDATE {table} SET metadata = ? WHERE id = ?", updates)
+                compacted += len(updates)
+
+    def _archive_dir(self) -> str:
+        return ARCHIVE_DIR or os.path.join(os.path.dirname(os.path.abspath(self.db_path)), "history_archive")
+
+    def _archive_path(self, document_id: str) -> str:
+        safe_name = re.sub(r"[^A-Za-z0-9._-]", "_", document_id)[:80]
+        digest = hashlib.blake2b(document_id.encode("utf-8"), digest_size=6).hexdigest()
+        return os.path.join(self._archive_dir(), f"{safe_name}-{digest}.json.gz")
+
+    def _archive_completed_documents(self, path: str, cutoff: str) -> List[str]:
+        """归档 path 中 document_complete 早于 cutoff 且之后再无新事件的文档。"""
+        candidates = [
+            row[0]
+            for row in self._connect(path).execute(
+                """
+                SELECT DISTINCT document_id FROM progress_events
+                WHERE stage = 'document_complete' AND timestamp < ?
+                """,
+                (cutoff,),
+            ).fetchall()
+        ]
+        archived = []
+        for document_id in candidates:
+            latest = self._connect(path).execute(
+                "SELECT timestamp FROM progress_events WHERE document_id = ? ORDER BY id DESC LIMIT 1",
+                (document_id,),
+            ).fetchone()
+            if latest and latest[0] < cutoff and self.archive_document(document_id):
+                archived.append(document_id)
+        return archived
+
+    def archive_document(self, document_id: str) -> Optional[str]:
+        """
+        把文档在各表中的全部行写入 gzip JSON 归档文件并从数据库删除。
+
+        读取与删除在同一个 IMMEDIATE 事务中完成，多进程同时归档时只有一个会写出文件。
+
+        Returns:
+            归档文件路径；文档没有任何数据时返回 None
+        """
+        if not self.use_database:
+            return None
+
+        path = self._archive_path(document_id)
+        with self._transaction(self._document_path(document_id)) as cursor:
+            cursor.execute("BEGIN IMMEDIATE")
+            payload: Dict[str, Any] = {"document_id": document_id, "archived_at": datetime.now().isoformat()}
+            total = 0
+            for table in TABLE_TIME_COLUMNS:
+                cursor.execute(f"SELECT * FROM {table} WHERE document_id = ? ORDER BY id", (document_id,))
+                columns = [description[0] for description in cursor.description]
+                rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+                payload[table] = rows
+                total += len(rows)
+            if total == 0:
+                return None
+
+            previous = self.read_archive(document_id)
+            if previous:
+                # 同一 document_id 再次生成后归档：追加到已有归档
+                for table in TABLE_TIME_COLUMNS:
+                    payload[table] = previous.get(table, []) + payload[table]
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp-{os.getpid()}"
+            with gzip.open(tmp_path, "wt", encoding="utf-8") as handle:
+                json.dump(payload, handle, ensure_ascii=False)
+            os.replace(tmp_path, path)
+
+            for table in TABLE_TIME_COLUMNS:
+                cursor.execute(f"DELETE FROM {table} WHERE document_id = ?", (document_id,))
+        return path
+
+    def read_archive(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """读取文档归档（各表的原始行，metadata 为 JSON 字符串）；未归档返回 None。"""
+        path = self._archive_path(document_id)
+        if not os.path.exists(path):
+            return None
+        with gzip.open(path, "rt", encoding="utf-8") as handle:
+            return json.load(handle)
+
+    def _incremental_vacuum(self, path: str, convert: bool = False) -> Dict[str, Any]:
+        conn = self._connect(path)
+        freelist_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        converted = False
+        needs_conversion = conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2
+        if needs_conversion and convert:
+            # 旧库：一次完整 VACUUM（阻塞全部读写）切换到增量模式，之后每轮只释放有限页数
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+            converted = True
+            needs_conversion = False
+        elif freelist_before and not needs_conversion:
+            pages = VACUUM_PAGES_PER_RUN if VACUUM_PAGES_PER_RUN > 0 else freelist_before
+            # sqlite3 模块的 execute 只单步执行一次（每步释放一页），executescript 会执行到结束
+            conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+        try:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        except sqlite3.DatabaseError:
+            pass
+        return {
+            "converted_to_incremental": converted,
+            "needs_conversion": needs_conversion,
+            "freelist_pages_before": freelist_before,
+            "freelist_pages_after": conn.execute("PRAGMA freelist_count").fetchone()[0],
+        }
+
+    def get_storage_stats(self) -> Dict[str, Any]:
+        """
+        返回存储统计：各表行数与占用字节（含索引）、数据库/WAL 文件大小、空闲页、归档概况和最近一次维护结果。
+
+        分片模式下 tables 为主库与各分片的合计，文件级数据见 shards.files。
+        """
+        if not self.use_database:
+            with self._memory_lock:
+                return {
+                    "mode": "memory",
+                    "tables": {
+                        "history": {"rows": sum(len(rows) for rows in self._memory_history.values())},
+                        "outlines": {"rows": len(self._memory_outlines)},
+                        "subsection_tracking": {"rows": len(self._memory_tracking)},
+                        "passed_history": {"rows": sum(len(rows) for rows in self._memory_passed.values())},
+                        "progress_events": {"rows": sum(len(rows) for rows in self._memory_events.values())},
+                    },
+                    "snapshot_path": self.snapshot_path,
+                }
+
+        tables: Dict[str, Dict[str, Any]] = {table: {"rows": 0, "bytes": None} for table in TABLE_TIME_COLUMNS}
+        shard_files: Dict[str, Dict[str, Any]] = {}
+        for path in self._database_paths():
+            rows = self._add_table_stats(self._connect(path), tables)
+            if path != self.db_path:
+                shard_files[os.path.basename(path)] = {
+                    "rows": rows,
+                    "file_bytes": os.path.getsize(path) if os.path.exists(path) else 0,
+                    "wal_bytes": os.path.getsize(f"{path}-wal") if os.path.exists(f"{path}-wal") else 0,
+                }
+
+        conn = self._connect()
+
+        archive_dir = self._archive_dir()
+        archive_files = (
+            [name for name in os.listdir(archive_dir) if name.endswith(".json.gz")] if os.path.isdir(archive_dir) else []
+        )
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        return {
+            "mode": "database",
+            "db_path": self.db_path,
+            "file_bytes": os.path.getsize(self.db_path) if os.path.exists(self.db_path) else 0,
+            "wal_bytes": os.path.getsize(f"{self.db_path}-wal") if os.path.exists(f"{self.db_path}-wal") else 0,
+            "page_size": page_size,
+            "page_count": conn.execute("PRAGMA page_count").fetchone()[0],
+            "freelist_pages": conn.execute("PRAGMA freelist_count").fetchone()[0],
+            "auto_vacuum": {0: "none", 1: "full", 2: "incremental"}.get(conn.execute("PRAGMA auto_vacuum").fetchone()[0]),
+            "tables": tables,
+            "archive": {
+                "dir": archive_dir,
+                "documents": len(archive_files),
+                "bytes": sum(os.path.getsize(os.path.join(archive_dir, name)) for name in archive_files),
+            },
+            "retention_days": RETENTION_DAYS,
+            "last_maintenance": self.last_maintenance,
+            "shards": (
+                {
+                    "count": self.shards,
+                    "documents": conn.execute("SELECT COUNT(*) FROM document_catalogue").fetchone()[0],
+                    "files": shard_files,
+                }
+                if self.shards
+                else None
+            ),
+        }
+
+    @staticmethod
+    def _add_table_stats(conn: sqlite3.Connection, tables: Dict[str, Dict[str, Any]]) -> int:
+        """把一个数据库文件的各表行数与占用字节累加到 tables，返回该文件的总行数。"""
+        table_of = {
+            name: table
+            for name, table in conn.execute("SELECT name, tbl_name FROM sqlite_master WHERE type IN ('table', 'index')")
+        }
+        total_rows = 0
+        for table in TABLE_TIME_COLUMNS:
+            rows = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            tables[table]["rows"] += rows
+            total_rows += rows
+        try:
+            for name, size in conn.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name"):
+                table = table_of.get(name, name)
+                if table in tables:
+                    tables[table]["bytes"] = (tables[table]["bytes"] or 0) + int(size)
+        except sqlite3.DatabaseError:
+            # SQLite 未编译 dbstat 时只报告行数
+            pass
+        return total_rows
@@ -3,16 +3,19 @@ FlowerNet Outliner - FastAPI Service
 提供 RESTful API 接口
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Set
 import uvicorn
+import asyncio
 import os
 import json
 import time
 import threading
 import queue
+import uuid
 from datetime import datetime
 
 from outliner import FlowerNetOutliner
@@ -23,6 +26,13 @@ if '..' not in sys.path:
     sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 from history_store import HistoryManager
 
+try:
+    # 仓库内运行时复用 agent stack 的持久化任务队列与 checkpoint（多 worker 进程共享）
+    from flowernet_agent_stack import get_checkpoint_store, get_task_queue
+except Exception:
+    get_checkpoint_store = None
+    get_task_queue = None
+
 
 # ============ Pydantic Models ============
 
@@ -41,6 +51,7 @@ class HistoryEntry(BaseModel):
     subsection_id: str = Field(..., description="Subsection ID")
     content: str = Field(..., description="生成的内容")
     metadata: Optional[Dict[str, Any]] = Field(default=None, description="额外元数据")
+    timestamp: Optional[str] = Field(default=None, description="写入时间（ISO 格式，客户端异步写入时保留产生时间；仅批量接口使用）")
 
 
 class HistoryQuery(BaseModel):
@@ -48,11 +59,23 @@ class HistoryQuery(BaseModel):
     document_id: str = Field(..., description="文档 ID")
 
 
+class HistoryGetQuery(HistoryQuery):
+    """获取 History 的请求（可选字段投影）"""
+    fields: Optional[List[str]] = Field(default=None, description="只返回这些字段，可用 metadata.<key> 取 metadata 的部分键")
+
+
 class ProgressQuery(BaseModel):
     """查询流程事件的请求"""
     document_id: str = Field(..., description="文档 ID")
     after_id: int = Field(default=0, ge=0, description="仅返回该 ID 之后的事件")
     limit: int = Field(default=100, ge=1, le=500, description="单次返回上限")
+    stages: Optional[List[str]] = Field(default=None, description="只返回这些阶段的事件")
+    fields: Optional[List[str]] = Field(default=None, description="只返回这些字段（id 始终返回），可用 metadata.<key>")
+
+
+class ProgressWaitQuery(ProgressQuery):
+    """长轮询流程事件的请求"""
+    timeout_seconds: float = Field(default=25.0, ge=0, le=60, description="无新事件时最长等待秒数")
 
 
 class SaveOutlineRequest(BaseModel):
@@ -110,6 +133,7 @@ class SubsectionTrackingQuery(BaseModel):
     document_id: str = Field(..., description="文档 ID")
     section_id: str = Field(..., description="Section ID")
     subsection_id: str = Field(..., description="Subsection ID")
+    fields: Optional[List[str]] = Field(default=None, description="只返回这些字段，可用 metadata.<key>")
 
 
 class PassedHistoryEntry(BaseModel):
@@ -118,6 +142,7 @@ class PassedHistoryEntry(BaseModel):
     subsection_id: str = Field(..., description="Subsection ID")
     content: str = Field(..., description="已通过内容")
     order_index: int = Field(..., ge=0, description="顺序索引")
+    created_at: Optional[str] = Field(default=None, description="写入时间（ISO 格式，仅批量接口使用）")
 
 
 class ProgressEventCreateRequest(BaseModel):
@@ -127,6 +152,26 @@ class ProgressEventCreateRequest(BaseModel):
     section_id: Optional[str] = Field(default=None, description="Section ID")
     subsection_id: Optional[str] = Field(default=None, description="Subsection ID")
     metadata: Optional[Dict[str, Any]] = Field(default=None, description="额外元数据")
+    timestamp: Optional[str] = Field(default=None, description="事件时间（ISO 格式，仅批量接口使用）")
+
+class HistoryEntryBatch(BaseModel):
+    """批量添加 History 的请求"""
+    entries: List[HistoryEntry] = Field(..., max_length=1000, description="History 记录列表")
+
+
+class ProgressEventBatch(BaseModel):
+    """批量添加流程事件的请求"""
+    events: List[ProgressEventCreateRequest] = Field(..., max_length=1000, description="流程事件列表")
+
+
+class SubsectionTrackingUpdateBatch(BaseModel):
+    """批量更新 subsection 追踪的请求"""
+    updates: List[SubsectionTrackingUpdateRequest] = Field(..., max_length=1000, description="追踪更新列表（按顺序应用）")
+
+
+class PassedHistoryBatch(BaseModel):
+    """批量添加已通过内容的请求"""
+    entries: List[PassedHistoryEntry] = Field(..., max_length=1000, description="已通过内容列表")
 
 
 # ============ FastAPI App ============
@@ -150,7 +195,6 @@ app.add_middleware(
 outliner = None
 history_manager = None
 outline_generation_lock = threading.Lock()
-outline_task_queue: "queue.Queue[str]" = queue.Queue()
 outline_tasks: Dict[str, Dict[str, Any]] = {}
 outline_tasks_lock = threading.Lock()
 outline_worker_count = 0
@@ -159,6 +203,104 @@ OUTLINE_LOCK_WAIT_TIMEOUT = float(os.getenv("OUTLINE_LOCK_WAIT_TIMEOUT", "300"))
 OUTLINE_TASK_WORKERS = max(1, min(4, int(os.getenv("OUTLINE_TASK_WORKERS", "2"))))
 OUTLINE_TASK_HEARTBEAT_SECONDS = max(5.0, float(os.getenv("OUTLINE_TASK_HEARTBEAT_SECONDS", "15")))
 TERMINAL_OUTLINE_STATUSES = {"completed", "failed", "cancelled", "stale"}
+OUTLINE_TASK_LEASE_SECONDS = max(60.0, OUTLINE_TASK_HEARTBEAT_SECONDS * 4)
+# 长轮询 / SSE：本进程写入的事件即时唤醒；其他进程写入的事件靠定期复查数据库发现
+PROGRESS_WAIT_RECHECK_SECONDS = max(0.2, float(os.getenv("OUTLINER_PROGRESS_WAIT_RECHECK_SECONDS", "2")))
+PROGRESS_STREAM_KEEPALIVE_SECONDS = max(1.0, float(os.getenv("OUTLINER_PROGRESS_STREAM_KEEPALIVE_SECONDS", "15")))
+
+
+class _ProgressNotifier:
+    """
+    流程事件的进程内通知：HistoryManager 提交事件后（任意线程）唤醒等待该文档的协程。
+
+    等待者只在事件循环线程中注册/移除，写入线程通过 call_soon_threadsafe 投递唤醒。
+    调用方应先 register 再查询数据库（查询在线程池中进行，期间会让出事件循环），
+    查询期间到达的唤醒会落在已注册的 future 上，不会丢失。
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._waiters: Dict[str, Set[asyncio.Future]] = {}
+
+    def bind(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+
+    def notify(self, document_id: str, last_event_id: int) -> None:
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(self._wake, document_id)
+        except RuntimeError:
+            pass
+
+    def _wake(self, document_id: str) -> None:
+        for waiter in self._waiters.pop(document_id, set()):
+            if not waiter.done():
+                waiter.set_result(True)
+
+    def waiter_count(self) -> int:
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    def register(self, document_id: str) -> asyncio.Future:
+        """在查询数据库之前注册等待者，之后到达的唤醒都会记在它上面。"""
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(document_id, set()).add(waiter)
+        return waiter
+
+    def discard(self, document_id: str, waiter: asyncio.Future) -> None:
+        waiters = self._waiters.get(document_id)
+        if waiters is not None:
+            waiters.discard(waiter)
+            if not waiters:
+                self._waiters.pop(document_id, None)
+
+    async def wait(self, document_id: str, timeout: float, waiter: Optional[asyncio.Future] = None) -> bool:
+        """等待该文档的新事件通知；超时返回 False。传入查询前 register 得到的 waiter，才能保证不漏掉查询期间的唤醒。"""
+        if waiter is None:
+            waiter = self.register(document_id)
+        try:
+            if not waiter.done():
+                await asyncio.wait_for(waiter, timeout=max(0.0, timeout))
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.discard(document_id, waiter)
+
+
+progress_notifier = _ProgressNotifier()
+
+
+class _LocalOutlineTaskQueue:
+    """单进程退回实现：接口与 TaskQueue 的 lease/ack 一致，但任务不持久化。"""
+
+    active_backend = "memory"
+
+    def __init__(self):
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+
+    def put(self, item: Dict[str, Any]) -> None:
+        self._queue.put(item)
+
+    def lease(self, timeout: float = 1.0, lease_seconds: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        try:
+            return {"receipt": None, "item": self._queue.get(timeout=timeout), "attempts": 1}
+        except queue.Empty:
+            return None
+
+    def ack(self, receipt: Any) -> bool:
+        return True
+
+    def extend(self, receipt: Any, lease_seconds: Optional[float] = None) -> bool:
+        return True
+
+    def size(self) -> int:
+        return self._queue.qsize()
+
+
+outline_task_queue = get_task_queue("flowernet:outliner:tasks") if get_task_queue is not None else _LocalOutlineTaskQueue()
+outline_checkpoint_store = get_checkpoint_store() if get_checkpoint_store is not None else None
 
 
 def _is_transient_outliner_error(message: str) -> bool:
@@ -196,6 +338,42 @@ def _set_outline_task(task_id: str, **updates: Any) -> None:
             return
         task.update(updates)
         task["updated_at"] = datetime.now().isoformat()
+        checkpoint_payload = {k: v for k, v in task.items() if k != "request"}
+    _persist_outline_task(task_id, checkpoint_payload)
+
+
+def _persist_outline_task(task_id: str, payload: Dict[str, Any]) -> None:
+    if outline_checkpoint_store is None:
+        return
+    try:
+        outline_checkpoint_store.set(f"outliner_task:{task_id}", payload, ttl_seconds=7 * 24 * 3600)
+    except Exception:
+        pass
+
+
+def _restore_outline_task(task_id: str, item: Dict[str, Any]) -> None:
+    """登记从持久化队列领取、但本进程内存中没有的任务（重启后或由其他进程提交）。"""
+    with outline_tasks_lock:
+        if task_id in outline_tasks:
+            return
+    checkpoint: Dict[str, Any] = {}
+    if outline_checkpoint_store is not None:
+        try:
+            checkpoint = dict(outline_checkpoint_store.get(f"outliner_task:{task_id}") or {})
+        except Exception:
+            checkpoint = {}
+    try:
+        request = GenerateAndSaveOutlineRequest(**(item.get("request") or {}))
+    except Exception:
+        request = None
+    if str(checkpoint.get("status") or "").lower() not in TERMINAL_OUTLINE_STATUSES:
+        checkpoint.update(status="queued", updated_at=datetime.now().isoformat())
+        for key in ("started_at", "heartbeat_at"):
+            checkpoint.pop(key, None)
+    checkpoint.setdefault("created_at", item.get("created_at") or datetime.now().isoformat())
+    checkpoint.update(task_id=task_id, document_id=item.get("document_id"), request=request)
+    with outline_tasks_lock:
+        outline_tasks.setdefault(task_id, checkpoint)
 
 
 def _iso_age_seconds(value: str) -> float:
@@ -224,7 +402,7 @@ def _mark_stale_outline_tasks() -> None:
                 task["updated_at"] = now
 
 
-def _start_outline_task_heartbeat(task_id: str) -> threading.Event:
+def _start_outline_task_heartbeat(task_id: str, receipt: Any = None) -> threading.Event:
     stop_event = threading.Event()
 
     def heartbeat_loop() -> None:
@@ -236,6 +414,7 @@ def _start_outline_task_heartbeat(task_id: str) -> threading.Event:
                 now = datetime.now().isoformat()
                 task["heartbeat_at"] = now
                 task["updated_at"] = now
+            outline_task_queue.extend(receipt, OUTLINE_TASK_LEASE_SECONDS)
 
     threading.Thread(
         target=heartbeat_loop,
@@ -247,9 +426,17 @@ def _start_outline_task_heartbeat(task_id: str) -> threading.Event:
 
 def _outline_task_worker_loop() -> None:
     while True:
-        task_id = outline_task_queue.get()
+        leased = outline_task_queue.lease(timeout=5.0, lease_seconds=OUTLINE_TASK_LEASE_SECONDS)
+        if leased is None:
+            continue
+        item = leased.get("item") or {}
+        receipt = leased.get("receipt")
+        task_id = str(item.get("task_id") or "")
         heartbeat_stop: Optional[threading.Event] = None
         try:
+            if not task_id:
+                continue
+            _restore_outline_task(task_id, item)
             with outline_tasks_lock:
                 task = outline_tasks.get(task_id, {})
                 request = task.get("request")
@@ -261,8 +448,14 @@ def _outline_task_worker_loop() -> None:
                 continue
 
             now = datetime.now().isoformat()
-            _set_outline_task(task_id, status="running", started_at=now, heartbeat_at=now)
-            heartbeat_stop = _start_outline_task_heartbeat(task_id)
+            _set_outline_task(
+                task_id,
+                status="running",
+                started_at=now,
+                heartbeat_at=now,
+                attempt=int(leased.get("attempts") or 1),
+            )
+            heartbeat_stop = _start_outline_task_heartbeat(task_id, receipt)
             result = generate_and_save_outline(request)
             with outline_tasks_lock:
                 current_status = str(outline_tasks.get(task_id, {}).get("status") or "").lower()
@@ -291,7 +484,7 @@ def _outline_task_worker_loop() -> None:
         finally:
             if heartbeat_stop is not None:
                 heartbeat_stop.set()
-            outline_task_queue.task_done()
+            outline_task_queue.ack(receipt)
 
 
 def _ensure_outline_worker_started() -> None:
@@ -340,6 +533,10 @@ async def startup_event():
         
         print(f"🔧 初始化 History Manager（use_db={use_db}, db_path={db_path}）...")
         history_manager = HistoryManager(use_database=use_db, db_path=db_path)
+        progress_notifier.bind(asyncio.get_running_loop())
+        history_manager.add_progress_listener(progress_notifier.notify)
+        if history_manager.start_maintenance():
+            print("✅ History 保留/归档维护线程已启动")
         print(f"✅ History Manager 初始化成功")
         _ensure_outline_worker_started()
         print(f"✅ Outline async task workers 已启动: {outline_worker_count}/{OUTLINE_TASK_WORKERS}")
@@ -397,9 +594,11 @@ async def health():
         "source_version": "2026-06-24-outliner-deepseek-single-call-v2",
         "worker_count": outline_worker_count,
         "configured_workers": OUTLINE_TASK_WORKERS,
-        "queue_size": outline_task_queue.qsize(),
+        "queue_size": outline_task_queue.size(),
+        "queue_backend": outline_task_queue.active_backend,
         "generation_lock_locked": outline_generation_lock.locked(),
         "task_counts": status_counts,
+        "progress_waiters": progress_notifier.waiter_count(),
         "provider_chain_env": os.getenv("OUTLINER_PROVIDER_CHAIN", ""),
         "configured_provider_keys": {
             "azure": bool(os.getenv("OUTLINER_AZURE_API_KEY") or os.getenv("AZURE_OPENAI_API_KEY")),
@@ -528,13 +727,32 @@ def add_history(entry: HistoryEntry):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/history/add-batch")
+def add_history_batch(batch: HistoryEntryBatch):
+    """
+    批量添加 History 记录（单个事务写入）
+
+    Returns:
+        {"success": True, "count": 10}
+    """
+    try:
+        count = history_manager.add_entries([entry.model_dump() for entry in batch.entries])
+        return {
+            "success": True,
+            "count": count,
+            "message": f"已批量添加 {count} 条 history"
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/history/get")
-def get_history(query: HistoryQuery):
+def get_history(query: HistoryGetQuery):
     """
     获取某个文档的所有 History
     
     Args:
-        query: 包含 document_id
+        query: 包含 document_id，可选 fields 投影（如 ["subsection_id"] 只用于计数）
         
     Returns:
         {
@@ -545,7 +763,7 @@ def get_history(query: HistoryQuery):
         }
     """
     try:
-        history = history_manager.get_history(query.document_id)
+        history = history_manager.get_history(query.document_id, fields=query.fields)
         
         return {
             "success": True,
@@ -554,6 +772,8 @@ def get_history(query: HistoryQuery):
             "total": len(history)
         }
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -641,16 +861,78 @@ def get_statistics(query: HistoryQuery):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/history/stats")
+def get_history_storage_stats():
+    """
+    History 存储统计：各表行数与占用字节、数据库/WAL 大小、空闲页、归档概况和最近一次维护结果。
+    """
+    try:
+        return {
+            "success": True,
+            "stats": history_manager.get_storage_stats(),
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/history/documents")
+def list_history_documents():
+    """列出 History 中的文档 ID（分片模式读主库的文档目录，不扫描各分片）。"""
+    try:
+        documents = history_manager.list_documents()
+        return {
+            "success": True,
+            "count": len(documents),
+            "documents": documents,
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/history/maintenance")
+def run_history_maintenance(convert_vacuum: bool = False):
+    """
+    立即执行一轮保留/压缩/归档/增量 VACUUM（后台线程也会按 FLOWERNET_HISTORY_MAINTENANCE_SECONDS 定期执行）。
+
+    convert_vacuum=true 时对尚未启用增量 VACUUM 的旧库执行一次完整 VACUUM（期间阻塞读写，应在低峰期调用）；
+    后台线程从不执行该转换。
+    """
+    try:
+        return {
+            "success": True,
+            "report": history_manager.run_maintenance(convert_vacuum=convert_vacuum),
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/history/archive")
+def get_history_archive(query: HistoryQuery):
+    """读取已归档文档的原始数据（各表行）。"""
+    try:
+        archive = history_manager.read_archive(query.document_id)
+        return {
+            "success": True,
+            "document_id": query.document_id,
+            "archived": archive is not None,
+            "archive": archive,
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/history/progress")
 def get_progress_events(query: ProgressQuery):
     """
-    获取文档流程事件（增量），用于前端实时展示生成细节。
+    获取文档流程事件（增量），用于前端实时展示生成细节；可按 stages 过滤、按 fields 投影。
     """
     try:
         events = history_manager.get_progress_events(
             document_id=query.document_id,
             after_id=query.after_id,
             limit=query.limit,
+            stages=query.stages,
+            fields=query.fields,
         )
         last_id = events[-1]["id"] if events else query.after_id
 
@@ -661,10 +943,122 @@ def get_progress_events(query: ProgressQuery):
             "last_id": last_id,
             "count": len(events),
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/history/progress/wait")
+async def wait_progress_events(query: ProgressWaitQuery):
+    """
+    长轮询流程事件：after_id 之后已有事件时立即返回，否则阻塞到有新事件或 timeout_seconds 到期。
+
+    返回格式与 /history/progress 相同，另含 timed_out。
+    """
+    try:
+        deadline = time.monotonic() + query.timeout_seconds
+        while True:
+            # 先注册等待者再把 SQLite 查询放到线程池：查询期间提交的事件也能唤醒本次等待
+            waiter = progress_notifier.register(query.document_id)
+            try:
+                events = await asyncio.to_thread(
+                    history_manager.get_progress_events,
+                    document_id=query.document_id,
+                    after_id=query.after_id,
+                    limit=query.limit,
+                    stages=query.stages,
+                    fields=query.fields,
+                )
+                remaining = deadline - time.monotonic()
+                if events or remaining <= 0:
+                    break
+                await progress_notifier.wait(query.document_id, min(remaining, PROGRESS_WAIT_RECHECK_SECONDS), waiter)
+            finally:
+                progress_notifier.discard(query.document_id, waiter)
+        last_id = events[-1]["id"] if events else query.after_id
+
+        return {
+            "success": True,
+            "document_id": query.document_id,
+            "events": events,
+            "last_id": last_id,
+            "count": len(events),
+            "timed_out": not events,
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/history/progress/stream")
+async def stream_progress_events(
+    request: Request,
+    document_id: str,
+    after_id: int = 0,
+    limit: int = 200,
+    stages: Optional[str] = None,
+    fields: Optional[str] = None,
+):
+    """
+    SSE 推送流程事件（每条事件的 id 即事件 ID，断线重连时浏览器回传 Last-Event-ID 续传）。
+
+    stages / fields 为逗号分隔列表，语义同 /history/progress。
+    """
+    try:
+        after_id = max(after_id, int(request.headers.get("last-event-id") or 0))
+    except ValueError:
+        pass
+    limit = max(1, min(500, limit))
+    stage_list = [stage.strip() for stage in (stages or "").split(",") if stage.strip()] or None
+    field_list = [field.strip() for field in (fields or "").split(",") if field.strip()] or None
+    try:
+        # 投影参数有误时在建立流之前返回 400
+        await asyncio.to_thread(
+            history_manager.get_progress_events,
+            document_id=document_id,
+            after_id=after_id,
+            limit=1,
+            fields=field_list,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def event_stream():
+        last_id = max(0, after_id)
+        last_sent = time.monotonic()
+        while not await request.is_disconnected():
+            waiter = progress_notifier.register(document_id)
+            try:
+                events = await asyncio.to_thread(
+                    history_manager.get_progress_events,
+                    document_id=document_id,
+                    after_id=last_id,
+                    limit=limit,
+                    stages=stage_list,
+                    fields=field_list,
+                )
+                for event in events:
+                    last_id = event["id"]
+                    yield f"id: {last_id}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+                if events:
+                    last_sent = time.monotonic()
+                    continue
+                if time.monotonic() - last_sent >= PROGRESS_STREAM_KEEPALIVE_SECONDS:
+                    yield ": keepalive\n\n"
+                    last_sent = time.monotonic()
+                await progress_notifier.wait(document_id, PROGRESS_WAIT_RECHECK_SECONDS, waiter)
+            finally:
+                progress_notifier.discard(document_id, waiter)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.post("/progress/add")
 def add_progress_event(request: ProgressEventCreateRequest):
     try:
@@ -684,6 +1078,19 @@ def add_progress_event(request: ProgressEventCreateRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/progress/add-batch")
+def add_progress_events_batch(batch: ProgressEventBatch):
+    try:
+        event_ids = history_manager.add_progress_events([event.model_dump() for event in batch.events])
+        return {
+            "success": True,
+            "count": len(batch.events),
+            "event_ids": event_ids,
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/subsection-tracking/create")
 def create_subsection_tracking(request: SubsectionTrackingCreateRequest):
     try:
@@ -724,6 +1131,18 @@ def update_subsection_tracking(request: SubsectionTrackingUpdateRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/subsection-tracking/update-batch")
+def update_subsection_tracking_batch(batch: SubsectionTrackingUpdateBatch):
+    try:
+        count = history_manager.update_subsection_contents([update.model_dump() for update in batch.updates])
+        return {
+            "success": True,
+            "count": count,
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/subsection-tracking/get")
 def get_subsection_tracking(request: SubsectionTrackingQuery):
     try:
@@ -731,11 +1150,14 @@ def get_subsection_tracking(request: SubsectionTrackingQuery):
             document_id=request.document_id,
             section_id=request.section_id,
             subsection_id=request.subsection_id,
+            fields=request.fields,
         )
         return {
             "success": True,
             "tracking": tracking,
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -758,6 +1180,18 @@ def add_passed_history(entry: PassedHistoryEntry):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/passed-history/add-batch")
+def add_passed_history_batch(batch: PassedHistoryBatch):
+    try:
+        count = history_manager.add_passed_histories([entry.model_dump() for entry in batch.entries])
+        return {
+            "success": True,
+            "count": count,
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/passed-history/get")
 def get_passed_history(query: HistoryQuery):
     try:
@@ -1050,7 +1484,7 @@ def start_outline_generation_task(request: GenerateAndSaveOutlineRequest):
     with outline_tasks_lock:
         existing_task_id = _find_outline_task_by_document_locked(request.document_id)
         if not existing_task_id:
-            task_id = f"outline_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{len(outline_tasks) + 1}"
+            task_id = f"outline_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{len(outline_tasks) + 1}_{uuid.uuid4().hex[:6]}"
             outline_tasks[task_id] = {
                 "task_id": task_id,
                 "document_id": request.document_id,
@@ -1066,7 +1500,15 @@ def start_outline_generation_task(request: GenerateAndSaveOutlineRequest):
         existing = dict(outline_tasks.get(existing_task_id, {}))
 
     if should_enqueue:
-        outline_task_queue.put(existing_task_id)
+        _persist_outline_task(existing_task_id, {k: v for k, v in existing.items() if k != "request"})
+        outline_task_queue.put(
+            {
+                "task_id": existing_task_id,
+                "document_id": request.document_id,
+                "created_at": existing.get("created_at"),
+                "request": request.model_dump(),
+            }
+        )
         return {
             "success": True,
             "task_id": existing_task_id,
@@ -1094,6 +1536,12 @@ def get_outline_task_status_get(task_id: str):
     _mark_stale_outline_tasks()
     with outline_tasks_lock:
         task = dict(outline_tasks.get(task_id, {}))
+    if not task and outline_checkpoint_store is not None:
+        # 任务可能由其他 worker 进程提交/执行，状态经共享 checkpoint 可见
+        try:
+            task = dict(outline_checkpoint_store.get(f"outliner_task:{task_id}") or {})
+        except Exception:
+            task = {}
     if not task:
         raise HTTPException(status_code=404, detail="outline task not found")
     response = {
@@ -0,0 +1,483 @@
+import sqlite3
+import sys
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from history_store import HistoryManager
+
+
+class HistoryStoreConnectionTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.db_path = str(Path(self._tmp.name) / "history.db")
+        self.manager = HistoryManager(use_database=True, db_path=self.db_path)
+
+    def tearDown(self):
+        self.manager.close()
+        self._tmp.cleanup()
+
+    def test_connection_is_reused_in_wal_mode(self):
+        conn = self.manager._connect()
+        self.assertIs(conn, self.manager._connect())
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+
+        self.manager.add_progress_event("doc", "outline", "started")
+        self.manager.add_progress_event("doc", "outline", "done")
+        events = self.manager.get_progress_events("doc", after_id=1)
+        self.assertEqual([event["message"] for event in events], ["done"])
+        self.assertIs(conn, self.manager._connect())
+
+    def test_threads_use_their_own_connections(self):
+        main_conn = self.manager._connect()
+        seen = []
+
+        def worker(index):
+            seen.append(self.manager._connect())
+            for n in range(20):
+                self.manager.add_entry("doc", f"s{index}", f"ss{n}", f"content {index}-{n}")
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(self.manager.get_history("doc")), 80)
+        self.assertEqual(len({id(conn) for conn in seen}), 4)
+        self.assertNotIn(main_conn, seen)
+
+    def test_failed_write_rolls_back(self):
+        self.manager.create_subsection_tracking("doc", "s1", "ss1", "original outline")
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.manager.create_subsection_tracking("doc", "s1", "ss1", None)
+
+        tracking = self.manager.get_subsection_tracking("doc", "s1", "ss1")
+        self.assertEqual(tracking["outline"], "original outline")
+        # 回滚后连接不应残留写事务，其他连接仍可写入
+        other = HistoryManager(use_database=True, db_path=self.db_path)
+        other.add_entry("doc", "s1", "ss1", "written elsewhere")
+        other.close()
+        self.assertEqual(len(self.manager.get_history("doc")), 1)
+
+    def test_batch_writes(self):
+        event_ids = self.manager.add_progress_events(
+            [{"document_id": "doc", "stage": "generate", "message": f"m{i}"} for i in range(5)]
+        )
+        events = self.manager.get_progress_events("doc")
+        self.assertEqual(event_ids, [event["id"] for event in events])
+        self.assertEqual(self.manager.add_progress_event("doc", "verify", "single"), event_ids[-1] + 1)
+
+        self.assertEqual(
+            self.manager.add_entries(
+                [
+                    {"document_id": "doc", "section_id": "s1", "subsection_id": f"ss{i}", "content": f"c{i}"}
+                    for i in range(3)
+                ]
+            ),
+            3,
+        )
+        self.assertEqual([entry["content"] for entry in self.manager.get_history("doc")], ["c0", "c1", "c2"])
+
+        self.manager.create_subsection_tracking("doc", "s1", "ss1", "outline")
+        self.manager.update_subsection_contents(
+            [
+                {"document_id": "doc", "section_id": "s1", "subsection_id": "ss1", "generated_content": "draft", "iteration_count": 1},
+                {"document_id": "doc", "section_id": "s1", "subsection_id": "ss1", "is_passed": True},
+                {"document_id": "doc", "section_id": "s1", "subsection_id": "ss1", "generated_content": "final", "iteration_count": 2},
+            ]
+        )
+        tracking = self.manager.get_subsection_tracking("doc", "s1", "ss1")
+        self.assertEqual((tracking["generated_content"], tracking["iteration_count"], tracking["is_passed"]), ("final", 2, True))
+
+        self.manager.add_passed_histories(
+            [
+                {"document_id": "doc", "section_id": "s1", "subsection_id": f"ss{i}", "content": f"p{i}", "order_index": i}
+                for i in (1, 0)
+            ]
+        )
+        self.assertEqual(self.manager.get_passed_history_text("doc", separator="|"), "p0|p1")
+
+    def test_progress_listener_fires_after_commit(self):
+        notified = []
+
+        def listener(document_id, last_event_id):
+            # 回调时事件已提交，其他连接可以读到
+            reader = HistoryManager(use_database=True, db_path=self.db_path)
+            seen = reader.get_progress_events(document_id, after_id=last_event_id - 1)
+            reader.close()
+            notified.append((document_id, last_event_id, [event["id"] for event in seen]))
+
+        self.manager.add_progress_listener(listener)
+        event_ids = self.manager.add_progress_events(
+            [
+                {"document_id": "doc-a", "stage": "generate", "message": "a1"},
+                {"document_id": "doc-b", "stage": "generate", "message": "b1"},
+                {"document_id": "doc-a", "stage": "verify", "message": "a2"},
+            ]
+        )
+        self.assertEqual(
+            sorted(notified),
+            [("doc-a", event_ids[2], [event_ids[2]]), ("doc-b", event_ids[1], [event_ids[1]])],
+        )
+
+    @patch("history_store.ARCHIVE_AFTER_HOURS", 24)
+    @patch("history_store.METADATA_COMPACT_AFTER_HOURS", 24)
+    @patch.dict("history_store.RETENTION_DAYS", {"progress_events": 14})
+    def test_maintenance_expires_compacts_and_archives(self):
+        old = "2020-01-01T00:00:00"
+        now = datetime.now()
+        self.manager.add_progress_events(
+            [{"document_id": "stale", "stage": "generate", "message": f"m{i}", "timestamp": old} for i in range(5)]
+        )
+        self.manager.add_progress_events(
+            [
+                {"document_id": "done", "stage": "generate", "message": "big", "timestamp": old,
+                 "metadata": {"score": 0.9, "source_results": ["x" * 200] * 50}},
+                {"document_id": "done", "stage": "document_complete", "message": "ok", "timestamp": old},
+            ]
+        )
+        self.manager.add_entries(
+            [{"document_id": "done", "section_id": "s1", "subsection_id": "ss1", "content": "final", "timestamp": old}]
+        )
+        self.manager.add_progress_event("stale", "generate", "fresh")
+        self.manager.add_progress_event(
+            "live", "verify", "fresh", metadata={"score": 0.5, "verification": "y" * 10000}
+        )
+
+        report = self.manager.run_maintenance(now=now + timedelta(days=2))
+
+        self.assertEqual(report["archived_documents"], ["done"])
+        self.assertEqual(report["expired_rows"]["progress_events"], 5)
+        self.assertEqual(report["compacted_rows"]["progress_events"], 1)
+        self.assertEqual([event["message"] for event in self.manager.get_progress_events("stale")], ["fresh"])
+        live_metadata = self.manager.get_progress_events("live")[0]["metadata"]
+        self.assertEqual(live_metadata["score"], 0.5)
+        self.assertEqual(list(live_metadata["_compacted_keys"]), ["verification"])
+
+        self.assertEqual(self.manager.get_history("done"), [])
+        archive = self.manager.read_archive("done")
+        self.assertEqual(archive["history"][0]["content"], "final")
+        self.assertEqual(len(archive["progress_events"]), 2)
+
+        stats = self.manager.get_storage_stats()
+        self.assertEqual(stats["auto_vacuum"], "incremental")
+        self.assertEqual(stats["tables"]["progress_events"]["rows"], 2)
+        self.assertEqual(stats["archive"]["documents"], 1)
+        self.assertIs(stats["last_maintenance"], report)
+
+    def test_rows_are_not_expired_or_compacted_by_default(self):
+        old = "2020-01-01T00:00:00"
+        self.manager.add_progress_event("doc", "generate", "old", metadata={"verification": "y" * 10000})
+        self.manager.create_subsection_tracking("doc", "s1", "ss1", "outline")
+        self.manager._connect().execute("UPDATE progress_events SET timestamp = ?", (old,))
+        self.manager._connect().execute("UPDATE subsection_tracking SET updated_at = ?", (old,))
+        self.manager._connect().commit()
+
+        report = self.manager.run_maintenance(now=datetime.now() + timedelta(days=400))
+
+        self.assertEqual(report["expired_rows"], {})
+        self.assertEqual(report["compacted_rows"], {})
+        self.assertEqual(len(self.manager.get_progress_events("doc")[0]["metadata"]["verification"]), 10000)
+        self.assertIsNotNone(self.manager.get_subsection_tracking("doc", "s1", "ss1"))
+
+    @patch("history_store.METADATA_COMPACT_AFTER_HOURS", 24)
+    def test_compaction_keeps_metadata_read_by_other_services(self):
+        sources = [{"title": f"paper {i}", "url": f"https://example.org/{i}", "snippet": "z" * 300} for i in range(20)]
+        self.manager.add_entries(
+            [
+                {"document_id": "doc", "section_id": "s1", "subsection_id": "ss1", "content": "final",
+                 "timestamp": "2020-01-01T00:00:00", "metadata": {"source_results": sources, "debug": "d" * 5000}}
+            ]
+        )
+
+        report = self.manager.run_maintenance(now=datetime.now())
+
+        self.assertEqual(report["compacted_rows"]["history"], 1)
+        metadata = self.manager.get_history("doc")[0]["metadata"]
+        self.assertEqual(metadata["source_results"], sources)
+        self.assertEqual(list(metadata["_compacted_keys"]), ["debug"])
+
+    def test_completed_documents_are_not_archived_by_default(self):
+        old = "2020-01-01T00:00:00"
+        self.manager.add_progress_event("done", "document_complete", "ok")
+        self.manager._connect().execute("UPDATE progress_events SET timestamp = ?", (old,))
+        self.manager._connect().commit()
+        self.manager.add_entries(
+            [{"document_id": "done", "section_id": "s1", "subsection_id": "ss1", "content": "final", "timestamp": old}]
+        )
+
+        report = self.manager.run_maintenance(now=datetime.now() + timedelta(days=2))
+
+        self.assertEqual(report["archived_documents"], [])
+        self.assertEqual(self.manager.get_history_text("done"), "final")
+        self.assertIsNone(self.manager.read_archive("done"))
+
+    def test_full_vacuum_conversion_is_explicit(self):
+        self.manager.close()
+        legacy_path = str(Path(self._tmp.name) / "legacy.db")
+        legacy = sqlite3.connect(legacy_path)
+        legacy.execute("CREATE TABLE legacy_notes (id INTEGER PRIMARY KEY)")
+        legacy.commit()
+        legacy.close()
+        self.manager = HistoryManager(use_database=True, db_path=legacy_path)
+
+        report = self.manager.run_maintenance()
+        self.assertEqual((report["vacuum"]["converted_to_incremental"], report["vacuum"]["needs_conversion"]), (False, True))
+        self.assertEqual(self.manager.get_storage_stats()["auto_vacuum"], "none")
+
+        report = self.manager.run_maintenance(convert_vacuum=True)
+        self.assertTrue(report["vacuum"]["converted_to_incremental"])
+        self.assertEqual(self.manager.get_storage_stats()["auto_vacuum"], "incremental")
+
+    def test_unknown_projection_field_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.manager.get_history("doc", fields=["content", "secret"])
+        with self.assertRaises(ValueError):
+            self.manager.get_progress_events("doc", fields=["metadata.a') OR 1 --"])
+
+    def test_schema_is_checked_once(self):
+        self.manager.save_outline("doc", "outline v1")
+        with patch.object(self.manager, "_init_database") as init_database:
+            self.manager.save_outline("doc", "outline v2")
+            self.assertEqual(self.manager.get_outline("doc"), "outline v2")
+        init_database.assert_not_called()
+
+
+class ShardedDatabaseTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.db_path = str(Path(self._tmp.name) / "history.db")
+        self.manager = HistoryManager(use_database=True, db_path=self.db_path, shards=4)
+
+    def tearDown(self):
+        self.manager.close()
+        self._tmp.cleanup()
+
+    def _documents_in_different_shards(self):
+        first = "doc-0"
+        second = next(
+            f"doc-{i}" for i in range(1, 100) if self.manager._shard_index(f"doc-{i}") != self.manager._shard_index(first)
+        )
+        return first, second
+
+    def test_documents_are_stored_in_shard_files_and_catalogued(self):
+        documents = [f"doc-{i}" for i in range(8)]
+        for document_id in documents:
+            self.manager.add_entry(document_id, "s1", "ss1", f"content of {document_id}")
+            self.manager.add_progress_event(document_id, "generate", document_id)
+
+        for document_id in documents:
+            self.assertEqual(self.manager.get_history_text(document_id), f"content of {document_id}")
+            self.assertEqual([event["message"] for event in self.manager.get_progress_events(document_id)], [document_id])
+        self.assertEqual(self.manager.list_documents(), documents)
+
+        main = sqlite3.connect(self.db_path)
+        self.assertEqual(main.execute("SELECT COUNT(*) FROM progress_events").fetchone()[0], 0)
+        main.close()
+        stats = self.manager.get_storage_stats()
+        self.assertEqual(stats["tables"]["progress_events"]["rows"], 8)
+        self.assertEqual(stats["shards"]["documents"], 8)
+        self.assertGreater(len(stats["shards"]["files"]), 1)
+
+    def test_writers_on_different_shards_do_not_block(self):
+        first, second = self._documents_in_different_shards()
+        self.manager.add_progress_event(first, "generate", "registered")
+        self.manager.add_progress_event(second, "generate", "registered")
+
+        blocker = sqlite3.connect(self.manager._document_path(first))
+        blocker.execute("BEGIN IMMEDIATE")
+        try:
+            self.manager.add_progress_event(second, "verify", "written while the other shard is locked")
+        finally:
+            blocker.rollback()
+            blocker.close()
+        self.assertEqual(len(self.manager.get_progress_events(second)), 2)
+
+    def test_mixed_document_batch_keeps_input_order(self):
+        first, second = self._documents_in_different_shards()
+        notified = []
+        self.manager.add_progress_listener(lambda document_id, event_id: notified.append((document_id, event_id)))
+        event_ids = self.manager.add_progress_events(
+            [
+                {"document_id": first, "stage": "generate", "message": "a1"},
+                {"document_id": second, "stage": "generate", "message": "b1"},
+                {"document_id": first, "stage": "verify", "message": "a2"},
+            ]
+        )
+        self.assertEqual([event["id"] for event in self.manager.get_progress_events(first)], [event_ids[0], event_ids[2]])
+        self.assertEqual([event["id"] for event in self.manager.get_progress_events(second)], [event_ids[1]])
+        self.assertEqual(sorted(notified), sorted([(first, event_ids[2]), (second, event_ids[1])]))
+
+    def test_documents_written_before_sharding_stay_in_main_file(self):
+        self.manager.close()
+        legacy_path = str(Path(self._tmp.name) / "legacy.db")
+        unsharded = HistoryManager(use_database=True, db_path=legacy_path)
+        unsharded.add_entry("legacy", "s1", "ss1", "before sharding")
+        unsharded.close()
+
+        self.manager = HistoryManager(use_database=True, db_path=legacy_path, shards=4)
+        self.manager.add_entry("legacy", "s1", "ss2", "after sharding")
+        self.manager.add_entry("fresh", "s1", "ss1", "new document")
+        self.assertEqual(self.manager.get_history_text("legacy", separator="|"), "before sharding|after sharding")
+        self.assertEqual(self.manager._document_path("legacy"), legacy_path)
+        self.assertNotEqual(self.manager._document_path("fresh"), legacy_path)
+        self.assertEqual(self.manager.list_documents(), ["fresh", "legacy"])
+
+    @patch("history_store.ARCHIVE_AFTER_HOURS", 24)
+    @patch.dict("history_store.RETENTION_DAYS", {"progress_events": 14})
+    def test_maintenance_runs_on_every_shard(self):
+        old = "2020-01-01T00:00:00"
+        first, second = self._documents_in_different_shards()
+        self.manager.add_progress_events(
+            [{"document_id": first, "stage": "generate", "message": f"m{i}", "timestamp": old} for i in range(3)]
+        )
+        self.manager.add_progress_event(first, "generate", "fresh")
+        self.manager.add_progress_events(
+            [
+                {"document_id": second, "stage": "generate", "message": "done", "timestamp": old},
+                {"document_id": second, "stage": "document_complete", "message": "ok", "timestamp": old},
+            ]
+        )
+
+        report = self.manager.run_maintenance(now=datetime.now() + timedelta(days=2))
+
+        self.assertEqual(report["archived_documents"], [second])
+        self.assertEqual(report["expired_rows"]["progress_events"], 3)
+        self.assertEqual(len(report["shard_vacuum"]), 2)
+        self.assertEqual([event["message"] for event in self.manager.get_progress_events(first)], ["fresh"])
+        self.assertEqual(len(self.manager.read_archive(second)["progress_events"]), 2)
+
+
+class MemoryModeTests(unittest.TestCase):
+    def _exercise(self, manager):
+        observed = []
+        manager.add_entries(
+            [
+                {"document_id": "doc", "section_id": "s1", "subsection_id": f"ss{i}", "content": f"c{i}", "metadata": {"relevancy_index": i}}
+                for i in range(3)
+            ]
+        )
+        manager.add_entry("other", "s1", "ss1", "other document")
+        observed.append([(entry["content"], entry["metadata"]) for entry in manager.get_history("doc")])
+        observed.append(manager.get_statistics("doc")["avg_relevancy_index"])
+        observed.append(manager.get_history("doc", fields=["subsection_id", "metadata.relevancy_index", "metadata.missing"]))
+
+        manager.save_outline("doc", "outline v1")
+        manager.save_outline("doc", "outline v2")
+        manager.save_outline("doc", "section outline", outline_type="section", section_id="s1")
+        manager.save_outline("doc", "subsection outline", outline_type="subsection", section_id="s1", subsection_id="ss1")
+        observed.append(
+            [
+                manager.get_outline("doc"),
+                manager.get_outline("doc", "section", "s1"),
+                manager.get_outline("doc", "subsection", "s1", "ss1"),
+                manager.get_outline("doc", "section", "s2"),
+            ]
+        )
+
+        manager.create_subsection_tracking("doc", "s1", "ss1", "outline")
+        manager.update_subsection_content("doc", "s1", "ss1", generated_content="draft", is_passed=True, metadata={"k": 1})
+        manager.update_subsection_content("doc", "s1", "missing", generated_content="ignored")
+        tracking = manager.get_subsection_tracking("doc", "s1", "ss1")
+        observed.append({key: value for key, value in tracking.items() if key not in ("created_at", "updated_at")})
+        observed.append(manager.get_subsection_tracking("doc", "s1", "missing"))
+        observed.append(manager.get_subsection_tracking("doc", "s1", "ss1", fields=["is_passed", "metadata.k"]))
+
+        for order_index, content in ((2, "B"), (1, "A"), (1, "A2")):
+            manager.add_passed_history("doc", "s1", content, content, order_index)
+        observed.append(manager.get_passed_history_text("doc", separator="|"))
+
+        event_ids = manager.add_progress_events([{"document_id": "doc", "stage": "generate", "message": str(i)} for i in range(5)])
+        manager.add_progress_event("other", "generate", "other document")
+        observed.append([event["message"] for event in manager.get_progress_events("doc", after_id=event_ids[1], limit=2)])
+        manager.add_progress_events(
+            [
+                {"document_id": "doc", "stage": stage, "message": f"{stage}-{i}", "metadata": {"score": i, "blob": "x" * 100}}
+                for i in range(3)
+                for stage in ("verifier_result", "subsection_passed")
+            ]
+        )
+        passed = manager.get_progress_events("doc", stages=["subsection_passed"], limit=2, fields=["message", "metadata.score"])
+        observed.append([(event["message"], event["metadata"]) for event in passed])
+        observed.append(
+            [event["message"] for event in manager.get_progress_events("doc", after_id=passed[-1]["id"], stages=["subsection_passed"])]
+        )
+
+        # 写入后修改调用方的 metadata、修改读出的记录，都不应影响存储（数据库模式天然如此）
+        metadata = {"sources": [{"url": "a"}]}
+        manager.add_entry("iso", "s1", "ss1", "content", metadata=metadata)
+        manager.add_progress_event("iso", "generate", "event", metadata=metadata)
+        manager.create_subsection_tracking("iso", "s1", "ss1", "outline")
+        manager.update_subsection_content("iso", "s1", "ss1", metadata=metadata)
+        metadata["sources"].append({"url": "caller"})
+        for record in (
+            manager.get_history("iso")[0],
+            manager.get_progress_events("iso")[0],
+            manager.get_subsection_tracking("iso", "s1", "ss1"),
+        ):
+            record["metadata"]["sources"].append({"url": "reader"})
+        observed.append(
+            [
+                manager.get_history("iso")[0]["metadata"],
+                manager.get_progress_events("iso")[0]["metadata"],
+                manager.get_subsection_tracking("iso", "s1", "ss1")["metadata"],
+            ]
+        )
+
+        manager.clear_progress_events("doc")
+        manager.clear_passed_history("doc")
+        manager.clear_history("doc")
+        observed.append((manager.get_progress_events("doc"), manager.get_passed_history("doc"), manager.get_history("doc")))
+        observed.append(len(manager.get_history("other")))
+        return observed
+
+    def test_memory_mode_matches_database_mode(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            database = HistoryManager(use_database=True, db_path=str(Path(tmp) / "history.db"))
+            expected = self._exercise(database)
+            database.close()
+        self.assertEqual(self._exercise(HistoryManager(use_database=False, snapshot_path="")), expected)
+
+    def test_sharded_database_matches_memory_mode(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            sharded = HistoryManager(use_database=True, db_path=str(Path(tmp) / "history.db"), shards=4)
+            observed = self._exercise(sharded)
+            sharded.close()
+        self.assertEqual(observed, self._exercise(HistoryManager(use_database=False, snapshot_path="")))
+
+    def test_memory_event_ids_are_monotonic_across_documents(self):
+        manager = HistoryManager(use_database=False, snapshot_path="")
+        first = manager.add_progress_event("doc-a", "generate", "a")
+        second = manager.add_progress_event("doc-b", "generate", "b")
+        third = manager.add_progress_event("doc-a", "verify", "a2")
+        self.assertEqual([first, second, third], [1, 2, 3])
+        self.assertEqual([event["id"] for event in manager.get_progress_events("doc-a", after_id=first)], [third])
+
+    def test_snapshot_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            snapshot = str(Path(tmp) / "history.json")
+            manager = HistoryManager(use_database=False, snapshot_path=snapshot)
+            manager.add_entry("doc", "s1", "ss1", "content")
+            manager.save_outline("doc", "outline", outline_type="section", section_id="s1")
+            manager.create_subsection_tracking("doc", "s1", "ss1", "outline")
+            manager.add_passed_history("doc", "s1", "ss1", "passed", 0)
+            last_id = manager.add_progress_event("doc", "generate", "done")
+            self.assertTrue(manager.save_snapshot())
+
+            restored = HistoryManager(use_database=False, snapshot_path=snapshot)
+            self.assertEqual(restored.get_history_text("doc"), "content")
+            self.assertEqual(restored.get_outline("doc", "section", "s1"), "outline")
+            self.assertEqual(restored.get_subsection_tracking("doc", "s1", "ss1")["outline"], "outline")
+            self.assertEqual(restored.get_passed_history_text("doc"), "passed")
+            self.assertEqual(restored.add_progress_event("doc", "verify", "next"), last_id + 1)
+            self.assertEqual([event["message"] for event in restored.get_progress_events("doc", after_id=last_id)], ["next"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -22,6 +22,7 @@ except Exception:
     _HAS_ST = False
 
 from history_store import HistoryManager
+from domain_authority import DomainSuffixTrie, get_domain_authority
 
 # 英文停用词表：过滤高频功能词，只保留实义词参与计算
 _EN_STOPWORDS = {
@@ -74,6 +75,8 @@ class FlowerNetVerifier:
                 self.reference_blacklist = {}
         except Exception:
             self.reference_blacklist = {}
+        self.domain_authority = get_domain_authority()
+        self._blacklisted_domains = self._configured_blacklist_domains()
 
         # 备选默认敏感词集合（用于快速过滤明显跨学科来源）
         self._math_terms = {
@@ -964,6 +967,21 @@ class FlowerNetVerifier:
                         })
         return entries
 
+    def _configured_blacklist_domains(self) -> DomainSuffixTrie:
+        trie = DomainSuffixTrie()
+        if not isinstance(self.reference_blacklist, dict):
+            return trie
+        raw_domains = self.reference_blacklist.get("domains") or []
+        if isinstance(raw_domains, list):
+            for item in raw_domains:
+                if isinstance(item, str):
+                    trie.insert(item, "configured_domain")
+                elif isinstance(item, dict):
+                    domain = str(item.get("domain") or "").strip()
+                    if domain:
+                        trie.insert(domain, str(item.get("type") or "configured_domain"))
+        return trie
+
     def _referenced_source_items(
         self,
         refs: List[int],
@@ -1055,38 +1073,42 @@ class FlowerNetVerifier:
             text = f"{title}\n{body}"
             text_lower = text.lower()
 
-            for entry in configured_blacklist:
-                keyword = str(entry.get("keyword", "")).lower()
-                if keyword and keyword in text_lower:
-                    blacklist_matches.append({
-                        "index": idx,
-                        "href": item.get("href", ""),
-                        "title": item.get("title", ""),
-                        "match": entry.get("keyword", ""),
-                        "type": entry.get("type", "configured"),
-                    })
-                    break
+            domain_hit = self._blacklisted_domains.longest_match(str(item.get("href", "") or ""))
+            if domain_hit:
+                blacklist_matches.append({
+                    "index": idx,
+                    "href": item.get("href", ""),
+                    "title": item.get("title", ""),
+                    "match": domain_hit[0],
+                    "type": domain_hit[1],
+                })
+            else:
+                for entry in configured_blacklist:
+                    keyword = str(entry.get("keyword", "")).lower()
+                    if keyword and keyword in text_lower:
+                        blacklist_matches.append({
+                            "index": idx,
+                            "href": item.get("href", ""),
+                            "title": item.get("title", ""),
+                            "match": entry.get("keyword", ""),
+                            "type": entry.get("type", "configured"),
+                        })
+                        break
 
             if len(topic_term_set) < min_topic_terms_for_mismatch:
                 continue
 
             domain_score = self._source_relevance_score(item, outline_tokens, topic_term_set)
-            href = str(item.get("href", "") or "").lower()
-            source_name = str(item.get("source", "") or "").lower()
+            href = str(item.get("href", "") or "")
+            source_name = str(item.get("source", "") or "")
             semantic_source_score = self._safe_float(item.get("semantic_score"), 0.0)
             topic_source_score = self._safe_float(item.get("topic_alignment_score"), 0.0)
             trusted_technical_source = (
                 bool(item.get("curated_seed"))
                 or semantic_source_score >= 0.18
                 or topic_source_score >= 0.18
-                or any(
-                    domain in href or domain in source_name
-                    for domain in (
-                        "arxiv.org", "acm.org", "ieee.org", "aclweb.org",
-                        "openreview.net", "proceedings.neurips.cc", "proceedings.mlr.press",
-                        "doi.org",
-                    )
-                )
+                or self.domain_authority.has_tag(href, "technical")
+                or self.domain_authority.has_tag(source_name, "technical")
             )
             if trusted_technical_source:
                 continue
@@ -1519,7 +1541,7 @@ async def perform_verification(request: VerifyRequest):
         history_list = request.history
         if (not history_list) and request.document_id:
             history_manager = get_history_manager()
-            history_records = history_manager.get_history(request.document_id)
+            history_records = history_manager.get_history(request.document_id, fields=["content"])
             history_list = [entry["content"] for entry in history_records]
         # 调用 verifier.py 中的 verify 方法
         result = verifier.verify(
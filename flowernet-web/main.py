@@ -57,6 +57,9 @@ _OUTLINER_DIR = os.path.join(_REPO_ROOT, "flowernet-outliner")
 if _OUTLINER_DIR not in sys.path and os.path.isdir(_OUTLINER_DIR):
     sys.path.insert(0, _OUTLINER_DIR)
 
+from domain_authority import get_domain_authority
+from http_cassette import install_cassette
+
 # 导入 Citation Verifier 用于引证质量控制
 try:
     from citation_verifier import CitationVerifier, verify_references
@@ -250,6 +253,7 @@ DOWNSTREAM_SESSION = requests.Session()
 DOWNSTREAM_SESSION.trust_env = False
 CITATION_HTTP_SESSION = requests.Session()
 CITATION_HTTP_SESSION.trust_env = False
+install_cassette(CITATION_HTTP_SESSION)
 
 POFFICES_TASKS: Dict[str, Dict[str, Any]] = {}
 POFFICES_TASKS_LOCK = threading.Lock()
@@ -1374,11 +1378,18 @@ def call_outliner_generate_and_save(payload: Dict[str, Any], timeout: int) -> Di
     }
 
 
-def fetch_history_items(document_id: str, timeout_seconds: int = 60) -> List[Dict[str, Any]]:
+def fetch_history_items(
+    document_id: str,
+    timeout_seconds: int = 60,
+    fields: Optional[List[str]] = None,
+) -> List[Dict[str, Any]]:
+    payload: Dict[str, Any] = {"document_id": document_id}
+    if fields:
+        payload["fields"] = fields
     try:
         history_resp = post_json_with_retry(
             f"{OUTLINER_URL}/history/get",
-            {"document_id": document_id},
+            payload,
             timeout_seconds,
         )
         if history_resp.get("success") and isinstance(history_resp.get("history"), list):
@@ -1388,18 +1399,52 @@ def fetch_history_items(document_id: str, timeout_seconds: int = 60) -> List[Dic
     return []
 
 
-def fetch_progress_events(document_id: str, timeout_seconds: int = 30, limit: int = 1000) -> List[Dict[str, Any]]:
+def fetch_progress_events(
+    document_id: str,
+    timeout_seconds: int = 30,
+    limit: int = 1000,
+    stages: Optional[List[str]] = None,
+    fields: Optional[List[str]] = None,
+) -> List[Dict[str, Any]]:
+    """按 500 条一页（outliner 单次上限）增量拉取进度事件，最多 limit 条；stages/fields 在 outliner 端过滤。"""
+    events: List[Dict[str, Any]] = []
+    after_id = 0
     try:
-        events_resp = post_json_with_retry(
-            f"{OUTLINER_URL}/history/progress",
-            {"document_id": document_id, "after_id": 0, "limit": limit},
-            timeout_seconds,
-        )
-        events = events_resp.get("events") if isinstance(events_resp, dict) else []
-        return events if isinstance(events, list) else []
+        while len(events) < limit:
+            payload: Dict[str, Any] = {
+                "document_id": document_id,
+                "after_id": after_id,
+                "limit": min(500, limit - len(events)),
+            }
+            if stages:
+                payload["stages"] = stages
+            if fields:
+                payload["fields"] = fields
+            events_resp = post_json_with_retry(f"{OUTLINER_URL}/history/progress", payload, timeout_seconds)
+            page = events_resp.get("events") if isinstance(events_resp, dict) else []
+            if not isinstance(page, list) or not page:
+                break
+            events.extend(page)
+            after_id = int(page[-1].get("id", after_id))
+            if len(page) < payload["limit"]:
+                break
     except Exception as e:
         print(f"获取进度事件失败: {e}")
-    return []
+    return events
+
+
+# extract_quality_metrics_from_progress_events 只读取这些阶段和 metadata 键
+QUALITY_METRIC_STAGES = ["verifier_result", "controller_result"]
+QUALITY_METRIC_FIELDS = [
+    "stage",
+    "metadata.quality_score",
+    "metadata.quality_dimensions",
+    "metadata.unieval_fallback",
+    "metadata.selected_arm",
+    "metadata.chosen_arm",
+    "metadata.reward",
+    "metadata.selection_mode",
+]
 
 
 def extract_quality_metrics_from_progress_events(events: List[Dict[str, Any]]) -> Dict[str, Any]:
@@ -1499,7 +1544,12 @@ def _recover_partial_document(document_id: str, attempts: int = 5, timeout_secon
         history_items = fetch_history_items(document_id=document_id, timeout_seconds=timeout_seconds)
         if history_items:
             title, structure = _load_document_structure(document_id=document_id, history=history_items)
-            progress_events = fetch_progress_events(document_id=document_id, timeout_seconds=timeout_seconds)
+            progress_events = fetch_progress_events(
+                document_id=document_id,
+                timeout_seconds=timeout_seconds,
+                stages=QUALITY_METRIC_STAGES,
+                fields=QUALITY_METRIC_FIELDS,
+            )
             progress_metrics = extract_quality_metrics_from_progress_events(progress_events)
             markdown_content = build_markdown_document(
                 title=title,
@@ -2173,36 +2223,7 @@ def _extract_urls(text: str) -> List[str]:
 
 
 def _domain_quality(domain: str) -> float:
-    host = (domain or "").lower().strip()
-    if not host:
-        return 0.0
-
-    high_quality_domains = {
-        "nature.com", "science.org", "sciencedirect.com", "springer.com", "ieee.org", "acm.org",
-        "arxiv.org", "doi.org", "crossref.org", "pubmed.ncbi.nlm.nih.gov", "ncbi.nlm.nih.gov",
-        "who.int", "oecd.org", "un.org", "nist.gov", "nih.gov", "wiley.com", "onlinelibrary.wiley.com",
-        "tandfonline.com", "sagepub.com", "cambridge.org", "cambridge.org", "oxfordacademic.com",
-        "academic.oup.com", "jstor.org", "cell.com", "thelancet.com", "nejm.org", "bmj.com",
-        "gov.cn", "edu.cn", "ruc.edu.cn", "tsinghua.edu.cn", "pku.edu.cn", "cass.cn", "moe.gov.cn",
-    }
-    low_quality_domains = {
-        "baike.baidu.com", "zhidao.baidu.com", "tieba.baidu.com", "jingyan.baidu.com",
-        "m.baidu.com", "weibo.com", "t.co", "bit.ly", "tinyurl.com", "researchgate.net",
-    }
-
-    if host in low_quality_domains:
-        return 0.15
-    if host in high_quality_domains:
-        return 1.0
-    if host.endswith(".gov") or host.endswith(".edu") or host.endswith(".gov.cn") or host.endswith(".edu.cn"):
-        return 0.95
-    if "wikipedia.org" in host:
-        return 0.55
-    if host.endswith(".org"):
-        return 0.72
-    if host.endswith(".com"):
-        return 0.60
-    return 0.5
+    return get_domain_authority().score(domain, profile="citation_qa")
 
 
 def _citation_quality_check(markdown: str) -> Dict[str, Any]:
@@ -6277,16 +6298,21 @@ def generate_stream(req: GenerateDocRequest) -> Generator[str, None, None]:
         timeout = time.time() + stream_timeout
         last_progress_update = time.time()
         last_keepalive = time.time()
+        last_history_poll = 0.0
+        progress_wait_supported = True
 
         while gen_thread.is_alive() and time.time() < timeout:
             try:
-                # 查询当前生成的小节数
-                history_resp = DOWNSTREAM_SESSION.post(
-                    f"{OUTLINER_URL}/history/get",
-                    json={"document_id": document_id},
-                    timeout=10
-                )
-                if history_resp.status_code == 200:
+                # 查询当前生成的小节数（事件长轮询可能很快返回，小节数仍按 2 秒节奏查询）
+                history_resp = None
+                if time.time() - last_history_poll >= 2:
+                    last_history_poll = time.time()
+                    history_resp = DOWNSTREAM_SESSION.post(
+                        f"{OUTLINER_URL}/history/get",
+                        json={"document_id": document_id, "fields": ["subsection_id"]},
+                        timeout=10
+                    )
+                if history_resp is not None and history_resp.status_code == 200:
                     history = history_resp.json().get("history", [])
                     current_count = len(history)
 
@@ -6325,12 +6351,22 @@ def generate_stream(req: GenerateDocRequest) -> Generator[str, None, None]:
                         yield f"data: {heartbeat}\n\n"
                         last_keepalive = time.time()
 
-                # 查询流程细节事件
-                events_resp = DOWNSTREAM_SESSION.post(
-                    f"{OUTLINER_URL}/history/progress",
-                    json={"document_id": document_id, "after_id": last_event_id, "limit": 200},
-                    timeout=10,
-                )
+                # 查询流程细节事件：长轮询，有新事件立即返回，否则最多等待 2 秒
+                if progress_wait_supported:
+                    events_resp = DOWNSTREAM_SESSION.post(
+                        f"{OUTLINER_URL}/history/progress/wait",
+                        json={"document_id": document_id, "after_id": last_event_id, "limit": 200, "timeout_seconds": 2},
+                        timeout=10,
+                    )
+                    if events_resp.status_code == 404:
+                        # 旧版 outliner 没有长轮询接口，退回定时拉取
+                        progress_wait_supported = False
+                if not progress_wait_supported:
+                    events_resp = DOWNSTREAM_SESSION.post(
+                        f"{OUTLINER_URL}/history/progress",
+                        json={"document_id": document_id, "after_id": last_event_id, "limit": 200},
+                        timeout=10,
+                    )
                 if events_resp.status_code == 200:
                     events = events_resp.json().get("events", [])
                     for event_item in events:
@@ -6354,14 +6390,19 @@ def generate_stream(req: GenerateDocRequest) -> Generator[str, None, None]:
                         last_event_id = max(last_event_id, int(event_item.get("id", 0)))
             except Exception as e:
                 print(f"查询进度异常: {e}")
+                time.sleep(2)
+                continue
 
-            time.sleep(2)  # 每2秒检查一次
+            if not progress_wait_supported or events_resp.status_code != 200:
+                # 定时拉取每2秒检查一次；长轮询接口出错（如 outliner 500）时同样退避，避免空转请求
+                time.sleep(2)
 
         # 等待线程结束（最多等待10秒）
         gen_thread.join(timeout=10)
 
         if error_occurred:
-            history_items = fetch_history_items(document_id=document_id, timeout_seconds=30)
+            # 这里只用条数判断，正文由 _recover_partial_document 重新读取
+            history_items = fetch_history_items(document_id=document_id, timeout_seconds=30, fields=["subsection_id"])
             if history_items:
                 recovered = _recover_partial_document(document_id=document_id, attempts=1, timeout_seconds=30)
                 if recovered.get("success") and recovered.get("content"):
@@ -6396,7 +6437,7 @@ def generate_stream(req: GenerateDocRequest) -> Generator[str, None, None]:
             try:
                 history_resp = DOWNSTREAM_SESSION.post(
                     f"{OUTLINER_URL}/history/get",
-                    json={"document_id": document_id},
+                    json={"document_id": document_id, "fields": ["subsection_id"]},
                     timeout=10
                 )
                 if history_resp.status_code == 200:
@@ -6426,7 +6467,8 @@ def generate_stream(req: GenerateDocRequest) -> Generator[str, None, None]:
                 return
 
         if not gen_resp.get("success"):
-            history_items = fetch_history_items(document_id=document_id, timeout_seconds=30)
+            # 这里只用条数判断，正文由 _recover_partial_document 重新读取
+            history_items = fetch_history_items(document_id=document_id, timeout_seconds=30, fields=["subsection_id"])
             if history_items:
                 recovered = _recover_partial_document(document_id=document_id, attempts=1, timeout_seconds=30)
                 if len(history_items) >= req.chapter_count * req.subsection_count and recovered.get("content"):
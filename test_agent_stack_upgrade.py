@@ -1,3 +1,5 @@
+import pytest
+
 from flowernet_agent_stack import (
     agent_stack_capabilities,
     get_checkpoint_store,
@@ -50,3 +52,416 @@ def test_checkpoint_eval_tools_and_graph():
     caps = agent_stack_capabilities()
     assert "vector_store" in caps
     assert "tools" in caps
+
+
+def test_sqlite_checkpoint_store_ttl_sweep_and_legacy_import(monkeypatch, tmp_path):
+    import json
+    import threading
+    import time
+
+    import flowernet_agent_stack
+    from flowernet_agent_stack import CheckpointStore
+
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    monkeypatch.setenv("FLOWERNET_CHECKPOINT_SWEEP_SECONDS", "0")
+    monkeypatch.setattr(flowernet_agent_stack, "DEFAULT_STATE_DIR", tmp_path)
+    (tmp_path / "checkpoints.json").write_text(
+        json.dumps(
+            {
+                "legacy:live": {"value": {"task": 1}, "updated_at": time.time(), "ttl_seconds": 3600},
+                "legacy:stale": {"value": {"task": 2}, "updated_at": time.time() - 100, "ttl_seconds": 10},
+            }
+        ),
+        encoding="utf-8",
+    )
+    store = CheckpointStore()
+    assert store.capabilities()["active_backend"] == "sqlite"
+    assert store.get("legacy:live") == {"task": 1} and store.get("legacy:stale") is None
+    assert (tmp_path / "checkpoints.json.migrated").exists()
+
+    def _writer(offset):
+        for i in range(50):
+            store.set(f"task:{offset + i}", {"n": offset + i})
+
+    threads = [threading.Thread(target=_writer, args=(n * 50,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    store.set("short", {"status": "running"}, ttl_seconds=0.05)
+    other = CheckpointStore()  # a second handle on the same WAL database
+    assert other.get("task:199") == {"n": 199} and other.get("short") == {"status": "running"}
+    time.sleep(0.1)
+    assert other.get("short") is None
+    assert store.sweep() == 2  # the expired short-lived key plus the stale legacy entry
+    assert other.get("task:0") == {"n": 0}
+
+
+def test_durable_task_queue_leases_retries_and_multiple_processes(monkeypatch, tmp_path):
+    import json
+    import subprocess
+    import sys
+    import time
+
+    import flowernet_agent_stack
+    from flowernet_agent_stack import TaskQueue
+
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    monkeypatch.setattr(flowernet_agent_stack, "DEFAULT_STATE_DIR", tmp_path / "state")
+    db_path = str(tmp_path / "tasks.sqlite3")
+    monkeypatch.setenv("FLOWERNET_TASK_QUEUE_DB", db_path)
+    producer = TaskQueue("test:jobs")
+    assert not (tmp_path / "state").exists()  # a configured path never creates the default state dir
+    assert producer.capabilities()["active_backend"] == "sqlite"
+    producer.put({"job": "crash"}, max_attempts=2)
+
+    first = producer.lease(timeout=0, lease_seconds=0.05)
+    assert first["item"] == {"job": "crash"} and first["attempts"] == 1
+    assert producer.lease(timeout=0) is None  # invisible while leased
+    time.sleep(0.1)  # the consumer "died": the lease runs out and the task is redelivered
+    second = TaskQueue("test:jobs", db_path=db_path).lease(timeout=0, lease_seconds=0.05)
+    assert second["receipt"] == first["receipt"] and second["attempts"] == 2
+    assert not producer.ack(first["receipt"])  # the stale owner lost the lease
+    time.sleep(0.1)
+    assert producer.lease(timeout=0) is None
+    assert producer.counts() == {"dead": 1}
+
+    producer.put({"job": "flaky"})
+    leased = producer.lease(timeout=0)
+    assert producer.nack(leased["receipt"], error="http_503")
+    assert producer.lease(timeout=0)["attempts"] == 2
+
+    for i in range(40):
+        producer.put({"job": i})
+    consumer = (
+        "import json, sys\n"
+        "from flowernet_agent_stack import TaskQueue\n"
+        "q = TaskQueue('test:jobs', db_path=sys.argv[1])\n"
+        "seen = []\n"
+        "while True:\n"
+        "    leased = q.lease(timeout=0.5)\n"
+        "    if leased is None:\n"
+        "        break\n"
+        "    seen.append(leased['item']['job'])\n"
+        "    q.ack(leased['receipt'])\n"
+        "print(json.dumps(seen))\n"
+    )
+    workers = [
+        subprocess.Popen([sys.executable, "-c", consumer, db_path], stdout=subprocess.PIPE, text=True)
+        for _ in range(2)
+    ]
+    seen = [job for worker in workers for job in json.loads(worker.communicate(timeout=60)[0])]
+    assert sorted(seen) == list(range(40))
+    assert producer.counts()["done"] == 40
+
+
+def test_evaluation_store_rolling_aggregates_tail_reads_and_rotation(monkeypatch, tmp_path):
+    import flowernet_agent_stack
+    from flowernet_agent_stack import EvaluationStore
+
+    monkeypatch.setattr(flowernet_agent_stack, "DEFAULT_STATE_DIR", tmp_path)
+    monkeypatch.setenv("FLOWERNET_EVAL_WINDOW", "20")
+    store = EvaluationStore()
+    for i in range(30):
+        store.record({"document_id": f"doc-{i}", "success": i % 3 != 0, "quality_score_avg": i / 100})
+    summary = store.summary()
+    assert summary["count"] == 20 and summary["total_count"] == 30
+    assert summary["quality_score_avg"] == pytest.approx(sum(range(10, 30)) / 2000)
+    assert summary["pass_rate"] == pytest.approx(sum(1 for i in range(10, 30) if i % 3) / 20)
+    assert summary["quality_score_p50"] == pytest.approx(0.19)
+    assert [row["document_id"] for row in summary["recent"]] == [f"doc-{i}" for i in range(20, 30)]
+    assert [row["document_id"] for row in store.recent(25)] == [f"doc-{i}" for i in range(5, 30)]
+
+    other = EvaluationStore()  # restart: checkpointed totals plus a backwards tail read
+    other.record({"document_id": "doc-30", "success": True, "quality_score_avg": 0.3})
+    assert store.summary()["total_count"] == 31  # the first handle folds the other writer's row
+    assert other.summary()["lifetime_pass_rate"] == store.summary()["lifetime_pass_rate"]
+    assert [row["document_id"] for row in other.recent(3)] == ["doc-28", "doc-29", "doc-30"]
+
+    monkeypatch.setenv("FLOWERNET_EVAL_ROTATE_BYTES", "1500")
+    monkeypatch.setenv("FLOWERNET_EVAL_ROTATE_KEEP", "2")
+    rotating = EvaluationStore()
+    for i in range(31, 80):
+        rotating.record({"document_id": f"doc-{i}", "success": True, "quality_score_avg": 0.5})
+    assert len(list(tmp_path.glob("llm_evaluations.jsonl.*"))) == 2
+    assert rotating.summary()["total_count"] == 80
+    assert store.summary()["total_count"] == 80
+    assert EvaluationStore().summary()["total_count"] == 80
+
+
+def test_local_matrix_index_matches_exact_scan(monkeypatch, tmp_path):
+    import flowernet_agent_stack
+    from flowernet_agent_stack import VectorRecord, VectorStore, _cosine, _embedding
+
+    monkeypatch.setattr(flowernet_agent_stack, "DEFAULT_STATE_DIR", tmp_path)
+    store = VectorStore(backend="memory", collection="test_matrix_index")
+    topics = ["alpine plant cold tolerance", "supply chain negotiation", "transformer attention memory"]
+    records = [
+        VectorRecord(
+            id=f"rec-{i}",
+            text=f"{topics[i % 3]} study {i} variant{i % 7} extra{i % 11}",
+            metadata={"namespace": f"doc-{i % 2}"},
+        )
+        for i in range(60)
+    ]
+    store.upsert(records)
+    store.upsert([VectorRecord(id="rec-0", text="alpine plant cold tolerance revised", metadata={"namespace": "doc-0"})])
+
+    query = _embedding("alpine plant cold tolerance")
+    exact = sorted(
+        (rec for rec in store._records.values() if rec.metadata["namespace"] == "doc-0"),
+        key=lambda rec: _cosine(query, _embedding(rec.text)),
+        reverse=True,
+    )
+    local = store._local_candidates(query, 5, "doc-0")
+    assert [round(hit["vector_score"], 5) for hit in local] == [
+        round(_cosine(query, _embedding(rec.text)), 5) for rec in exact[:5]
+    ]
+    assert all(hit["metadata"]["namespace"] == "doc-0" for hit in local)
+    assert store._local_candidates(query, 5, "missing") == []
+    assert len(store._records) == 60
+
+    hits = store.query("alpine plant cold tolerance", top_k=3, namespace="doc-0")
+    assert len(hits) == 3 and "alpine" in hits[0]["text"]
+
+
+def test_ivf_index_incremental_insert_and_persistence(tmp_path):
+    np = pytest.importorskip("numpy")
+    from flowernet_agent_stack import _embedding, _IVFIndex, _MatrixIndex
+
+    topics = [[f"topic{t}term{i}" for i in range(12)] for t in range(20)]
+    index = _MatrixIndex(256)
+    for i in range(400):
+        words = topics[i % 20][(i // 20) % 6:(i // 20) % 6 + 6]
+        index.add(f"rec-{i}", "global", _embedding(" ".join(words)))
+    ann = _IVFIndex(index, path=tmp_path / "rag.ivf.npz", nlist=10, nprobe=3, min_train=16)
+    ann.train()
+    index.ann = ann
+    assert ann.trained and sum(len(rows) for rows in ann.lists) == 400
+
+    query = _embedding(" ".join(topics[3][:5]))
+    exact = index.search(query, 5, exact=True)
+    approx = index.search(query, 5)
+    assert approx[0][1] == pytest.approx(exact[0][1])
+
+    index.add("rec-new", "global", _embedding(" ".join(topics[7][:6])))
+    assert sum(len(rows) for rows in ann.lists) == 401
+    ann.save()
+
+    restored = _IVFIndex(index, path=tmp_path / "rag.ivf.npz", nprobe=3)
+    assert restored.load()
+    assert np.allclose(restored.centroids, ann.centroids)
+    assert [sorted(rows) for rows in restored.lists] == [sorted(rows) for rows in ann.lists]
+
+
+def test_namespace_partitions_and_filtered_remote_queries(monkeypatch, tmp_path):
+    import flowernet_agent_stack
+    from flowernet_agent_stack import VectorRecord, VectorStore
+
+    monkeypatch.setattr(flowernet_agent_stack, "DEFAULT_STATE_DIR", tmp_path)
+    store = VectorStore(backend="memory", collection="test_namespace_partitions")
+    store.upsert(
+        VectorRecord(id=f"big-{i}", text=f"alpine plant cold tolerance field study {i}", metadata={"namespace": "big"})
+        for i in range(200)
+    )
+    store.upsert(
+        VectorRecord(id=f"small-{i}", text=f"supply chain negotiation note {i}", metadata={"namespace": "small"})
+        for i in range(3)
+    )
+    hits = store.query("alpine plant cold tolerance", top_k=3, namespace="small")
+    assert {hit["id"] for hit in hits} == {"small-0", "small-1", "small-2"}
+
+    store.upsert([VectorRecord(id="small-0", text="moved note", metadata={"namespace": "big"})])
+    assert {hit["id"] for hit in store.query("note", top_k=5, namespace="small")} == {"small-1", "small-2"}
+    if store._index is not None:
+        assert store._index.partition_sizes() == {"big": 201, "small": 2}
+
+    class _Collection:
+        def query(self, **kwargs):
+            self.kwargs = kwargs
+            return {"documents": [["doc"]], "metadatas": [[{"namespace": "small"}]], "distances": [[0.2]]}
+
+    store._collection = _Collection()
+    store.active_backend = "chroma"
+    assert store.query("note", top_k=2, namespace="small")[0]["text"] == "doc"
+    assert store._collection.kwargs["where"] == {"namespace": "small"}
+
+
+def test_quantised_index_storage_matches_float32_ranking(monkeypatch, tmp_path):
+    np = pytest.importorskip("numpy")
+    import uuid
+
+    import flowernet_agent_stack
+    from flowernet_agent_stack import VectorRecord, VectorStore, _embedding, _MatrixIndex
+
+    monkeypatch.setattr(flowernet_agent_stack, "DEFAULT_STATE_DIR", tmp_path)
+    texts = [f"alpine plant cold tolerance trial {i} site{i % 9} season{i % 4}" for i in range(300)]
+    dense = _MatrixIndex(256)
+    for i, text in enumerate(texts):
+        dense.add(f"r{i}", "doc", _embedding(text))
+    query = _embedding("alpine plant cold tolerance site3 season1")
+    exact = dense.search(query, 10)
+    for quantization, ratio in (("float16", 2), ("int8", 3)):
+        packed = _MatrixIndex(256, quantization=quantization)
+        packed.extend([f"r{i}" for i in range(300)], ["doc"] * 300, *dense.export())
+        hits = packed.search(query, 10)
+        assert dense.nbytes >= ratio * packed.nbytes
+        assert [score for _, score in hits] == pytest.approx([score for _, score in exact], abs=0.02)
+        assert np.allclose(packed.vectors(slice(0, 300)), dense.vectors(slice(0, 300)), atol=0.01)
+
+    monkeypatch.setenv("FLOWERNET_VECTOR_QUANTIZATION", "int8")
+    monkeypatch.setenv("FLOWERNET_VECTOR_COMPACT_LOG_RECORDS", "0")
+    collection = f"test_quantised_{uuid.uuid4().hex[:8]}"
+    store = VectorStore(backend="memory", collection=collection)
+    store.upsert(VectorRecord(id=f"r{i}", text=text, metadata={"namespace": "doc"}) for i, text in enumerate(texts[:40]))
+    assert '"embedding_dtype": "int8"' in store._path.read_text(encoding="utf-8").splitlines()[0]
+    assert store._records["r1"].embedding is None
+    expected = [hit["id"] for hit in store.query("alpine plant cold tolerance site3", top_k=5, namespace="doc")]
+
+    replayed = VectorStore(backend="memory", collection=collection)
+    assert [hit["id"] for hit in replayed.query("alpine plant cold tolerance site3", top_k=5, namespace="doc")] == expected
+    replayed.compact()
+    reloaded = VectorStore(backend="memory", collection=collection)
+    assert reloaded.capabilities()["quantization"] == "int8"
+    assert reloaded._index._scales[:40].tolist() == replayed._index._scales[:40].tolist()
+    assert [hit["id"] for hit in reloaded.query("alpine plant cold tolerance site3", top_k=5, namespace="doc")] == expected
+
+
+def test_pluggable_embedder_batches_caches_and_reencodes(monkeypatch, tmp_path):
+    import uuid
+
+    import flowernet_agent_stack
+    from flowernet_agent_stack import CachedEmbedder, HashEmbedder, VectorRecord, VectorStore, get_embedder
+
+    monkeypatch.setattr(flowernet_agent_stack, "DEFAULT_STATE_DIR", tmp_path)
+    class _CountingEmbedder(HashEmbedder):
+        def __init__(self, model_id):
+            super().__init__(64)
+            self.model_id = model_id
+            self.calls = []
+
+        def encode(self, texts):
+            self.calls.append(len(texts))
+            return super().encode(texts)
+
+    monkeypatch.setenv("FLOWERNET_VECTOR_COMPACT_LOG_RECORDS", "0")
+    model = _CountingEmbedder("fake-a")
+    embedder = CachedEmbedder(model)
+    collection = f"test_embedder_{uuid.uuid4().hex[:8]}"
+    store = VectorStore(backend="memory", collection=collection, embedder=embedder)
+    assert store.dim == 64
+    store.upsert(VectorRecord(id=f"r{i}", text=f"glacier moss freeze tolerance {i % 5}") for i in range(20))
+    assert model.calls == [5]  # one batch, duplicate texts encoded once
+    store.query("moss freeze tolerance", top_k=3)
+    store.query("moss freeze tolerance", top_k=3)
+    # Only the new query text reaches the model; candidates come from the shared content-hash cache.
+    assert model.calls == [5, 1]
+    store.compact()
+    store.upsert([VectorRecord(id="late", text="late alpine record")])
+
+    other = _CountingEmbedder("fake-b")
+    reopened = VectorStore(backend="memory", collection=collection, embedder=CachedEmbedder(other))
+    assert other.calls[:2] == [5, 1]  # snapshot then log re-encoded in batches
+    assert reopened.query("late alpine record", top_k=1)[0]["id"] == "late"
+
+    monkeypatch.setenv("FLOWERNET_EMBEDDER", "sentence-transformers")
+    monkeypatch.setenv("FLOWERNET_EMBEDDER_MODEL", "/nonexistent/model")
+    fallback = get_embedder(dim=48)
+    assert fallback.model_id == "hash-48"  # unloadable model falls back to the hash embedder
+
+
+def test_snapshot_compaction_and_reload(monkeypatch, tmp_path):
+    pytest.importorskip("numpy")
+    import uuid
+
+    import flowernet_agent_stack
+    from flowernet_agent_stack import VectorRecord, VectorStore
+
+    monkeypatch.setattr(flowernet_agent_stack, "DEFAULT_STATE_DIR", tmp_path)
+    monkeypatch.setenv("FLOWERNET_VECTOR_COMPACT_LOG_RECORDS", "0")
+    collection = f"test_snapshot_{uuid.uuid4().hex[:8]}"
+    store = VectorStore(backend="memory", collection=collection)
+    store.upsert(VectorRecord(id=f"r{i}", text=f"glacier moss freeze tolerance {i}", metadata={"namespace": "doc"}) for i in range(30))
+    store.upsert(VectorRecord(id=f"r{i}", text=f"glacier moss revised {i}", metadata={"namespace": "doc"}) for i in range(10))
+    assert store.capabilities()["log_records"] == 40
+
+    result = store.compact()
+    assert result == {"compacted": True, "generation": 1, "records": 30}
+    assert not store._path.exists()
+    store.upsert([VectorRecord(id="r-late", text="late alpine record", metadata={"namespace": "other"})])
+
+    reloaded = VectorStore(backend="memory", collection=collection)
+    caps = reloaded.capabilities()
+    assert caps["records"] == 31 and caps["snapshot_generation"] == 1 and caps["log_records"] == 1
+    assert reloaded._records["r3"].text == "glacier moss revised 3"
+    assert reloaded._records["r3"].embedding is None  # embeddings stay in the index matrix
+    assert reloaded.query("late alpine record", top_k=1, namespace="other")[0]["id"] == "r-late"
+    assert reloaded.query("glacier moss revised", top_k=3, namespace="doc")[0]["id"] == store.query(
+        "glacier moss revised", top_k=3, namespace="doc"
+    )[0]["id"]
+
+    assert reloaded.compact()["generation"] == 2
+    files = sorted(path.name for path in reloaded._path.parent.glob(f"{collection}*"))
+    assert files == [f"{collection}.snapshot-2.meta.jsonl", f"{collection}.snapshot-2.npy", f"{collection}.snapshot.json"]
+
+
+def test_reranker_memoises_features_and_matches_pairwise_score():
+    from flowernet_agent_stack import RAGReranker, _cosine, _embedding, _tokenize
+
+    reranker = RAGReranker(cache_size=8)
+    query = "alpine plant freeze tolerance"
+    items = [
+        {"title": "Freeze tolerance in alpine plants", "body": "Field study of supercooling.", "url": "https://doi.org/10.1/x"},
+        {"title": "Supply chain negotiation", "body": "Procurement tactics.", "quality_score": 0.9},
+        {"title": "Alpine plant phenology", "body": "Flowering time under cold stress.", "href": "https://example.org/a"},
+    ]
+    ranked = reranker.rerank(query, items, top_k=3)
+    assert ranked[0]["title"] == "Freeze tolerance in alpine plants"
+    assert reranker.cache_stats["misses"] == 4
+
+    text = "Alpine plant phenology\nFlowering time under cold stress.\nhttps://example.org/a"
+    q_tokens, d_tokens = set(_tokenize(query)), set(_tokenize(text))
+    expected = round(0.42 * len(q_tokens & d_tokens) / len(q_tokens) + 0.34 * _cosine(_embedding(query), _embedding(text)), 4)
+    assert reranker.score(query, text, {"href": "https://example.org/a"}) == expected
+    hits = reranker.cache_stats["hits"]
+    assert reranker.rerank(query, items, top_k=3) == ranked
+    assert reranker.cache_stats["hits"] == hits + 4
+
+    for i in range(20):
+        reranker.score(query, f"filler text {i}")
+    assert len(reranker._features) == 8
+
+
+def test_write_behind_indexer_coalesces_batches_and_flushes(monkeypatch, tmp_path):
+    import threading
+    import uuid
+
+    import flowernet_agent_stack
+    from flowernet_agent_stack import VectorStore
+
+    monkeypatch.setattr(flowernet_agent_stack, "DEFAULT_STATE_DIR", tmp_path)
+    monkeypatch.setenv("FLOWERNET_VECTOR_ASYNC_INDEX", "true")
+    store = VectorStore(backend="memory", collection=f"test_write_behind_{uuid.uuid4().hex[:8]}")
+    gate = threading.Event()
+    batches = []
+    original_upsert = store.upsert
+
+    def slow_upsert(records):
+        gate.wait(5)
+        batches.append([rec.id for rec in records])
+        return original_upsert(records)
+
+    store.upsert = slow_upsert
+    results = [{"title": f"Alpine source {i}", "body": "cold tolerance", "url": f"https://doi.org/10.1/{i}"} for i in range(5)]
+    with store._indexer._cond:  # keep the worker from draining between the two submits
+        assert store.index_rag_results("alpine cold", results, namespace="doc") == 5
+        assert store.index_rag_results("alpine cold", results[:2], namespace="doc") == 2
+    assert store._indexer.stats["coalesced"] == 2
+    assert store._indexer.pending >= 1
+
+    gate.set()
+    assert store.flush(timeout=5)
+    assert len(store._records) == 5
+    assert sum(len(batch) for batch in batches) == 5
+    assert store.capabilities()["index_queue"]["pending"] == 0
+    assert store.query("alpine cold tolerance", top_k=3, namespace="doc")
@@ -0,0 +1,30 @@
+from domain_authority import DomainSuffixTrie, get_domain_authority, normalize_host
+
+
+def test_suffix_trie_matches_on_label_boundaries():
+    trie = DomainSuffixTrie([("ieee.org", "a"), ("org", "b")])
+    assert trie.longest_match("ieeexplore.ieee.org") == ("ieee.org", "a")
+    assert trie.longest_match("notieee.org") == ("org", "b")
+    assert trie.longest_match("example.com") is None
+    assert normalize_host("https://www.Nature.com:443/articles/x") == "nature.com"
+
+
+def test_shared_scores_and_profiles():
+    authority = get_domain_authority()
+    assert authority.score("https://link.springer.com/article/10.1007/x") == 1.0
+    assert authority.score("cs.stanford.edu") == 0.95
+    assert authority.score("baike.baidu.com") == 0.15
+    assert authority.score("en.wikipedia.org") == 0.70
+    assert authority.score("en.wikipedia.org", profile="citation_qa") == 0.55
+    assert authority.score("weibo.com") == authority.score("douyin.com") == 0.66
+    assert authority.score("weibo.com", profile="citation_qa") == 0.15
+    assert authority.score("www.xiaohongshu.com", profile="citation_qa") == 0.60  # generic .com in the old web table
+    assert authority.score("example.io") == 0.5
+    assert authority.score("") == 0.0
+    assert authority.is_authority("https://www.tsinghua.edu.cn/news")
+    assert not authority.is_authority("https://medium.com/post")
+    assert authority.has_tag("https://dl.acm.org/doi/10.1145/1", "technical")
+
+    before = authority.cache_info()["hits"]
+    authority.score("https://link.springer.com/other")
+    assert authority.cache_info()["hits"] > before
@@ -0,0 +1,49 @@
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+import requests
+
+from http_cassette import cassette_stats, install_cassette
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = f"<html>{self.path}</html>".encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_record_then_replay_offline(tmp_path):
+    server = HTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_port}/search"
+    cassette = tmp_path / "cassette.jsonl.gz"
+    try:
+        recorder = requests.Session()
+        install_cassette(recorder, mode="record", path=cassette)
+        live = recorder.get(url, params={"q": "alpine plants", "rows": 3}, timeout=5)
+        assert live.status_code == 200
+        assert cassette_stats(recorder)["recorded"] == 1
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    player = requests.Session()
+    install_cassette(player, mode="replay", path=cassette)
+    replayed = player.get(url, params={"rows": 3, "q": "alpine plants"}, timeout=5, stream=True)
+    assert replayed.status_code == 200
+    assert b"".join(replayed.iter_content(chunk_size=4)) == live.content
+    assert player.get(url, params={"q": "alpine plants", "rows": 3}, timeout=5).text == live.text
+
+    with pytest.raises(requests.ConnectionError):
+        player.get(url, params={"q": "never recorded"}, timeout=5)
+    stats = cassette_stats(player)
+    assert stats["hits"] == 2 and stats["misses"] == 1
@@ -0,0 +1,264 @@
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import requests
+
+from history_store import HistoryManager
+from remote_history_client import RemoteHistoryManager
+
+
+class _Response:
+    def __init__(self, body, status_code=200):
+        self._body = body
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"HTTP {self.status_code}", response=self)
+
+    def json(self):
+        return self._body
+
+
+class OutlinerStub:
+    """把 RemoteHistoryManager 的请求转给内存模式的 HistoryManager，并记录请求路径。"""
+
+    def __init__(self):
+        self.store = HistoryManager(use_database=False, snapshot_path="")
+        self.paths = []
+        self.release = threading.Event()
+        self.release.set()
+        # release 未置位时挂起的接口（None 表示全部）
+        self.held_paths = None
+        # 依次返回的失败状态码，用于模拟 outliner 故障
+        self.failures = []
+        # 为 False 时模拟没有批量接口的旧版 outliner
+        self.batch_endpoints = True
+
+    def post(self, url, json, timeout):
+        path = url[len("http://outliner"):]
+        self.paths.append(path)
+        if self.held_paths is None or path in self.held_paths:
+            self.release.wait(5)
+        if self.failures:
+            return _Response({"detail": "unavailable"}, self.failures.pop(0))
+        if path.endswith("-batch") and not self.batch_endpoints:
+            return _Response({"detail": "Not Found"}, 404)
+        return _Response(self.handle(path, json))
+
+    def handle(self, path, payload):
+        store = self.store
+        if path == "/outline/save":
+            store.save_outline(**payload)
+            return {"success": True}
+        if path == "/outline/get":
+            return {"success": True, "outline": store.get_outline(**payload)}
+        if path == "/subsection-tracking/create":
+            store.create_subsection_tracking(**payload)
+            return {"success": True}
+        if path == "/subsection-tracking/update":
+            store.update_subsection_content(**payload)
+            return {"success": True}
+        if path == "/subsection-tracking/update-batch":
+            return {"success": True, "count": store.update_subsection_contents(payload["updates"])}
+        if path == "/subsection-tracking/get":
+            return {"success": True, "tracking": store.get_subsection_tracking(**payload)}
+        if path == "/history/add":
+            store.add_entry(**{key: value for key, value in payload.items() if key != "timestamp"})
+            return {"success": True}
+        if path == "/passed-history/add":
+            store.add_passed_history(**{key: value for key, value in payload.items() if key != "created_at"})
+            return {"success": True}
+        if path == "/history/add-batch":
+            return {"success": True, "count": store.add_entries(payload["entries"])}
+        if path == "/history/get":
+            return {"success": True, "history": store.get_history(**payload)}
+        if path == "/history/progress":
+            return {"success": True, "events": store.get_progress_events(**payload)}
+        if path == "/progress/add":
+            # 与 outliner 的单条接口一致：时间戳只由批量接口接收
+            payload = {key: value for key, value in payload.items() if key != "timestamp"}
+            store.add_progress_event(**payload)
+            return {"success": True}
+        if path == "/progress/add-batch":
+            return {"success": True, "event_ids": store.add_progress_events(payload["events"])}
+        if path == "/passed-history/add-batch":
+            return {"success": True, "count": store.add_passed_histories(payload["entries"])}
+        raise AssertionError(f"unexpected path {path}")
+
+
+class RemoteHistoryManagerTests(unittest.TestCase):
+    def setUp(self):
+        self.outliner = OutlinerStub()
+        self.manager = RemoteHistoryManager("http://outliner", cache_seconds=60, async_writes=False)
+        self.manager.session = self.outliner
+
+    def test_tracking_reads_are_cached_and_patched_on_write(self):
+        self.manager.create_subsection_tracking("doc", "s1", "ss1", "outline v1")
+        for _ in range(3):
+            tracking = self.manager.get_subsection_tracking("doc", "s1", "ss1", fields=["outline"])
+        self.assertEqual(tracking, {"outline": "outline v1"})
+        self.assertEqual(self.outliner.paths.count("/subsection-tracking/get"), 1)
+
+        self.manager.update_subsection_content("doc", "s1", "ss1", outline="outline v2", iteration_count=2)
+        tracking = self.manager.get_subsection_tracking("doc", "s1", "ss1", fields=["outline"])
+        self.assertEqual(tracking, {"outline": "outline v2"})
+        self.assertEqual(self.outliner.paths.count("/subsection-tracking/get"), 1)
+
+        # 完整记录包含 updated_at，写入后必须重新读取
+        self.manager.get_subsection_tracking("doc", "s1", "ss1")
+        self.manager.update_subsection_content("doc", "s1", "ss1", is_passed=True)
+        self.assertTrue(self.manager.get_subsection_tracking("doc", "s1", "ss1")["is_passed"])
+        self.assertEqual(self.outliner.paths.count("/subsection-tracking/get"), 3)
+
+    def test_saved_outline_is_written_through(self):
+        self.assertIsNone(self.manager.get_outline("doc", "subsection", "s1", "ss1"))
+        self.manager.save_outline("doc", "subsection outline", outline_type="subsection", section_id="s1", subsection_id="ss1")
+        self.assertEqual(self.manager.get_outline("doc", "subsection", "s1", "ss1"), "subsection outline")
+        self.assertEqual(self.outliner.paths.count("/outline/get"), 1)
+
+    def test_concurrent_identical_reads_are_coalesced(self):
+        self.manager.add_entries([{"document_id": "doc", "section_id": "s1", "subsection_id": "ss1", "content": "c"}])
+        self.outliner.release.clear()
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.manager.get_history("doc")))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + 5
+        while self.manager.stats["coalesced_reads"] < 4 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.outliner.release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.outliner.paths.count("/history/get"), 1)
+        self.assertEqual([[entry["content"] for entry in history] for history in results], [["c"]] * 5)
+        results[0][0]["content"] = "mutated"
+        self.assertEqual(results[1][0]["content"], "c")
+
+    def test_pipeline_batches_writes_by_kind(self):
+        with self.manager.pipeline():
+            self.manager.add_progress_event("doc", "generate", "e1")
+            self.manager.add_entry("doc", "s1", "ss1", "content")
+            self.manager.add_progress_event("doc", "verify", "e2")
+            self.assertEqual(self.outliner.paths, [])
+            self.assertEqual(len(self.manager.get_history("doc")), 1)
+            self.manager.add_progress_event("doc", "done", "e3")
+
+        self.assertEqual(
+            self.outliner.paths,
+            ["/progress/add-batch", "/history/add-batch", "/history/get", "/progress/add-batch"],
+        )
+        self.assertEqual([event["message"] for event in self.outliner.store.get_progress_events("doc")], ["e1", "e2", "e3"])
+
+        self.manager.add_progress_event("doc", "done", "e4")
+        self.assertEqual(self.outliner.paths[-1], "/progress/add")
+
+
+class AsyncWriteQueueTests(unittest.TestCase):
+    def setUp(self):
+        self.outliner = OutlinerStub()
+        self.manager = RemoteHistoryManager(
+            "http://outliner",
+            cache_seconds=60,
+            async_writes=True,
+            queue_size=3,
+            write_retries=2,
+            retry_backoff_seconds=0.01,
+        )
+        self.manager.session = self.outliner
+
+    def test_progress_events_are_queued_and_content_is_written_synchronously(self):
+        self.outliner.held_paths = {"/progress/add-batch"}
+        self.outliner.release.clear()
+        started = time.monotonic()
+        for i in range(3):
+            self.manager.add_progress_event("doc", "generate", f"e{i}")
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(self.outliner.store.get_progress_events("doc"), [])
+
+        self.manager.add_entry("doc", "s1", "ss1", "content")
+        self.manager.add_passed_history("doc", "s1", "ss1", "content", 0)
+        self.assertEqual(self.outliner.store.get_history_text("doc"), "content")
+        self.assertEqual(self.outliner.store.get_passed_history_text("doc"), "content")
+
+        self.outliner.release.set()
+        self.assertTrue(self.manager.flush(timeout=5))
+        events = self.outliner.store.get_progress_events("doc")
+        self.assertEqual([event["message"] for event in events], ["e0", "e1", "e2"])
+        self.assertTrue(all(event["timestamp"] for event in events))
+        self.assertEqual(self.manager.write_stats()["pending_writes"], 0)
+
+    def test_content_write_failures_are_raised(self):
+        self.outliner.failures = [422]
+        with self.assertRaises(requests.HTTPError):
+            self.manager.add_entry("doc", "s1", "ss1", "content")
+        self.assertEqual(self.manager.write_stats()["failed_writes"], 0)
+
+    def test_missing_batch_endpoints_fall_back_to_single_writes(self):
+        self.outliner.batch_endpoints = False
+        entries = [{"document_id": "doc", "section_id": "s1", "subsection_id": f"ss{i}", "content": f"c{i}"} for i in range(2)]
+        self.manager.add_entries(entries)
+        self.manager.add_entries(entries)
+        self.manager.add_progress_events([{"document_id": "doc", "stage": "generate", "message": "e"}])
+        self.assertTrue(self.manager.flush(timeout=5))
+
+        self.assertEqual(self.outliner.paths.count("/history/add-batch"), 1)
+        self.assertEqual(self.outliner.paths.count("/history/add"), 4)
+        self.assertEqual(len(self.outliner.store.get_history("doc")), 4)
+        self.assertEqual(len(self.outliner.store.get_progress_events("doc")), 1)
+        self.assertEqual(self.manager.write_stats()["failed_writes"], 0)
+
+    def test_progress_reads_wait_only_for_their_document(self):
+        self.outliner.held_paths = {"/progress/add-batch"}
+        self.outliner.release.clear()
+        self.manager.add_progress_event("doc-a", "generate", "queued")
+
+        started = time.monotonic()
+        self.assertEqual(self.manager.get_progress_events("doc-b"), [])
+        self.assertLess(time.monotonic() - started, 0.5)
+        with patch("remote_history_client.REMOTE_HISTORY_FLUSH_TIMEOUT_SECONDS", 0.1):
+            with self.assertRaises(TimeoutError):
+                self.manager.get_progress_events("doc-a")
+
+        self.outliner.release.set()
+        self.assertEqual([event["message"] for event in self.manager.get_progress_events("doc-a")], ["queued"])
+
+    def test_failed_batches_are_retried_with_backoff(self):
+        self.outliner.failures = [503, 502]
+        self.manager.add_progress_event("doc", "generate", "e")
+        self.assertTrue(self.manager.flush(timeout=5))
+        stats = self.manager.write_stats()
+        self.assertEqual((stats["write_retries"], stats["delivered_writes"], stats["failed_writes"]), (2, 1, 0))
+        self.assertEqual(len(self.outliner.store.get_progress_events("doc")), 1)
+
+    def test_client_errors_are_not_retried(self):
+        self.outliner.failures = [422]
+        self.manager.add_progress_event("doc", "generate", "e")
+        self.assertTrue(self.manager.flush(timeout=5))
+        stats = self.manager.write_stats()
+        self.assertEqual((stats["write_retries"], stats["failed_writes"]), (0, 1))
+        self.assertIn("422", stats["last_write_error"])
+
+    def test_overflow_drops_progress_events_but_keeps_content(self):
+        self.outliner.release.clear()
+        for i in range(10):
+            self.manager.add_progress_event("doc", "generate", f"e{i}")
+        self.outliner.release.set()
+        self.manager.add_entry("doc", "s1", "ss1", "content")
+        self.assertTrue(self.manager.flush(timeout=5))
+
+        stats = self.manager.write_stats()
+        delivered_events = self.outliner.store.get_progress_events("doc")
+        self.assertGreater(stats["dropped_writes"], 0)
+        self.assertEqual(len(delivered_events) + stats["dropped_writes"], 10)
+        self.assertEqual([event["message"] for event in delivered_events], sorted(event["message"] for event in delivered_events))
+        self.assertEqual(len(self.outliner.store.get_history("doc")), 1)
+
+if __name__ == "__main__":
+    unittest.main()